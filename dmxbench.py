@@ -0,0 +1,552 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+""" dmxbench.py
+
+    Набор тестов производительности генераторов модуля dmxgrad.
+    Для работы olad не требуется.
+
+    Может использоваться как модуль (см. функцию run_benchmarks())
+    или как утилита:
+        dmxbench.py [параметры]
+    результаты выводятся в формате JSON (см. dmxbench.py --help).
+
+    Copyright 2022 MC-6312
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>."""
+
+
+from dmxgrad import *
+
+import sys
+import json
+import platform
+import subprocess
+import os.path
+import gc
+import tracemalloc
+import tempfile
+import atexit
+from time import perf_counter
+from argparse import ArgumentParser
+
+from PIL import Image
+
+
+DEFAULT_CHANNELS = (3, 48)
+DEFAULT_LENGTHS = (1000,)
+DEFAULT_DEPTHS = (2, 4)
+DEFAULT_FRAMES = 2000
+DEFAULT_REPEAT = 5
+DEFAULT_INSTANCES = 1000
+
+# режимы счётчика положения для теста GradPosition (см. bench_position())
+POSITION_MODES = (('REPEAT', GradPosition.REPEAT), ('MIRROR', GradPosition.MIRROR))
+
+# модули, которые не должны загружаться при импорте dmxgrad
+# (см. bench_import())
+LAZY_MODULES = ('PIL', 'ola', 'asyncio')
+
+# программа, выполняемая в отдельном процессе для замера времени импорта;
+# выводит время импорта в секундах и список загруженных "лишних" модулей
+__IMPORT_SCRIPT = '''import sys, time
+sys.path.insert(0, %r)
+t0 = time.perf_counter()
+import dmxgrad
+t = time.perf_counter() - t0
+print(t)
+print(' '.join(sorted(m for m in sys.modules if m.split('.')[0] in %r)))
+'''
+
+
+def __levels(channels):
+    return tuple(0.5 + 0.5 * (ix % 2) for ix in range(channels))
+
+
+def make_leaf(channels, length):
+    """Простой генератор, используемый в качестве "листьев" деревьев
+    генераторов в тестах составных генераторов."""
+
+    return SineWaveGradGen(length=length, levels=__levels(channels),
+                           mode=GradPosition.REPEAT)
+
+
+def make_tree(depth, channels, length, mknode):
+    """Создание дерева генераторов.
+
+    Параметры:
+        depth       - целое, глубина дерева; при depth < 1 возвращается
+                      "лист" (см. make_leaf());
+        channels, length - параметры "листьев";
+        mknode      - функция, создающая узел дерева; получает три
+                      параметра: функцию без параметров, создающую
+                      поддерево на один уровень меньше, channels и length;
+                      возвращает экземпляр GradGen."""
+
+    if depth < 1:
+        return make_leaf(channels, length)
+
+    return mknode(lambda: make_tree(depth - 1, channels, length, mknode),
+                  channels, length)
+
+
+def __make_image(channels, length):
+    # изображение с шумом, каждая строка - отдельный "светильник"
+    # с тремя каналами
+    height = max(1, (channels + 2) // 3)
+
+    return Image.fromarray(np.random.randint(0, 256, (height, length, 3), dtype=np.uint8), 'RGB')
+
+
+# временный каталог для файлов, создаваемых тестами (см. __temp_file_name())
+__tempDir = None
+
+
+def __temp_file_name(name):
+    # каталог создаётся при первом обращении и удаляется при завершении
+    global __tempDir
+
+    if __tempDir is None:
+        __tempDir = tempfile.TemporaryDirectory(prefix='dmxbench-')
+        atexit.register(__tempDir.cleanup)
+
+    return os.path.join(__tempDir.name, name)
+
+
+def __make_show(channels, length):
+    # файл создаётся один раз для каждого сочетания параметров
+    filename = __temp_file_name('show-%d-%d.dmxshow' % (channels, length))
+
+    if not os.path.exists(filename):
+        write_show_file(make_leaf(channels, length), filename, mode=GradPosition.REPEAT)
+
+    return MappedShowGradGen(filename=filename)
+
+
+def __make_animation(channels, length):
+    # GIF из length кадров с шумом, кадр - строка "светильников"
+    # с тремя каналами
+    filename = __temp_file_name('anim-%d-%d.gif' % (channels, length))
+
+    if not os.path.exists(filename):
+        width = max(1, (channels + 2) // 3)
+        frames = [Image.fromarray(np.random.randint(0, 256, (1, width, 3), dtype=np.uint8), 'RGB')
+                  for i in range(length)]
+        frames[0].save(filename, save_all=True, append_images=frames[1:],
+                       duration=33, loop=0)
+
+    return AnimatedImageGradGen(image=Image.open(filename), mode=GradPosition.REPEAT)
+
+
+# тесты: (название, функция, создающая генератор, используется ли глубина)
+# функция получает параметры channels, length, depth
+BENCHMARKS = (
+    ('LineGradGen',
+        lambda c, l, d: LineGradGen(length=l, channelsFrom=(0.0,) * c,
+                            channelsTo=__levels(c), mode=GradPosition.MIRROR),
+        False),
+    ('SineWaveGradGen',
+        lambda c, l, d: make_leaf(c, l),
+        False),
+    ('SquareWaveGradGen',
+        lambda c, l, d: SquareWaveGradGen(length=l, levels=__levels(c),
+                            dutyCycles=0.5, mode=GradPosition.REPEAT),
+        False),
+    ('ImageGradGen',
+        lambda c, l, d: ImageGradGen(image=__make_image(c, l), horizontal=True,
+                            pixels=None, mode=GradPosition.REPEAT),
+        False),
+    ('MappedShowGradGen',
+        lambda c, l, d: __make_show(c, l),
+        False),
+    ('AnimatedImageGradGen',
+        lambda c, l, d: __make_animation(c, l),
+        False),
+    ('ConstantGradGen',
+        lambda c, l, d: ConstantGradGen(length=l, values=__levels(c)),
+        False),
+    ('NoiseGen',
+        lambda c, l, d: NoiseGen(minValues=(0.0,) * c, maxValues=__levels(c)),
+        False),
+    ('SmoothNoiseGradGen',
+        lambda c, l, d: SmoothNoiseGradGen(length=l, minValues=(0.0,) * c,
+                            maxValues=__levels(c), octaves=3, seed=1),
+        False),
+    ('GenRecorderGen',
+        lambda c, l, d: make_tree(d, c, l,
+            lambda sub, c, l: GenRecorderGen(sourcegen=sub(), mode=GradPosition.REPEAT)),
+        True),
+    ('SequenceGenGradGen',
+        lambda c, l, d: make_tree(d, c, l,
+            lambda sub, c, l: SequenceGenGradGen(subgen=(sub(), sub()), mode=GradPosition.REPEAT)),
+        True),
+    ('ParallelGenGradGen',
+        lambda c, l, d: make_tree(d, c, l,
+            lambda sub, c, l: ParallelGenGradGen(subgen=(sub(), sub()))),
+        True),
+    ('RepeaterGenGradGen',
+        lambda c, l, d: make_tree(d, c, l,
+            lambda sub, c, l: RepeaterGenGradGen(subgen=sub(), length=1000000)),
+        True),
+    ('EnvelopeGenGradGen',
+        lambda c, l, d: make_tree(d, c, l,
+            lambda sub, c, l: EnvelopeGenGradGen(sourcegen=sub(),
+                envelopegen=LineGradGen(length=l, mode=GradPosition.MIRROR))),
+        True),
+    ('CrossfadeGenGradGen',
+        lambda c, l, d: make_tree(d, c, l,
+            lambda sub, c, l: CrossfadeGenGradGen(source1gen=sub(), source2gen=sub(),
+                balancegen=LineGradGen(length=l, mode=GradPosition.MIRROR))),
+        True),
+    )
+
+
+def time_calls(func, number, repeat):
+    """Измерение времени выполнения функции.
+
+    Параметры:
+        func    - функция без параметров;
+        number  - количество вызовов func в одном замере;
+        repeat  - количество замеров.
+
+    Функция возвращает кортеж из двух float - минимальное и среднее
+    (по замерам) время одного вызова func в секундах."""
+
+    times = []
+
+    for r in range(repeat):
+        t0 = perf_counter()
+
+        for i in range(number):
+            func()
+
+        times.append((perf_counter() - t0) / number)
+
+    return (min(times), sum(times) / len(times))
+
+
+def bench_generator(name, mkgen, channels, length, depth=None,
+                    frames=DEFAULT_FRAMES, repeat=DEFAULT_REPEAT, compiled=False):
+    """Тест одного генератора.
+
+    Параметры:
+        name    - строка, название теста;
+        mkgen   - функция, создающая генератор (см. BENCHMARKS);
+        channels, length, depth - параметры для mkgen;
+        frames  - количество значений в одном замере выборки;
+        repeat  - количество замеров;
+        compiled - если True - генератор оборачивается в CompiledGradGen
+                  (время reset() включает время компиляции дерева).
+
+    Функция возвращает словарь с результатами (время - в секундах)."""
+
+    gen = mkgen(channels, length, depth)
+    if compiled:
+        gen = CompiledGradGen(sourcegen=gen)
+
+    resetBest, resetMean = time_calls(gen.reset, 1, repeat)
+
+    # "разогрев" - первые обращения после reset() могут быть медленнее
+    nchannels = len(unwrap_lol(gen.get_next_value()))
+    for i in range(min(frames, 100)):
+        gen.get_next_value()
+
+    nextBest, nextMean = time_calls(gen.get_next_value, frames, repeat)
+
+    blockBest, blockMean = time_calls(lambda: gen.get_next_values(frames), 1, repeat)
+
+    return {'name': name,
+            'channels': channels,
+            'length': length,
+            'depth': depth,
+            'compiled': compiled,
+            'outChannels': nchannels,
+            'reset': resetBest,
+            'resetMean': resetMean,
+            'nextValue': nextBest,
+            'nextValueMean': nextMean,
+            'nextValues': blockBest / frames,
+            'nextValuesMean': blockMean / frames}
+
+
+def bench_memory(name, mkgen, channels, length, depth=None,
+                 count=DEFAULT_INSTANCES):
+    """Замер памяти, занимаемой генераторами.
+
+    Параметры:
+        name, mkgen, channels, length, depth - см. bench_generator();
+        count   - количество создаваемых генераторов (деревьев).
+
+    Функция возвращает словарь с результатами; в элементе 'bytesPerNode' -
+    среднее количество байт на один генератор дерева (с учётом буферов,
+    которые генераторы с одинаковыми параметрами используют совместно)."""
+
+    gc.collect()
+
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+
+    try:
+        m0 = tracemalloc.get_traced_memory()[0]
+        gens = [mkgen(channels, length, depth) for i in range(count)]
+        m1 = tracemalloc.get_traced_memory()[0]
+    finally:
+        if started:
+            tracemalloc.stop()
+
+    nodes = sum(len(list(iter_tree(g))) for g in gens)
+
+    return {'name': name,
+            'channels': channels,
+            'length': length,
+            'depth': depth,
+            'instances': count,
+            'nodes': nodes,
+            'bytesPerNode': (m1 - m0) / nodes}
+
+
+def bench_position(mode, length, frames=DEFAULT_FRAMES, repeat=DEFAULT_REPEAT):
+    """Тест счётчика положения (GradPosition.next_value()).
+
+    Параметры:
+        mode    - строка, название режима счётчика (см. POSITION_MODES);
+        length  - position.length;
+        frames, repeat - см. bench_generator().
+
+    Функция возвращает словарь с результатами (время - в секундах)."""
+
+    pos = GradPosition(length, dict(POSITION_MODES)[mode])
+
+    nextBest, nextMean = time_calls(pos.next_value, frames, repeat)
+
+    # доступ к полям - то, что делают генераторы на каждом значении
+    def __access():
+        return pos.value + pos.length + pos.direction
+
+    accessBest, accessMean = time_calls(__access, frames, repeat)
+
+    return {'name': 'GradPosition.%s' % mode,
+            'channels': None,
+            'length': length,
+            'depth': None,
+            'nextValue': nextBest,
+            'nextValueMean': nextMean,
+            'access': accessBest,
+            'accessMean': accessMean}
+
+
+def bench_import(repeat=DEFAULT_REPEAT):
+    """Замер времени импорта модуля dmxgrad в отдельном ("чистом")
+    процессе интерпретатора.
+
+    Параметры:
+        repeat  - количество замеров (запусков процесса).
+
+    Функция возвращает словарь с результатами (время - в секундах);
+    в элементе 'lazyLoaded' - список модулей из LAZY_MODULES, загруженных
+    при импорте dmxgrad (должен быть пустым)."""
+
+    script = __IMPORT_SCRIPT % (os.path.dirname(os.path.abspath(__file__)), LAZY_MODULES)
+    times = []
+    loaded = []
+
+    for r in range(repeat):
+        out = subprocess.run([sys.executable, '-c', script],
+            check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout.splitlines()
+
+        times.append(float(out[0]))
+        loaded = out[1].split() if len(out) > 1 else []
+
+    return {'name': 'import',
+            'channels': None,
+            'length': None,
+            'depth': None,
+            'import': min(times),
+            'importMean': sum(times) / len(times),
+            'lazyLoaded': loaded}
+
+
+def run_benchmarks(names=None, channels=DEFAULT_CHANNELS, lengths=DEFAULT_LENGTHS,
+                   depths=DEFAULT_DEPTHS, frames=DEFAULT_FRAMES, repeat=DEFAULT_REPEAT,
+                   progress=None, memory=None, compiled=False):
+    """Выполнение тестов.
+
+    Параметры:
+        names       - None или список названий тестов (см. BENCHMARKS);
+                      если None - выполняются все тесты;
+        channels    - список количеств каналов;
+        lengths     - список длин буферов (position.length);
+        depths      - список глубин деревьев (для составных генераторов);
+        frames, repeat - см. bench_generator();
+        progress    - None или функция, получающая словарь с результатами
+                      каждого выполненного теста;
+        memory      - None или положительное целое; если указано -
+                      вместо тестов скорости выполняются замеры памяти
+                      (см. bench_memory()) с указанным количеством
+                      генераторов;
+        compiled    - см. bench_generator().
+
+    Тесты счётчика положения (см. bench_position()) выполняются, если
+    names не указан или содержит "GradPosition" (при замерах памяти
+    не выполняются).
+
+    Функция возвращает список словарей с результатами."""
+
+    results = []
+
+    for name, mkgen, usesDepth in BENCHMARKS:
+        if names and name not in names:
+            continue
+
+        for nchannels in channels:
+            for length in lengths:
+                for depth in (depths if usesDepth else (None,)):
+                    if memory:
+                        r = bench_memory(name, mkgen, nchannels, length, depth, memory)
+                    else:
+                        r = bench_generator(name, mkgen, nchannels, length, depth,
+                                            frames, repeat, compiled)
+                    results.append(r)
+
+                    if progress is not None:
+                        progress(r)
+
+    if not memory and (not names or 'GradPosition' in names):
+        for mode, _ in POSITION_MODES:
+            for length in lengths:
+                r = bench_position(mode, length, frames, repeat)
+                results.append(r)
+
+                if progress is not None:
+                    progress(r)
+
+    return results
+
+
+def result_key(r):
+    return (r['name'], r['channels'], r['length'], r['depth'])
+
+
+def compare_results(old, new):
+    """Сравнение результатов двух запусков (например, на разных ревизиях).
+
+    Параметры:
+        old, new    - списки словарей с результатами.
+
+    Функция возвращает список кортежей (ключ теста, имя показателя,
+    старое значение, новое значение, отношение нового к старому)."""
+
+    oldd = {result_key(r): r for r in old}
+    ret = []
+
+    for r in new:
+        o = oldd.get(result_key(r))
+        if o is None:
+            continue
+
+        for field in ('reset', 'nextValue', 'nextValues', 'access', 'bytesPerNode', 'import'):
+            ov = o.get(field)
+            nv = r.get(field)
+            if ov and nv is not None:
+                ret.append((result_key(r), field, ov, nv, nv / ov))
+
+    return ret
+
+
+def main(args=None):
+    aparser = ArgumentParser(description='dmxgrad generator benchmarks')
+    aparser.add_argument('-b', '--benchmark', action='append', default=None,
+        help='benchmark name (may be specified several times; default - all)')
+    aparser.add_argument('-c', '--channels', type=int, nargs='+', default=DEFAULT_CHANNELS,
+        help='channel count(s)')
+    aparser.add_argument('-l', '--length', type=int, nargs='+', default=DEFAULT_LENGTHS,
+        help='buffer length(s)')
+    aparser.add_argument('-d', '--depth', type=int, nargs='+', default=DEFAULT_DEPTHS,
+        help='tree depth(s) for composite generators')
+    aparser.add_argument('-n', '--frames', type=int, default=DEFAULT_FRAMES,
+        help='frames per measurement')
+    aparser.add_argument('-r', '--repeat', type=int, default=DEFAULT_REPEAT,
+        help='number of measurements')
+    aparser.add_argument('-o', '--output', default=None,
+        help='output JSON file (default - stdout)')
+    aparser.add_argument('--compare', default=None, metavar='FILE',
+        help='compare results with previously saved JSON file')
+    aparser.add_argument('-m', '--memory', type=int, nargs='?', const=DEFAULT_INSTANCES,
+        default=None, metavar='COUNT',
+        help='measure memory per generator (creating COUNT instances) instead of speed')
+    aparser.add_argument('-C', '--compiled', action='store_true',
+        help='wrap generators in CompiledGradGen')
+    aparser.add_argument('--import-time', action='store_true',
+        help='also measure dmxgrad import time')
+    aparser.add_argument('--list', action='store_true',
+        help='list benchmark names and exit')
+
+    pargs = aparser.parse_args(args)
+
+    if pargs.list:
+        for name, _, _ in BENCHMARKS:
+            print(name)
+        print('GradPosition')
+        return 0
+
+    def __progress(r):
+        if 'bytesPerNode' in r:
+            print('%s c=%d l=%d d=%s: %.1f bytes/node' % (r['name'],
+                r['channels'], r['length'], r['depth'], r['bytesPerNode']), file=sys.stderr)
+        elif 'access' in r:
+            print('%s l=%d: next=%.3fus access=%.3fus' % (r['name'], r['length'],
+                r['nextValue'] * 1e6, r['access'] * 1e6), file=sys.stderr)
+        else:
+            print('%s c=%d l=%d d=%s: reset=%.6fs next=%.2fus block=%.2fus' % (r['name'],
+                r['channels'], r['length'], r['depth'], r['reset'],
+                r['nextValue'] * 1e6, r['nextValues'] * 1e6), file=sys.stderr)
+
+    results = run_benchmarks(pargs.benchmark, pargs.channels, pargs.length,
+        pargs.depth, pargs.frames, pargs.repeat, __progress, pargs.memory,
+        pargs.compiled)
+
+    if pargs.import_time:
+        r = bench_import(pargs.repeat)
+        results.append(r)
+
+        print('import: %.2fms%s' % (r['import'] * 1000,
+            ', loaded: %s' % ' '.join(r['lazyLoaded']) if r['lazyLoaded'] else ''),
+            file=sys.stderr)
+
+    report = {'revision': REVISION,
+              'python': platform.python_version(),
+              'numpy': np.__version__,
+              'results': results}
+
+    if pargs.output:
+        with open(pargs.output, 'w') as f:
+            json.dump(report, f, indent=1)
+    else:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+
+    if pargs.compare:
+        with open(pargs.compare, 'r') as f:
+            old = json.load(f)['results']
+
+        for key, field, ov, nv, ratio in compare_results(old, results):
+            print('%s %s: %.3g -> %.3g (x%.2f)' % ('/'.join(map(str, key)),
+                field, ov, nv, ratio), file=sys.stderr)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
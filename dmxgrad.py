@@ -29,21 +29,40 @@
     along with this program.  If not, see <http://www.gnu.org/licenses/>."""
 
 
-REVISION = 17
+REVISION = 18
 
 
-from math import sin, pi
-from random import randint, random
+from math import pi
 
-# для генераторов, берущих данные из загружаемых изображений
-# требуется PIL или PILLOW!
-from PIL import Image
+# numpy требуется для блочной выборки значений генераторов
+import numpy as np
 
-from array import array
-from ola.ClientWrapper import ClientWrapper
+# PIL (или PILLOW), ola и asyncio импортируются не здесь, а там, где
+# они нужны (get_supported_image(), OLATransport, AsyncGradSender) -
+# чтобы модуль быстро загружался и работал без них, если они не нужны
+# (например, при расчёте значений генераторов в отдельных процессах)
 
 from colorsys import hls_to_rgb
 
+import struct
+import socket
+import uuid
+
+import os
+import os.path
+import copy
+import hashlib
+import tempfile
+import weakref
+
+from collections import OrderedDict
+
+from time import monotonic, sleep, perf_counter
+
+import tracemalloc
+
+from bisect import bisect_left
+
 
 # значения цветов для функции hls_to_rgb()
 __HUE_360 = 1.0 / 360
@@ -59,6 +78,15 @@ HUE_MAGENTA = 300 * __HUE_360
 
 MAX_VALUE = 1.0
 
+# максимальное количество каналов в одной DMX512 universe
+DMX_CHANNELS = 512
+
+# тип значений в массивах, возвращаемых методом GradGen.get_next_values()
+FRAME_DTYPE = np.float32
+
+# множитель для преобразования целых 0-255 в float 0.0-1.0
+BYTE_TO_FLOAT = 1.0 / 255
+
 # готовые значения цветов (R, G, B)
 RGB_RED     = (MAX_VALUE, 0, 0)
 __MAX_LIGHTNESS = 0.5 # максимальное значение яркости в HLS, при котором цвет не пересвечивается в белый
@@ -110,6 +138,10 @@ def get_supported_image(fromimg, grayscale=False):
     Возвращает новое изображение в совместимом формате, если формат
     исходного изображения несовместим, иначе возвращает значение fromimg."""
 
+    # для генераторов, берущих данные из загружаемых изображений
+    # требуется PIL или PILLOW!
+    from PIL import Image
+
     destmode = 'L' if grayscale else 'RGB'
 
     if fromimg.mode == destmode:
@@ -134,6 +166,9 @@ def unwrap_lol(src, chktype=None):
         chktype - None или кортеж типов для проверки соответствия
                   типа входного параметра; если None - тип не проверяется.
 
+    Массивы numpy разворачиваются так же, как списки, но без проверки
+    типов значений.
+
     Функция возвращает линейный список."""
 
     def __do_check(v):
@@ -142,13 +177,16 @@ def unwrap_lol(src, chktype=None):
 
         return v
 
+    if isinstance(src, np.ndarray):
+        return src.ravel().tolist()
+
     if not isinstance(src, (list, tuple)):
         return [__do_check(src)]
 
     ret = []
 
     for v in src:
-        if isinstance(v, (list, tuple)):
+        if isinstance(v, (list, tuple, np.ndarray)):
             ret += unwrap_lol(v)
         else:
             ret.append(__do_check(v))
@@ -156,6 +194,128 @@ def unwrap_lol(src, chktype=None):
     return ret
 
 
+def quantize_values(values, out=None, scratch=None):
+    """Преобразование float в диапазоне 0.0-1.0 в целые 0-255.
+    Значения за пределами диапазона принудительно вгоняются в диапазон.
+
+    Параметры:
+        values  - массив numpy (или список) float;
+        out     - None или массив numpy с элементами типа np.uint8
+                  той же длины, что и values - в этом случае результат
+                  записывается в него;
+        scratch - None или массив numpy float той же длины, что и values,
+                  для промежуточных значений; если указаны и out,
+                  и scratch - функция не выделяет память под новые массивы.
+
+    Функция возвращает массив numpy с элементами типа np.uint8
+    (out, если он указан)."""
+
+    if out is None:
+        return (np.clip(values, 0.0, MAX_VALUE) * 255).astype(np.uint8)
+
+    scratch = np.clip(values, 0.0, MAX_VALUE, out=scratch)
+    np.multiply(scratch, 255, out=scratch)
+    np.copyto(out, scratch, casting='unsafe')
+
+    return out
+
+
+def frames_to_block(frames):
+    """Преобразование списка значений, полученных от GradGen.get_next_value(),
+    в двумерный массив numpy (строки - значения, столбцы - каналы).
+
+    Параметры:
+        frames  - список значений (float, списков/кортежей float или
+                  массивов numpy); после разворачивания функцией unwrap_lol()
+                  все значения должны содержать одинаковое количество каналов,
+                  иначе генерируется исключение.
+
+    Функция возвращает массив numpy с элементами типа FRAME_DTYPE."""
+
+    if not frames:
+        return np.empty((0, 0), dtype=FRAME_DTYPE)
+
+    return np.array([unwrap_lol(f) for f in frames], dtype=FRAME_DTYPE)
+
+
+def cycle_columns(block, ncolumns):
+    """Расширение (или усечение) двумерного массива значений до ncolumns
+    столбцов (каналов) с циклическим повтором имеющихся столбцов.
+    Функция предназначена для генераторов, использующих значения других
+    генераторов "циклически до заполнения".
+
+    Функция возвращает массив numpy (исходный, если количество столбцов
+    уже совпадает)."""
+
+    if block.shape[1] == ncolumns:
+        return block
+
+    return block[:, np.arange(ncolumns) % block.shape[1]]
+
+
+def get_cycle_layout(owner, sourcegen, *cyclegens):
+    """Расчёт раскладки каналов для генераторов, использующих значения
+    генераторов cyclegens "циклически до заполнения" количества каналов
+    генератора sourcegen (см. EnvelopeGenGradGen, CrossfadeGenGradGen).
+
+    Параметры:
+        owner       - экземпляр GradGen, для которого расчитывается
+                      раскладка (для сообщений об ошибках);
+        sourcegen   - экземпляр GradGen, задающий количество каналов;
+        cyclegens   - экземпляры GradGen, значения которых используются
+                      циклически.
+
+    Функция возвращает кортеж, первый элемент которого - количество
+    каналов sourcegen (или None, если количество каналов какого-либо
+    из генераторов неизвестно), а следующие - по одному на каждый
+    из cyclegens: None, если количество каналов совпадает с количеством
+    каналов sourcegen, иначе - массив numpy с номерами каналов
+    для np.take().
+    Если какой-либо из cyclegens выдаёт больше каналов, чем sourcegen
+    (т.е. часть значений не используется), генерируется исключение
+    ValueError."""
+
+    nchannels = sourcegen.get_n_channels()
+    counts = [g.get_n_channels() for g in cyclegens]
+
+    if nchannels is None or None in counts:
+        return (None,) * (len(cyclegens) + 1)
+
+    ret = [nchannels]
+
+    for g, n in zip(cyclegens, counts):
+        if n < 1 or n > nchannels:
+            raise ValueError('%s.update_layout(): generator "%s" returns %d channel(s), must be 1..%d' % (owner.__class__.__name__, g.name, n, nchannels))
+
+        ret.append(None if n == nchannels else np.arange(nchannels) % n)
+
+    return tuple(ret)
+
+
+# количество каналов, начиная с которого EnvelopeGenGradGen
+# и CrossfadeGenGradGen расчитывают значения операциями numpy над
+# заранее выделенными массивами; при меньшем количестве каналов
+# поканальный расчёт числами float быстрее (время вызова функции
+# numpy больше времени самого расчёта)
+LAYOUT_MIN_CHANNELS = 32
+
+
+def flat_values(v):
+    """Преобразование значения генератора с известным количеством каналов
+    (см. GradGen.get_n_channels()) - одномерного массива numpy или
+    линейного списка float - в линейный список без проверок, выполняемых
+    unwrap_lol() (используется при поканальном расчёте значений, см.
+    LAYOUT_MIN_CHANNELS)."""
+
+    if isinstance(v, np.ndarray):
+        return v.tolist()
+
+    if isinstance(v, list):
+        return v
+
+    return unwrap_lol(v)
+
+
 def channels_to_str(channels, barlen=None):
     """Пребразование списка/кортежа, содержащего значения float
     в диапазоне 0.0-1.0 (и/или кортежи с такими значениями) в строку
@@ -215,6 +375,69 @@ def check_float_positive(f):
     raise ValueError('value out of range')
 
 
+def iter_slots(obj):
+    """Перебор полей экземпляра класса, объявленных в __slots__ класса
+    и его предков (кроме __dict__ и __weakref__).
+
+    Функция возвращает итератор кортежей (имя поля, значение); поля,
+    которым значение не присвоено, пропускаются; имена "приватных" полей
+    возвращаются в изменённом виде (_ИмяКласса__поле)."""
+
+    # __slots__ каждого класса содержат только его собственные поля,
+    # поэтому перебираются все предки - от базового класса к потомкам
+    for cls in reversed(obj.__class__.__mro__):
+        slots = cls.__dict__.get('__slots__', ())
+        if isinstance(slots, str):
+            slots = (slots,)
+
+        for k in slots:
+            if k in ('__dict__', '__weakref__'):
+                continue
+
+            # "приватные" поля хранятся под изменёнными именами
+            an = '_%s%s' % (cls.__name__.lstrip('_'), k) if k.startswith('__') and not k.endswith('__') else k
+
+            try:
+                v = getattr(obj, an)
+            except AttributeError:
+                # значение не присвоено
+                continue
+
+            yield (an, v)
+
+
+def deepcopy_sharing(obj, memo, *shared):
+    """Глубокое копирование экземпляра класса с __slots__ (для методов
+    obj.__deepcopy__()), при котором объекты shared не копируются,
+    а используются копией совместно с obj (например, открытые файлы
+    изображений и объекты с потоками, которые copy.deepcopy() копирует
+    в неработоспособном виде).
+
+    Параметры:
+        obj     - экземпляр класса;
+        memo    - словарь, переданный методу __deepcopy__();
+        shared  - объекты, которые не следует копировать (значения None
+                  пропускаются).
+
+    Функция возвращает копию obj."""
+
+    for o in shared:
+        if o is not None:
+            memo[id(o)] = o
+
+    ret = obj.__class__.__new__(obj.__class__)
+    memo[id(obj)] = ret
+
+    for an, v in iter_slots(obj):
+        setattr(ret, an, copy.deepcopy(v, memo))
+
+    d = getattr(obj, '__dict__', None)
+    if d:
+        ret.__dict__.update(copy.deepcopy(d, memo))
+
+    return ret
+
+
 def repr_to_str(obj, sli=False):
     """Форматирование строки с именем класса и значениями полей экземпляра
     класса для использования в методах obj.__repr__().
@@ -246,19 +469,140 @@ def repr_to_str(obj, sli=False):
 
         return i
 
-    def __repr_dict(dname):
-        d = getattr(obj, dname, None)
+    def __repr_slots():
+        for an, v in iter_slots(obj):
+            r.append('%s=%s' % (an, __repr_item(v)))
+
+    def __repr_dict():
+        d = getattr(obj, '__dict__', None)
         if d:
             for k, v in d.items():
                 r.append('%s=%s' % (k, __repr_item(v)))
 
-    __repr_dict('__dict__')
-    __repr_dict('__slots__')
+    __repr_slots()
+    __repr_dict()
 
     return '%s(%s)' % (obj.__class__.__name__,
         ', '.join(r))
 
 
+class ShuffleStream():
+    """Поток целых 0 <= N < length в случайном порядке без повторов:
+    значения выдаются перестановками (каждое значение - ровно один раз
+    за length значений), и первое значение очередной перестановки
+    не совпадает с последним значением предыдущей (кроме length == 2 -
+    иначе перестановки двух значений не были бы случайными, и значения
+    просто чередовались бы).
+
+    Перестановка номер k расчитывается от энтропии потока и k,
+    поэтому любое значение потока можно получить сразу, без расчёта
+    предыдущих (см. value_at()).
+
+    Поля:
+        length  - целое >= 2, количество значений;
+        entropy - целое, энтропия генератора случайных чисел numpy
+                  (numpy.random.SeedSequence);
+        count   - количество уже выданных значений;
+        order   - текущая перестановка (массив numpy) или None;
+        orderNo - номер текущей перестановки."""
+
+    __slots__ = ('length', 'entropy', 'count', 'order', 'orderNo')
+
+    def __init__(self, length, seed=None):
+        """Параметры:
+            length  - см. описание поля;
+            seed    - None или целое >= 0; если None - порядок значений
+                      случайный, иначе - определяется значением seed."""
+
+        self.length = length
+        self.reseed(seed)
+
+    def __repr__(self):
+        return repr_to_str(self)
+
+    def reseed(self, seed=None):
+        """Смена энтропии (см. параметр seed конструктора) и возврат
+        к началу потока."""
+
+        self.entropy = np.random.SeedSequence(seed).entropy
+        self.rewind()
+
+    def rewind(self):
+        """Возврат к началу потока (без смены энтропии)."""
+
+        self.count = 0
+        self.order = None
+        self.orderNo = -1
+
+    def __shuffle(self, k):
+        return np.random.default_rng(np.random.SeedSequence(self.entropy,
+            spawn_key=(k,))).permutation(self.length)
+
+    def get_order(self, k):
+        """Возвращает перестановку номер k (массив numpy)."""
+
+        order = self.__shuffle(k)
+
+        if self.length == 2:
+            # без повторов на стыке перестановок вариант был бы один -
+            # поочерёдно, независимо от seed
+            return order
+
+        # меняются местами только первые два значения, т.ч. последнее
+        # значение перестановки от предыдущей не зависит
+        prev = self.__shuffle(k - 1)[-1] if k > 0 else 0
+        if order[0] == prev:
+            order[0], order[1] = order[1], order[0]
+
+        return order
+
+    def value_at(self, ix):
+        """Возвращает значение номер ix (от начала потока)."""
+
+        k, i = divmod(ix, self.length)
+
+        return int(self.get_order(k)[i])
+
+    def seek(self, ix):
+        """Переход к значению номер ix (от начала потока)."""
+
+        self.count = ix
+
+    def take(self, n):
+        """Возвращает n очередных значений (одномерный массив numpy)."""
+
+        ret = []
+
+        while n > 0:
+            k, i = divmod(self.count, self.length)
+            if k != self.orderNo:
+                self.order = self.get_order(k)
+                self.orderNo = k
+
+            chunk = self.order[i:i + n]
+            ret.append(chunk)
+
+            self.count += len(chunk)
+            n -= len(chunk)
+
+        if not ret:
+            return np.empty(0, dtype=np.intp)
+
+        return np.concatenate(ret)
+
+    def next_value(self):
+        """Возвращает очередное значение."""
+
+        k, i = divmod(self.count, self.length)
+        if k != self.orderNo:
+            self.order = self.get_order(k)
+            self.orderNo = k
+
+        self.count += 1
+
+        return int(self.order[i])
+
+
 class GradPosition():
     """Счетчик положения для выборки значений.
 
@@ -269,14 +613,24 @@ class GradPosition():
                       на 1 по достижении крайних значений;
         direction   - целое, -1 или 1, приращение положения;
         mode        - целое, управляет поведением при достижении
-                      крайних значений (см. ниже).
+                      крайних значений (см. ниже);
+        seed        - None или целое >= 0 - начальное значение генератора
+                      случайных чисел для режима RANDOM; если указано -
+                      после каждого вызова begin() выдаётся одна и та же
+                      последовательность значений.
 
     Поведение при достижении крайних значений:
         STOP    - изменение value прекращается;
         REPEAT  - генерация продолжается с начала (value=0);
         MIRROR  - инвертируется знак direction, генерация идёт
                   "задом наперёд" до достижения value==0, и т.д.;
-        RANDOM  - возвращает случайное значение 0 <= N < length."""
+        RANDOM  - возвращает значения 0 <= N < length в случайном порядке
+                  без повторов (см. класс ShuffleStream); при length == 2
+                  значения выдаются случайными парами (0, 1) или (1, 0),
+                  т.е. одно значение может повториться на стыке пар."""
+
+    __slots__ = ('value', 'length', 'ncycles', 'direction', 'mode', 'seed',
+        '__shuffle')
 
     __MODES = 4
     __MIN_MODE = 0
@@ -285,13 +639,17 @@ class GradPosition():
 
     DEFAULT_TICK_INTERVAL = 1000/30  # 30 fps в миллисекундах
 
-    def __init__(self, length=1, mode=STOP, direction=1, interval=DEFAULT_TICK_INTERVAL):
+    def __init__(self, length=1, mode=STOP, direction=1, interval=DEFAULT_TICK_INTERVAL,
+                 seed=None):
         """Инициализация счётчика положения градиента с указанными
         параметрами.
 
         Параметры:
             l, interval     - см. описание метода set_length();
-            mode, direction - см. описание соотв. полей класса."""
+            mode, direction, seed - см. описание соотв. полей класса."""
+
+        self.seed = seed
+        self.__shuffle = None
 
         self.set_length(length, interval)
         self.set_mode(mode)
@@ -381,6 +739,17 @@ class GradPosition():
         self.direction = 1
         self.ncycles += 1
 
+        if self.__shuffle is not None:
+            self.__shuffle.reseed(self.seed)
+
+    def __get_shuffle(self):
+        # поток значений для режима RANDOM; создаётся при первом обращении
+        # и при изменении length
+        if self.__shuffle is None or self.__shuffle.length != self.length:
+            self.__shuffle = ShuffleStream(self.length, self.seed)
+
+        return self.__shuffle
+
     def end(self, back=False):
         """Установка полей в конечные значения"""
 
@@ -419,10 +788,183 @@ class GradPosition():
                 self.direction = - self.direction
                 self.ncycles += 1
         else: #RANDOM
-            self.value = randint(0, _lv)
+            self.value = self.__get_shuffle().next_value()
+
+        return self.value
+
+    def __step(self, n):
+        # пошаговое продвижение - для состояний, которые не описываются
+        # формулами методов advance() и indices() (value вне диапазона)
+        ixs = np.empty(n, dtype=np.intp)
+
+        for i in range(n):
+            ixs[i] = self.value
+            self.next_value()
+
+        return ixs
+
+    def __mirror_phase(self):
+        # положение в режиме MIRROR как фаза 0 <= p < 2 * (length - 1)
+        # "треугольной" волны: прямой ход - p = value, обратный -
+        # p = 2 * (length - 1) - value
+        lv = self.length - 1
+
+        return self.value if self.direction > 0 else (2 * lv - self.value) % (2 * lv)
+
+    def advance(self, n=1):
+        """Продвижение счётчика на n значений.
+        Результат (в т.ч. значения полей direction и ncycles) совпадает
+        с результатом n вызовов next_value(), но расчитывается сразу,
+        без цикла.
+
+        Параметры:
+            n   - целое >= 0.
+
+        Возвращает полученное значение value."""
+
+        if n <= 0 or self.length < 2:
+            return self.value
+
+        lv = self.length - 1
+
+        if not 0 <= self.value <= lv:
+            self.__step(n)
+        elif self.mode == self.STOP:
+            if self.value < lv:
+                if self.direction > 0:
+                    n = min(n, lv - self.value)
+
+                self.value += self.direction * n
+                self.ncycles += n
+        elif self.mode == self.REPEAT:
+            total = self.value + self.direction * n
+
+            # количество "переходов" через край
+            self.ncycles += total // self.length if self.direction > 0 else -(total // self.length)
+            self.value = total % self.length
+        elif self.mode == self.MIRROR:
+            period = 2 * lv
+            p0 = self.__mirror_phase()
+
+            # отражения происходят при переходе из фаз, кратных lv;
+            # в состояниях (0, 1) и (lv, -1) отражения на первом шаге нет
+            bounces = (p0 + n - 1) // lv - (p0 - 1) // lv
+            if (self.value == 0 and self.direction > 0) or (self.value == lv and self.direction < 0):
+                bounces -= 1
+
+            self.ncycles += bounces
+
+            p = (p0 + n) % period
+            if p == 0:
+                self.value, self.direction = 0, -1
+            elif p <= lv:
+                self.value, self.direction = p, 1
+            else:
+                self.value, self.direction = period - p, -1
+        else: #RANDOM
+            shuffle = self.__get_shuffle()
+            shuffle.seek(shuffle.count + n - 1)
+            self.value = shuffle.next_value()
 
         return self.value
 
+    def indices(self, n):
+        """Продвижение счётчика на n значений (см. advance()).
+
+        Возвращает одномерный массив numpy (np.intp) из n значений поля
+        value - тех, что были бы перед каждым из n вызовов next_value(),
+        т.е. номеров значений для выборки из буфера."""
+
+        if n <= 0:
+            return np.empty(0, dtype=np.intp)
+
+        lv = self.length - 1
+
+        if lv < 1:
+            return np.full(n, self.value, dtype=np.intp)
+
+        if not 0 <= self.value <= lv:
+            return self.__step(n)
+
+        if self.mode == self.RANDOM:
+            draws = self.__get_shuffle().take(n)
+
+            ixs = np.empty(n, dtype=np.intp)
+            ixs[0] = self.value
+            ixs[1:] = draws[:-1]
+
+            self.value = int(draws[-1])
+
+            return ixs
+
+        steps = np.arange(n, dtype=np.intp)
+
+        if self.mode == self.STOP:
+            if self.value >= lv:
+                ixs = np.full(n, self.value, dtype=np.intp)
+            elif self.direction > 0:
+                ixs = np.minimum(self.value + steps, lv)
+            else:
+                ixs = self.value - steps
+        elif self.mode == self.REPEAT:
+            ixs = (self.value + self.direction * steps) % self.length
+        else: #MIRROR
+            period = 2 * lv
+            ixs = (self.__mirror_phase() + steps) % period
+            ixs = np.where(ixs <= lv, ixs, period - ixs)
+
+        self.advance(n)
+
+        return ixs
+
+    def seek(self, tick):
+        """Установка счётчика в состояние, в котором он был бы после
+        вызова begin() и tick вызовов next_value().
+
+        В режиме RANDOM при seed == None используется текущая
+        последовательность значений (т.е. та, что была выбрана при
+        последнем вызове begin()).
+
+        Возвращает полученное значение value."""
+
+        self.value = 0
+        self.direction = 1
+        self.ncycles += 1
+
+        if self.__shuffle is not None:
+            self.__shuffle.rewind()
+
+        return self.advance(tick)
+
+    def get_values_key(self):
+        """Возвращает кортеж, однозначно определяющий последовательность
+        значений счётчика после вызова begin() (см. GradGen.get_values_key()),
+        или None, если она заранее не определена (режим RANDOM без seed)."""
+
+        if self.mode == self.RANDOM:
+            if self.seed is None:
+                return None
+
+            return (self.length, self.mode, self.seed)
+
+        return (self.length, self.mode)
+
+    def value_at(self, tick):
+        """Возвращает значение поля value, которое было бы после вызова
+        begin() и tick вызовов next_value(), не меняя состояния счётчика
+        (в режиме RANDOM - см. seek())."""
+
+        if self.mode == self.RANDOM:
+            if tick <= 0 or self.length < 2:
+                return 0
+
+            return self.__get_shuffle().value_at(tick - 1)
+
+        p = GradPosition(mode=self.mode)
+        p.length = self.length
+
+        return p.advance(tick)
+
 
 class GradGen():
     """Базовый класс генератора градиентов.
@@ -434,16 +976,24 @@ class GradGen():
     Поля класса (могут быть перекрыты и/или дополнены классом-потомком):
         DEFAULT_MODE - значение, которое будет использовано
                       счётчиком положения, если ему не передавать соотв.
-                      параметр; по умолчанию - GradPosition.STOP.
+                      параметр; по умолчанию - GradPosition.STOP;
+        SEEK_BLOCK_SIZE - см. метод seek().
 
     Поля экземпляров класса (могут быть дополнены классом-потомком):
-        position    - экземпляр GradPosition;
+        position    - экземпляр GradPosition (параметры конструктора
+                      length, mode и seed передаются ему);
         name        - отображаемое имя (для отладки и т.п.);
                       если не указано при вызове конструктора -
                       генерируется автоматически."""
 
+    __slots__ = ('position', 'name')
+
     DEFAULT_MODE = GradPosition.STOP
 
+    # количество значений, получаемых за одно обращение реализацией
+    # метода seek() по умолчанию
+    SEEK_BLOCK_SIZE = 1024
+
     @staticmethod
     def kwargs_get(args, pname, fallback=None, fchkval=None):
         """Получение параметра из словаря.
@@ -494,7 +1044,7 @@ class GradGen():
         если требуется обработать "наследственные" параметры."""
 
         self.position = GradPosition(kwargs.get('length', 1),
-            kwargs.get('mode', self.DEFAULT_MODE))
+            kwargs.get('mode', self.DEFAULT_MODE), seed=kwargs.get('seed', None))
 
         self.name = kwargs.get('name', '%s%x' % (self.__class__.__name__, id(self)))
 
@@ -523,6 +1073,53 @@ class GradGen():
 
         return self.name
 
+    def get_subgens(self):
+        """Возвращает список вложенных генераторов (экземпляров GradGen),
+        от которых этот генератор получает значения.
+        Генераторы, содержащие другие генераторы, должны перекрывать
+        этот метод."""
+
+        return []
+
+    def get_n_channels(self):
+        """Метод возвращает количество каналов (float) в значении,
+        возвращаемом методом get_next_value() (после разворачивания
+        функцией unwrap_lol()), или None, если оно заранее неизвестно.
+
+        Количество каналов не меняется от значения к значению, поэтому
+        генераторы, содержащие другие генераторы, расчитывают раскладку
+        своих каналов один раз (см. метод update_layout()) и записывают
+        значения вложенных генераторов в одно линейное значение без
+        разворачивания на каждом значении.
+        Метод должен быть перекрыт классом-потомком, если количество
+        каналов известно; значение None оставлено для совместимости
+        с "самодельными" генераторами."""
+
+        return None
+
+    def get_values_key(self):
+        """Метод возвращает кортеж из простых значений (строк, чисел,
+        кортежей), однозначно определяющий последовательность значений,
+        выдаваемых генератором после вызова reset(), или None, если
+        последовательность заранее не определена (например, у генераторов
+        шума и в режиме GradPosition.RANDOM, если не указан seed) или если генератор
+        не умеет её описывать (по умолчанию).
+        Используется для кэширования расчитанных буферов (см. класс
+        RenderCache и метод BufferedGradGen.get_buffer_key())."""
+
+        return None
+
+    def update_layout(self):
+        """Расчёт раскладки каналов генератора по количествам каналов
+        вложенных генераторов (см. get_n_channels()).
+        Вызывается генераторами, содержащими другие генераторы, из метода
+        reset() (после сброса вложенных генераторов) и при изменении
+        списка вложенных генераторов.
+        При несовпадении количеств каналов вложенных генераторов метод
+        генерирует исключение ValueError."""
+
+        pass
+
     def reset(self):
         """Сброс полей в начальные значения и расчёт значений, которые
         не требуется считать "на лету".
@@ -593,656 +1190,3829 @@ class GradGen():
 
     def get_next_value(self):
         """Метод возвращает очередное значение градиента в виде float
-        0.0-1.0 или списка/кортежа таких значений,
-        и увеличивает при необходимости счётчик.
+        0.0-1.0 или списка/кортежа (или одномерного массива numpy)
+        таких значений, и увеличивает при необходимости счётчик.
+        Возвращаемый массив numpy может использоваться генератором
+        повторно, т.е. его содержимое действительно только до следующего
+        вызова get_next_value().
         Метод должен быть перекрыт классом-потомком."""
 
         raise NotImplementedError()
 
         #self.position.next_value()
 
+    def get_next_values(self, n):
+        """Метод возвращает n очередных значений градиента в виде
+        двумерного массива numpy (n строк, столбцы - каналы) с элементами
+        типа FRAME_DTYPE, и продвигает счётчик на n значений.
 
-class BufferedGradGen(GradGen):
-    """Генератор, хранящий заранее расчитанные значения в буфере.
+        Результат должен совпадать с результатом n последовательных
+        вызовов get_next_value().
+        Реализация по умолчанию так и делает, классы-потомки могут
+        перекрывать метод более эффективной реализацией."""
 
-    Поля (могут быть дополнены классом-потомком):
-        buffer      - список float (или списков/кортежей float)
-                      в диапазоне 0.0-1.0, из которого ведётся выборка
-                      сгенерированных значений;
-        clearBuf    - булевское значение; если равно True (по умолчанию) -
-                      buffer очищается при вызове метода reset()."""
+        # значения разворачиваются сразу - get_next_value() может
+        # возвращать один и тот же массив
+        return frames_to_block([unwrap_lol(self.get_next_value()) for i in range(n)])
 
-    def init_attrs(self, **kwargs):
-        super().init_attrs(**kwargs)
+    def write_next_value(self, out):
+        """Метод записывает очередное значение градиента в одномерный
+        массив numpy out (get_n_channels() элементов типа FRAME_DTYPE,
+        обычно - часть значения генератора, содержащего этот генератор)
+        и увеличивает при необходимости счётчик.
+        Результат должен совпадать с результатом get_next_value().
 
-        self.clearBuf = kwargs.get('clearBuf', True)
-        self.buffer = []
+        Метод предназначен для расчёта значений деревьев генераторов без
+        выделения памяти на каждое значение: генераторы, содержащие другие
+        генераторы, передают вложенным генераторам части своего значения.
+        Реализация по умолчанию копирует в out значение get_next_value(),
+        классы-потомки перекрывают метод более эффективной реализацией.
 
-        d = kwargs.get('data', None)
-        if d:
-            self.set_buffer_data(d)
+        Метод возвращает out."""
 
-    def reset(self):
-        """Заполнение списка buffer сгенерированными значениями,
-        в дополнение к дейстивиям метода GradGen.reset()."""
+        v = self.get_next_value()
+        out[:] = v if isinstance(v, np.ndarray) else unwrap_lol(v)
 
-        super().reset()
+        return out
 
-        if self.clearBuf:
-            self.buffer.clear()
+    def seek(self, tick):
+        """Установка генератора (и вложенных генераторов) в состояние,
+        в котором он был бы после вызова reset() и tick вызовов
+        get_next_value() - например, для начала воспроизведения
+        не с начала.
 
-    def set_buffer_data(self, d):
-        self.buffer = list(d)
-        self.position.set_length(self.buffer)
+        Реализация по умолчанию так и делает (т.е. работает за время,
+        пропорциональное tick); классы-потомки перекрывают метод
+        реализацией, не зависящей (или почти не зависящей) от tick.
 
-    def get_next_value(self):
-        ret = self.buffer[self.position.value]
+        Внимание! Генераторы, входящие в состав нескольких разных
+        генераторов, устанавливаются так, как если бы их использовал
+        только один из них."""
 
-        self.position.next_value()
+        self.reset()
 
-        return ret
+        while tick > 0:
+            k = min(tick, self.SEEK_BLOCK_SIZE)
+            self.get_next_values(k)
+            tick -= k
 
+    def value_at(self, tick):
+        """Возвращает значение, которое вернул бы get_next_value() после
+        вызова reset() и tick вызовов get_next_value(), не меняя состояния
+        генератора.
 
-class LineGradGen(BufferedGradGen):
-    """Генератор линейного градиента.
-    Может быть использован для генерации пилообразных (с mode=GradPosition.REPEAT)
-    и треугольных волн (mode=GradPosition.MIRROR).
+        Реализация по умолчанию выполняет seek() на копии генератора,
+        классы-потомки перекрывают метод более эффективной реализацией.
+        Так как seek() вызывает reset(), при котором генераторы
+        со случайными значениями без seed (см. has_random_values())
+        выбирают новую последовательность, реализация по умолчанию
+        для деревьев с такими генераторами генерирует исключение
+        ValueError. Собственные реализации классов-потомков (буферизованные
+        генераторы, NoiseGen и т.п.) в этом случае возвращают значение
+        текущей последовательности (выбранной при последнем вызове
+        reset())."""
 
-    Поля:
-        channelsFrom, channelsTo  - кортежи из одного и более float
-            в диапазоне 0.0-1.0;
-            количество значений в обоих кортежах может совпадать.
-        Количество значений в переходе управляется полем position.length."""
+        for g in iter_tree(self):
+            if g.has_random_values():
+                raise ValueError('%s.value_at(): values of generator "%s" are random (seed is not specified) and cannot be reproduced' % (self.__class__.__name__, g.name))
 
-    def init_attrs(self, **kwargs):
-        """Параметры (в дополнение к "наследственным"):
-            channelsFrom, channelsTo (см. описания одноимённых полей);
-                их значения могут быть указаны в виде кортежей или преобразованы
-                из значений цветов вызовами hls_to_rgb(), str_to_rgb()."""
+        gen = copy.deepcopy(self)
+        gen.seek(tick)
 
-        super().init_attrs(**kwargs)
+        return gen.get_next_value()
 
-        self.channelsFrom = self.kwargs_get_tof(kwargs, 'channelsFrom', (0,), None, check_float_range_1)
-        self.channelsTo = self.kwargs_get_tof(kwargs, 'channelsTo', (MAX_VALUE,), len(self.channelsFrom), check_float_range_1)
+    def has_random_values(self):
+        """Возвращает True, если значения генератора случайны и не
+        повторяются после reset() (т.е. seed не указан).
+        Реализация по умолчанию проверяет режим GradPosition.RANDOM,
+        метод перекрывается генераторами шума."""
 
-    def reset(self):
-        super().reset()
+        return self.position.mode == GradPosition.RANDOM and self.position.seed is None
 
-        _len = self.position.length - 1
 
-        deltas = []
-        cvals = []
+class RenderCache():
+    """Дисковый кэш расчитанных буферов BufferedGradGen.
 
-        for ci, cFrom in enumerate(self.channelsFrom):
-            deltas.append((self.channelsTo[ci] - cFrom) / _len)
-            cvals.append(cFrom)
+    Буферы хранятся в каталоге в виде файлов .npy, имена которых -
+    хэши ключей (см. BufferedGradGen.get_cache_key()), и загружаются
+    отображением в память (без копирования и без расчёта).
+    Если общий размер файлов превышает maxSize - удаляются файлы,
+    к которым дольше всего не было обращений (по времени модификации,
+    которое обновляется при каждой загрузке).
 
-        for i in range(self.position.length):
-            self.buffer.append(tuple(cvals))
+    Для использования кэша экземпляр RenderCache присваивается полю
+    класса BufferedGradGen.renderCache (для всех буферизованных
+    генераторов) или полю renderCache конкретного класса-потомка.
 
-            for ci, cval in enumerate(cvals):
-                cvals[ci] = cval + deltas[ci]
+    Поля:
+        directory   - строка, путь к каталогу кэша (создаётся
+                      при необходимости);
+        maxSize     - положительное целое, максимальный общий размер
+                      файлов в байтах."""
 
+    DEFAULT_MAX_SIZE = 256 * 1024 * 1024
 
-class ImageGradGen(BufferedGradGen):
-    """Возвращает данные из растрового изображения.
+    FILE_EXT = '.npy'
 
-    Поля экземпляра класса (в дополнение к полям GradGen):
-        image       - экземпляр PIL.Image;
-        horizontal  - булевское значение или None (по умолчанию)
-                      True  - генератор получает данные из строки
-                              изображения,
-                      False - из столбца,
-                      None  - автоматическое определение по пропорциям
-                              изображения;
-        srcx, srcy  - начальные координаты строки или столбца в изображении;
-                      по умолчанию - 0, 0;
-        channels    - кортеж целых чисел, каналы изображения
-                      (0 - R, 1 - G и т.п.).
+    def __init__(self, directory, maxSize=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.maxSize = maxSize
 
-    Для получения нескольких каналов изображения есть два варианта действий:
-    1. создать один ImageGradGen с указанием нескольких каналов;
-    2. создать соответствующее количество экземпляров ImageGradGen с указанием
-       каналов и эти экземпляры добавить в экземпляр ParallelGenGradGen;
-       в этом случае можно использовать каналы из разных изображений."""
+        os.makedirs(self.directory, exist_ok=True)
 
-    def init_attrs(self, **kwargs):
-        """Параметры: см. описание полей экземпляра класса."""
+    def __repr__(self):
+        return repr_to_str(self)
 
-        super().init_attrs(**kwargs)
+    @staticmethod
+    def make_digest(key):
+        """Возвращает строку - хэш ключа key (кортежа из простых
+        значений), не зависящий от процесса интерпретатора."""
 
-        self.image = kwargs.get('image', None)
-        if not self.image:
-            raise ValueError('"image" parameter not specified')
+        return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
 
-        if self.image.mode not in ('L', 'RGB', 'RGBA'):
-            raise ValueError('unsupported image format')
+    def get_file_name(self, digest):
+        return os.path.join(self.directory, digest + self.FILE_EXT)
 
-        srcchnls = kwargs.get('channels', None)
-        if srcchnls is None:
-            if self.image.mode == 'L':
-                self.channels = (0,)
-            else:
-                # 'RGB', 'RGBA'
-                # если нужно использовать и альфа-канал - следует указывать каналы в параметре явно
-                self.channels = (0, 1, 2)
-        else:
-            #TODO возможно, следует добавить проверку на правильность значений номеров каналов в параметре channels
-            if len(srcchnls) > len(self.image.mode): #!!!!
-                raise ValueError('too many channel numbers specified')
+    def load(self, key):
+        """Загрузка буфера из кэша.
 
-            self.channels = tuple(srcchnls)
+        Параметры:
+            key - кортеж, ключ буфера.
 
-        self.horizontal = kwargs.get('horizontal', None)
-        if self.horizontal is None:
-            self.horizontal = self.image.width > self.image.height
+        Метод возвращает двумерный массив numpy, отображённый в память
+        (только для чтения), или None, если такого буфера в кэше нет."""
 
-        self.srcx = kwargs.get('srcx', 0)
-        self.srcy = kwargs.get('srcy', 0)
+        fname = self.get_file_name(self.make_digest(key))
 
-    def reset(self):
-        # проверяем выход за границы именно здесь, т.к. length/srcx/srcy
-        # могут быть изменены уже после создания экземпляра класса
+        try:
+            buf = np.load(fname, mmap_mode='r', allow_pickle=False)
+            # обращение к файлу - для вытеснения давно не нужных
+            os.utime(fname)
+        except (OSError, ValueError):
+            # нет файла, или он повреждён (например, кэш чистили
+            # во время загрузки)
+            return None
 
-        __E_OUT_OF_IMAGE = 'gradient goes beyond the boundaries of the image'
+        # np.memmap -> обычный ndarray без копирования
+        return np.asarray(buf)
 
-        if self.horizontal:
-            self.position.length = self.image.width
+    def store(self, key, buf):
+        """Сохранение буфера в кэш.
 
-            if (self.srcx + self.position.length) > self.image.width:
-                raise IndexError(__E_OUT_OF_IMAGE)
+        Параметры:
+            key - кортеж, ключ буфера;
+            buf - двумерный массив numpy.
 
-            dx = 1
-            dy = 0
-        else:
-            self.position.length = self.image.height
+        Файл записывается под временным именем и затем переименовывается,
+        поэтому кэшем могут одновременно пользоваться несколько
+        процессов."""
 
-            if (self.srcy + self.position.length) > self.image.height:
-                raise IndexError(__E_OUT_OF_IMAGE)
+        fd, tmpname = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
 
-            dx = 0
-            dy = 1
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, buf, allow_pickle=False)
 
-        super().reset()
+            os.replace(tmpname, self.get_file_name(self.make_digest(key)))
+        except:
+            os.remove(tmpname)
+            raise
 
-        x = self.srcx
-        y = self.srcy
-        for i in range(self.position.length):
-            pixel = self.image.getpixel((x, y))
-            self.buffer.append(tuple(map(lambda c: pixel[c] / 255.0, self.channels)))
+        self.evict()
 
-            x += dx
-            y += dy
+    def evict(self, maxSize=None):
+        """Удаление давно не использовавшихся файлов, пока их общий
+        размер превышает maxSize (если None - self.maxSize)."""
 
+        if maxSize is None:
+            maxSize = self.maxSize
 
-class GenRecorderGen(BufferedGradGen):
-    """Генератор, однократно засасывающий себе в буфер выхлоп
-    другого генератора, и воспроизводящий эти значения.
+        files = []
+        total = 0
 
-    Предназначен для буферизации выхлопов сложного нагромождения
-    вложенных генераторов, если вдруг не хочется их гонять по циклу
-    много раз."""
+        with os.scandir(self.directory) as itr:
+            for entry in itr:
+                if entry.name.endswith(self.FILE_EXT) and entry.is_file():
+                    st = entry.stat()
+                    files.append((st.st_mtime, st.st_size, entry.path))
+                    total += st.st_size
+
+        files.sort()
+
+        for mtime, size, path in files:
+            if total <= maxSize:
+                break
+
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+            total -= size
+
+    def clear(self):
+        """Удаление всех файлов кэша."""
+
+        self.evict(0)
+
+
+class BufferedGradGen(GradGen):
+    """Генератор, хранящий заранее расчитанные значения в буфере.
+
+    Поля класса (могут быть перекрыты классом-потомком):
+        DEFAULT_BUF_DTYPE - тип элементов буфера по умолчанию
+                      (FRAME_DTYPE);
+        renderCache - None (по умолчанию) или экземпляр RenderCache -
+                      дисковый кэш расчитанных буферов.
+
+    Классы-потомки расчитывают значения буфера в методе render_buffer(),
+    который вызывается методом reset(), если буфера с таким же ключом
+    (см. get_buffer_key()) нет в кэше.
+
+    Поля (могут быть дополнены классом-потомком):
+        buffer      - двумерный массив numpy (строки - значения,
+                      столбцы - каналы), из которого ведётся выборка
+                      сгенерированных значений;
+        bufDtype    - тип элементов буфера:
+                      np.float32 или np.float64 - значения float
+                        в диапазоне 0.0-1.0,
+                      np.uint8 - значения, преобразованные в целые
+                        0-255 (вчетверо экономнее float32, но при выборке
+                        значения преобразуются обратно во float);
+        clearBuf    - булевское значение; если равно True (по умолчанию) -
+                      buffer очищается при вызове метода reset();
+        shareBuf    - булевское значение; если равно True (по умолчанию) -
+                      генераторы с одинаковыми ключами буфера (см.
+                      get_cache_key()) используют один общий буфер
+                      (только для чтения), который расчитывается один раз;
+                      у каждого генератора остаётся только собственный
+                      счётчик положения."""
+
+    __slots__ = ('buffer', 'bufDtype', 'clearBuf', 'shareBuf')
+
+    DEFAULT_BUF_DTYPE = FRAME_DTYPE
+
+    renderCache = None
+
+    # общие буферы генераторов с shareBuf == True; ключи - значения,
+    # возвращаемые get_cache_key(); буфер удаляется из словаря, когда
+    # его перестают использовать все генераторы
+    __sharedBuffers = weakref.WeakValueDictionary()
+
+    __BUF_DTYPES = (np.dtype(np.float32), np.dtype(np.float64), np.dtype(np.uint8))
 
     def init_attrs(self, **kwargs):
         super().init_attrs(**kwargs)
 
-        self.sourcegen = self.kwargs_get(kwargs, 'sourcegen')
+        self.clearBuf = kwargs.get('clearBuf', True)
+        self.shareBuf = kwargs.get('shareBuf', True)
+
+        self.bufDtype = np.dtype(kwargs.get('bufDtype', self.DEFAULT_BUF_DTYPE))
+        if self.bufDtype not in self.__BUF_DTYPES:
+            raise ValueError('%s.init_attrs(): unsupported bufDtype value' % self.__class__.__name__)
+
+        self.clear_buffer()
+
+        d = kwargs.get('data', None)
+        if d is not None and len(d):
+            self.set_buffer_data(d)
 
     def reset(self):
+        """Заполнение буфера сгенерированными значениями,
+        в дополнение к дейстивиям метода GradGen.reset()."""
+
         super().reset()
 
-        n = self.sourcegen.get_n_values()
-        while n > 0:
-            self.buffer.append(unwrap_lol(self.sourcegen.get_next_value()))
-            n -= 1
+        cache = self.renderCache
+        key = self.get_cache_key() if cache is not None or self.shareBuf else None
 
+        # общий буфер ищется до clear_buffer(), т.к. собственный буфер
+        # генератора может оказаться последней ссылкой на него
+        if key is not None and self.shareBuf:
+            buf = self.__sharedBuffers.get(key)
+            if buf is not None:
+                self.set_buffer_data(buf)
+                return
 
-class ConstantGradGen(GradGen):
-    """Псевдо-генератор, выдающий постоянные значения.
+        if self.clearBuf:
+            self.clear_buffer()
 
-    Поля экземпляра класса:
-        values   - кортеж из float в диапазоне 0.0-1.0.
+        if key is not None:
+            buf = cache.load(key) if cache is not None else None
+            if buf is not None:
+                self.set_buffer_data(buf)
+                self.__share_buffer(key)
+                return
 
-    Счетчик положения не используется."""
+        buf = self.render_buffer()
+        if buf is None:
+            return
 
-    def init_attrs(self, **kwargs):
-        """Параметры: см. описание полей экземпляра класса."""
+        self.set_buffer_data(buf)
 
-        super().init_attrs(**kwargs)
+        if key is not None:
+            if cache is not None:
+                cache.store(key, self.buffer)
 
-        self.values = self.kwargs_get_tof(kwargs, 'values', (0, ))
+            self.__share_buffer(key)
 
-    def get_next_value(self):
-        return self.values
+    def __share_buffer(self, key):
+        if self.shareBuf:
+            self.buffer.flags.writeable = False
+            self.__sharedBuffers[key] = self.buffer
 
+    def render_buffer(self):
+        """Расчёт значений буфера.
+        Метод вызывается из reset() и должен быть перекрыт классом-потомком.
 
-class NoiseGen(GradGen):
-    """Генератор шума.
+        Метод возвращает значения в любом виде, допустимом для метода
+        set_buffer_data(), или None, если буфер не требуется
+        заполнять (по умолчанию - например, если значения переданы
+        конструктору параметром data)."""
 
-    Поля экземпляра класса:
-        minValues, maxValues
-            - кортежи из float в диапазоне 0.0-1.0 с граничными значениями
-              для каналов.
+        return None
 
-    Счетчик положения не используется."""
+    def get_buffer_key(self):
+        """Метод возвращает кортеж из простых значений (строк, чисел,
+        кортежей), однозначно определяющий значения буфера, расчитываемые
+        методом render_buffer(), или None, если буфер не следует
+        кэшировать (по умолчанию).
+        Метод должен быть перекрыт классом-потомком, если значения
+        буфера зависят только от параметров генератора."""
 
-    def init_attrs(self, **kwargs):
-        super().init_attrs(**kwargs)
+        return None
 
-        self.minValues = self.kwargs_get_tof(kwargs, 'minValues', (0.0, ),
-                            None, check_float_range_1)
-        self.maxValues = self.kwargs_get_tof(kwargs, 'maxValues', (1.0, ),
-                            len(self.minValues), check_float_range_1)
+    def get_cache_key(self):
+        """Метод возвращает полный ключ буфера для RenderCache (с учётом
+        класса, ревизии модуля и bufDtype) или None, если буфер
+        не кэшируется."""
 
-    def reset(self):
-        pass
+        key = self.get_buffer_key()
+        if key is None:
+            return None
+
+        return ('%s.%s' % (self.__class__.__module__, self.__class__.__qualname__),
+                REVISION, self.bufDtype.str, key)
+
+    def get_values_key(self):
+        poskey = self.position.get_values_key()
+        if poskey is None:
+            return None
+
+        key = self.get_buffer_key()
+        if key is None:
+            return None
+
+        return (self.__class__.__qualname__, poskey, key)
+
+    def clear_buffer(self):
+        self.buffer = np.empty((0, 0), dtype=self.bufDtype)
+
+    def get_n_channels(self):
+        return self.buffer.shape[1] if len(self.buffer) else None
+
+    def set_buffer_data(self, d):
+        """Замена содержимого буфера и установка position.length
+        в соответствии с количеством значений.
+
+        Параметры:
+            d   - массив numpy (одномерный - по значению одного канала
+                  на строку, или двумерный - строки - значения,
+                  столбцы - каналы), или список/кортеж значений
+                  (float или списков/кортежей float);
+                  массив с элементами типа bufDtype используется
+                  без копирования;
+                  значения массива с элементами типа np.uint8 считаются
+                  уже преобразованными в целые 0-255."""
+
+        buf = d if isinstance(d, np.ndarray) else frames_to_block(list(d))
+
+        if buf.ndim != 2:
+            buf = buf.reshape(buf.shape[0], int(np.prod(buf.shape[1:])))
+
+        if buf.dtype != self.bufDtype:
+            if self.bufDtype == np.uint8:
+                buf = quantize_values(buf)
+            elif buf.dtype == np.uint8:
+                buf = np.multiply(buf, BYTE_TO_FLOAT, dtype=self.bufDtype)
+            else:
+                buf = buf.astype(self.bufDtype)
+
+        self.buffer = buf
+        self.position.set_length(self.buffer)
 
     def get_next_value(self):
-        ranges = [(self.maxValues[i] - minv) for i, minv in enumerate(self.minValues)]
+        ret = self.buffer[self.position.value]
 
-        ret = []
+        self.position.next_value()
 
-        for ci, minv in enumerate(self.minValues):
-            ret.append(minv + random() * ranges[ci])
+        if self.bufDtype == np.uint8:
+            return ret * BYTE_TO_FLOAT
 
         return ret
 
+    def write_next_value(self, out):
+        ret = self.buffer[self.position.value]
 
-class WaveGradGen(BufferedGradGen):
-    """Базовый класс для генераторов волн.
+        self.position.next_value()
 
-    Поле position.length задаёт количество значений в буфере.
-    Дополнительные поля (в дополнение к наследственным):
-        levels  - кортеж из одного и более float в диапазоне от 0 до 1.0 -
-                  максимальные значения уровней каналов;
-                  по умолчанию - (1.0, );
-                  количество каналов генератора задаётся этим параметром;
-        lowLevels - минимальные значения уровней каналов (аналогично
-                  полю levels);
-        periods - кортеж из одного и более положительных float,
-                  задаёт количество периодов волны для одного
-                  или нескольких каналов;
-                  если указано меньше значений, чем количество каналов -
-                  значения периодов повторяются циклически "до заполнения";
-        phases  - кортеж из одного и более float в диапазоне от 0 до 1.0 -
-                  значения фазы волны для генерируемых значений каналов;
-                  по умолчанию - (0.0, )
-                  если указано меньше значений, чем количество каналов -
-                  значения периодов повторяются циклически "до заполнения"."""
+        if self.bufDtype == np.uint8:
+            return np.multiply(ret, BYTE_TO_FLOAT, out=out)
 
-    def init_attrs(self, **kwargs):
-        """Параметры (в дополнение к наследуемым):
-            levels, phases, periods (см. описание полей выше);
-            Примечание: вместо кортежей этим параметрам можно присваивать
-            по одному значению float, в этом случае параметр будет
-            преобразован в кортеж из одного элемента."""
+        np.copyto(out, ret)
 
-        super().init_attrs(**kwargs)
+        return out
 
-        self.levels = self.kwargs_get_tof(kwargs, 'levels', (1.0, ), None, check_float_range_1)
-        _ll = len(self.levels)
+    def seek(self, tick):
+        self.position.seek(tick)
 
-        self.lowLevels = self.kwargs_get_tof(kwargs, 'lowLevels', (0.0, ), _ll, check_float_range_1)
+    def value_at(self, tick):
+        ret = self.buffer[self.position.value_at(tick)]
 
-        self.phases = self.kwargs_get_tof(kwargs, 'phases', (0.0, ), _ll, check_float_range_1)
+        if self.bufDtype == np.uint8:
+            return ret * BYTE_TO_FLOAT
 
-        self.periods = self.kwargs_get_tof(kwargs, 'periods', (1.0, ), _ll, check_float_positive)
+        return ret
 
+    def get_next_values(self, n):
+        ixs = self.position.indices(n)
 
-class SineWaveGradGen(WaveGradGen):
-    """Генератор синусоиды."""
+        if self.bufDtype == np.uint8:
+            return np.multiply(self.buffer[ixs], BYTE_TO_FLOAT, dtype=FRAME_DTYPE)
 
-    def reset(self):
-        super().reset()
+        return self.buffer[ixs].astype(FRAME_DTYPE, copy=False)
 
-        periodCf = []
-        phaseCf = []
-        amplCf = []
-        sinCf = []
 
-        for ci, level in enumerate(self.levels):
-            perlen = self.position.length / self.periods[ci]
-            periodCf.append(perlen)
-            phaseCf.append(perlen * self.phases[ci])
+class LineGradGen(BufferedGradGen):
+    """Генератор линейного градиента.
+    Может быть использован для генерации пилообразных (с mode=GradPosition.REPEAT)
+    и треугольных волн (mode=GradPosition.MIRROR).
 
-            amplitude = (level - self.lowLevels[ci]) / 2.0
-            amplCf.append((amplitude, level - amplitude))
+    Поля:
+        channelsFrom, channelsTo  - кортежи из одного и более float
+            в диапазоне 0.0-1.0;
+            количество значений в обоих кортежах может совпадать.
+        Количество значений в переходе управляется полем position.length."""
 
-            sinCf.append(2 * pi / perlen)
+    __slots__ = ('channelsFrom', 'channelsTo')
 
-        sinOffsetX = pi / 2 # дабы синусоида завсегда начиналась с минимального значения
+    def init_attrs(self, **kwargs):
+        """Параметры (в дополнение к "наследственным"):
+            channelsFrom, channelsTo (см. описания одноимённых полей);
+                их значения могут быть указаны в виде кортежей или преобразованы
+                из значений цветов вызовами hls_to_rgb(), str_to_rgb()."""
+
+        super().init_attrs(**kwargs)
 
-        for i in range(self.position.length):
-            v = []
+        self.channelsFrom = self.kwargs_get_tof(kwargs, 'channelsFrom', (0,), None, check_float_range_1)
+        self.channelsTo = self.kwargs_get_tof(kwargs, 'channelsTo', (MAX_VALUE,), len(self.channelsFrom), check_float_range_1)
 
-            for ci, (amplitude, offsetY) in enumerate(amplCf):
-                v.append(offsetY - amplitude * sin(sinOffsetX + (i + phaseCf[ci]) * sinCf[ci]))
+    def get_buffer_key(self):
+        return (self.position.length, self.channelsFrom, self.channelsTo)
 
-            self.buffer.append(v)
+    def render_buffer(self):
+        return np.linspace(self.channelsFrom, self.channelsTo, self.position.length)
 
 
-class SquareWaveGradGen(WaveGradGen):
-    """Генератор меандра.
+class ImageGradGen(BufferedGradGen):
+    """Возвращает данные из растрового изображения.
 
-    Поля экземпляра класса (в дополнение к унаследованным):
-        dutyCycles  - коэффициенты заполнения для каналов;
-                      по умолчанию - 1.0."""
+    Поля экземпляра класса (в дополнение к полям GradGen):
+        image       - экземпляр PIL.Image;
+        horizontal  - булевское значение или None (по умолчанию)
+                      True  - генератор получает данные из строки
+                              изображения,
+                      False - из столбца,
+                      None  - автоматическое определение по пропорциям
+                              изображения;
+        srcx, srcy  - начальные координаты строки или столбца в изображении;
+                      по умолчанию - 0, 0;
+        channels    - кортеж целых чисел, каналы изображения
+                      (0 - R, 1 - G и т.п.);
+        pixels      - положительное целое или None - количество пикселей,
+                      получаемых за одно значение по второй оси изображения
+                      (для строки - вниз от srcy, для столбца - вправо
+                      от srcx); None - все пиксели до края изображения;
+                      по умолчанию - 1.
+
+    Для получения нескольких каналов изображения есть два варианта действий:
+    1. создать один ImageGradGen с указанием нескольких каналов;
+    2. создать соответствующее количество экземпляров ImageGradGen с указанием
+       каналов и эти экземпляры добавить в экземпляр ParallelGenGradGen;
+       в этом случае можно использовать каналы из разных изображений.
+
+    Если pixels > 1, генератор работает в "двумерном" режиме: одна ось
+    изображения - время, вторая - светильники (например, столбцы матрицы
+    светодиодов), и каждое значение содержит pixels * len(channels) каналов
+    в порядке (пиксель 0: каналы, пиксель 1: каналы, ...)."""
+
+    __slots__ = ('image', 'horizontal', 'srcx', 'srcy', 'channels',
+        'pixels', '__box')
 
     def init_attrs(self, **kwargs):
         """Параметры: см. описание полей экземпляра класса."""
 
         super().init_attrs(**kwargs)
 
-        __DEF_DC = 1.0
+        self.image = kwargs.get('image', None)
+        if not self.image:
+            raise ValueError('"image" parameter not specified')
 
-        self.dutyCycles = self.kwargs_get_tof(kwargs,
-            'dutyCycles',
-            (__DEF_DC, ),
-            len(self.levels),
-            check_float_range_1)
+        if self.image.mode not in ('L', 'RGB', 'RGBA'):
+            raise ValueError('unsupported image format')
+
+        srcchnls = kwargs.get('channels', None)
+        if srcchnls is None:
+            if self.image.mode == 'L':
+                self.channels = (0,)
+            else:
+                # 'RGB', 'RGBA'
+                # если нужно использовать и альфа-канал - следует указывать каналы в параметре явно
+                self.channels = (0, 1, 2)
+        else:
+            #TODO возможно, следует добавить проверку на правильность значений номеров каналов в параметре channels
+            if len(srcchnls) > len(self.image.mode): #!!!!
+                raise ValueError('too many channel numbers specified')
+
+            self.channels = tuple(srcchnls)
+
+        self.horizontal = kwargs.get('horizontal', None)
+        if self.horizontal is None:
+            self.horizontal = self.image.width > self.image.height
+
+        self.srcx = kwargs.get('srcx', 0)
+        self.srcy = kwargs.get('srcy', 0)
+
+        self.pixels = kwargs.get('pixels', 1)
+        if self.pixels is not None and self.pixels < 1:
+            raise ValueError('"pixels" parameter must be >= 1 or None')
 
     def reset(self):
-        super().reset()
+        # проверяем выход за границы именно здесь, т.к. length/srcx/srcy
+        # могут быть изменены уже после создания экземпляра класса
 
-        perLengths = []
-        posHi0 = []
-        posHi1 = []
+        __E_OUT_OF_IMAGE = 'gradient goes beyond the boundaries of the image'
 
-        nchannels = len(self.levels)
+        if self.horizontal:
+            self.position.length = self.image.width
 
-        for ci, level in enumerate(self.levels):
-            # длина полного периода
-            perlen = self.position.length / self.periods[ci]
-            perLengths.append(perlen)
+            pixels = self.image.height - self.srcy if self.pixels is None else self.pixels
 
-            # длина полуволны с "высоким" уровнем
-            hilen = perlen / (1.0 + self.dutyCycles[ci])
+            if (self.srcx + self.position.length) > self.image.width \
+                or pixels < 1 or (self.srcy + pixels) > self.image.height:
+                raise IndexError(__E_OUT_OF_IMAGE)
 
-            # начало полуволны с "высоким" уровнем
-            startHi = perlen * self.phases[ci]
-            posHi0.append(startHi)
-            # конец полуволны с "высоким" уровнем
-            posHi1.append(startHi + perlen - hilen)
+            box = (self.srcx, self.srcy, self.srcx + self.position.length, self.srcy + pixels)
+        else:
+            self.position.length = self.image.height
 
-        for i in range(self.position.length):
-            chns = []
+            pixels = self.image.width - self.srcx if self.pixels is None else self.pixels
 
-            for ci in range(nchannels):
-                v = i % perLengths[ci]
+            if (self.srcy + self.position.length) > self.image.height \
+                or pixels < 1 or (self.srcx + pixels) > self.image.width:
+                raise IndexError(__E_OUT_OF_IMAGE)
 
-                chns.append(self.levels[ci] if v >= posHi0[ci] and v < posHi1[ci] else self.lowLevels[ci])
+            box = (self.srcx, self.srcy, self.srcx + pixels, self.srcy + self.position.length)
 
-            self.buffer.append(chns)
+        self.__box = box
 
+        super().reset()
 
-class GroupGenGradGen(GradGen):
-    """Надстройка над GradGen, предназначенная для издевательств
-    над несколькими равноправными генераторами.
+    def __deepcopy__(self, memo):
+        # изображение копией используется совместно (см. deepcopy_sharing())
+        return deepcopy_sharing(self, memo, self.image)
 
-    Поля (в дополнение к наследственным):
-        generators  - список экземпляров потомков GradGen."""
+    def get_image_digest(self):
+        """Возвращает строку - хэш содержимого полосы изображения,
+        из которой берутся значения (для ключа буфера, см.
+        get_buffer_key()).
+        Хэшируется только полоса, а не всё изображение, т.к. метод
+        вызывается при каждом reset()."""
 
-    def init_attrs(self, **kwargs):
-        """Инициализация полей.
+        strip = self.image.crop(self.__box)
 
-        Параметры:
-            subgen  - список экземпляров потомков GradGen."""
+        h = hashlib.sha1(('%s %dx%d' % (strip.mode, strip.width, strip.height)).encode('ascii'))
+        h.update(strip.tobytes())
 
-        super().init_attrs(**kwargs)
+        return h.hexdigest()
 
-        self.generators = unwrap_lol(kwargs.get('subgen', []), (GradGen,))
-        self.subgen_added()
+    def get_buffer_key(self):
+        return (self.get_image_digest(), self.horizontal, self.__box, self.channels)
 
-    def get_disp_name(self):
-        return '%s(%s)' % (self.name, ', '.join([gen.get_disp_name() for gen in self.generators]))
+    def render_buffer(self):
+        # полоса изображения целиком преобразуется в массив numpy
+        # (строки, столбцы, каналы изображения)
+        strip = np.asarray(self.image.crop(self.__box))
+        if strip.ndim == 2:
+            # изображение в шкале серого - один канал
+            strip = strip[:, :, np.newaxis]
 
-    def subgen_added(self):
-        """При необходимости каких либо действий после добавления
-        вложенных генераторов этот метод должен быть перекрыт классом-
-        потомком."""
+        if self.horizontal:
+            # для строки время идёт по столбцам изображения
+            strip = strip.transpose(1, 0, 2)
+
+        # целые 0-255 преобразуются (при необходимости) в float
+        # методом set_buffer_data()
+        return strip[:, :, self.channels].reshape(self.position.length, -1)
+
+
+class ImageFrameDecoder():
+    """Декодер кадров многокадрового изображения (GIF, TIFF и т.п.)
+    для AnimatedImageGradGen.
+
+    Кадры декодируются по запросу (см. get()) и хранятся в памяти, пока
+    их общий размер не превышает cacheSize - т.е. если вся анимация
+    помещается в cacheSize, при повторных проходах кадры не декодируются
+    заново; иначе удаляются кадры, к которым дольше всего не было
+    обращений.
+    При prefetch > 0 кадры декодируются в отдельном потоке, который
+    заранее декодирует до prefetch кадров, которые понадобятся следующими;
+    к изображению в этом случае обращается только этот поток.
+
+    Поля:
+        image       - экземпляр PIL.Image;
+        box         - кортеж (left, upper, right, lower), область кадра;
+        channels    - кортеж целых, каналы изображения;
+        strips      - булевское значение; если True - каждая строка области
+                      кадра - отдельное значение, иначе - весь кадр;
+        nframes     - количество кадров в изображении;
+        cacheSize   - максимальный общий размер декодированных кадров
+                      в байтах;
+        prefetch    - количество кадров, декодируемых заранее (0 - кадры
+                      декодируются в вызывающем потоке);
+        frames      - словарь (OrderedDict) декодированных кадров:
+                      {номер кадра: двумерный массив numpy (np.uint8)
+                      (строки - значения, столбцы - каналы)};
+        cachedBytes - общий размер массивов в frames."""
+
+    DEFAULT_CACHE_SIZE = 64 * 1024 * 1024
+    DEFAULT_PREFETCH = 4
+
+    def __init__(self, image, box, channels, strips=False,
+                 cacheSize=DEFAULT_CACHE_SIZE, prefetch=DEFAULT_PREFETCH):
+        self.image = image
+        self.box = box
+        self.channels = channels
+        self.strips = strips
+
+        self.nframes = getattr(image, 'n_frames', 1)
+
+        self.cacheSize = cacheSize
+        self.prefetch = prefetch
+
+        self.frames = OrderedDict()
+        self.cachedBytes = 0
+
+        self.__cond = None
+        self.__thread = None
+        self.__queue = []
+        self.__error = None
+        self.__closed = False
+
+    def __repr__(self):
+        return repr_to_str(self)
+
+    def decode(self, ix):
+        """Декодирование кадра номер ix.
+        Возвращает двумерный массив numpy с элементами типа np.uint8
+        (строки - значения, столбцы - каналы)."""
+
+        self.image.seek(ix)
+
+        # у кадров GIF - палитра, причём у каждого кадра может быть своя
+        frame = self.image.crop(self.box)
+        if frame.mode not in ('L', 'RGB', 'RGBA'):
+            frame = frame.convert('RGBA' if max(self.channels) > 2 else 'RGB')
+
+        pixels = np.asarray(frame)
+        if pixels.ndim == 2:
+            pixels = pixels[:, :, np.newaxis]
+
+        pixels = pixels[:, :, self.channels]
+
+        return np.ascontiguousarray(pixels.reshape(len(pixels) if self.strips else 1, -1))
+
+    def __store(self, ix, pixels):
+        self.frames[ix] = pixels
+        self.cachedBytes += pixels.nbytes
+
+        # кадры, декодированные заранее, не удаляются, даже если
+        # не помещаются в cacheSize
+        while self.cachedBytes > self.cacheSize and len(self.frames) > self.prefetch + 1:
+            ix, old = self.frames.popitem(last=False)
+            self.cachedBytes -= old.nbytes
+
+    def __run(self):
+        while True:
+            with self.__cond:
+                while not self.__queue and not self.__closed:
+                    self.__cond.wait()
+
+                if self.__closed:
+                    return
+
+                ix = self.__queue.pop(0)
+                if ix in self.frames:
+                    continue
+
+            try:
+                pixels = self.decode(ix)
+            except Exception as ex:
+                with self.__cond:
+                    self.__error = ex
+                    self.__cond.notify_all()
+
+                return
+
+            with self.__cond:
+                self.__store(ix, pixels)
+                self.__cond.notify_all()
+
+    def __start(self):
+        import threading
+
+        self.__closed = False
+        self.__error = None
+
+        self.__cond = threading.Condition()
+        self.__thread = threading.Thread(target=self.__run,
+            name='%s prefetch' % self.__class__.__name__, daemon=True)
+        self.__thread.start()
+
+    def get(self, ix, upcoming=()):
+        """Возвращает декодированный кадр номер ix (см. поле frames).
+
+        Параметры:
+            ix          - номер кадра;
+            upcoming    - последовательность номеров кадров, которые
+                          понадобятся следующими (для декодирования
+                          заранее; используются первые prefetch номеров)."""
+
+        if self.prefetch < 1:
+            pixels = self.frames.get(ix)
+
+            if pixels is None:
+                pixels = self.decode(ix)
+                self.__store(ix, pixels)
+            else:
+                self.frames.move_to_end(ix)
+
+            return pixels
+
+        if self.__thread is None:
+            self.__start()
+
+        with self.__cond:
+            self.__queue = [ix] + [u for u in upcoming if u != ix][:self.prefetch]
+            self.__cond.notify_all()
+
+            while ix not in self.frames:
+                if self.__error is not None:
+                    raise self.__error
+
+                if self.__closed:
+                    raise ValueError('%s.get(): decoder is closed' % self.__class__.__name__)
+
+                self.__cond.wait()
+
+            self.frames.move_to_end(ix)
+
+            return self.frames[ix]
+
+    def close(self):
+        """Остановка потока, декодирующего кадры заранее (при следующем
+        вызове get() он будет запущен снова)."""
+
+        if self.__thread is None:
+            return
+
+        with self.__cond:
+            self.__closed = True
+            self.__cond.notify_all()
+
+        self.__thread.join()
+        self.__thread = None
+
+
+class AnimatedImageGradGen(GradGen):
+    """Возвращает данные из кадров многокадрового изображения (GIF,
+    многокадровый TIFF и т.п.).
+
+    Кадры не загружаются в память все сразу, а декодируются по мере
+    необходимости (см. ImageFrameDecoder), т.ч. генератор годится и для
+    длинных анимаций.
+
+    Поля экземпляра класса (в дополнение к полям GradGen):
+        image       - экземпляр PIL.Image (открытый Image.open);
+        channels    - кортеж целых чисел, каналы изображения
+                      (0 - R, 1 - G и т.п.); по умолчанию - (0,)
+                      для изображений в шкале серого, иначе (0, 1, 2);
+        box         - кортеж (left, upper, right, lower) - область кадра,
+                      из которой берутся значения; по умолчанию - весь кадр;
+        strips      - булевское значение; False (по умолчанию) - одно
+                      значение на кадр, содержащее все пиксели области
+                      построчно (пиксель 0: каналы, пиксель 1: каналы, ...);
+                      True - одно значение на каждую строку области кадра
+                      (сверху вниз), т.е. на кадр приходится несколько
+                      значений;
+        cacheSize   - максимальный объём памяти в байтах под декодированные
+                      кадры (см. ImageFrameDecoder);
+        prefetch    - количество кадров, декодируемых заранее в отдельном
+                      потоке; 0 - без отдельного потока;
+        decoder     - экземпляр ImageFrameDecoder.
+
+    Поле position.length устанавливается методом reset() по количеству
+    кадров (и строк области, если strips == True)."""
+
+    __slots__ = ('image', 'channels', 'box', 'strips', 'cacheSize', 'prefetch',
+        'decoder', '__frameIx', '__frame', '__weakref__')
+
+    def init_attrs(self, **kwargs):
+        """Параметры: см. описание полей экземпляра класса."""
+
+        super().init_attrs(**kwargs)
+
+        self.image = kwargs.get('image', None)
+        if not self.image:
+            raise ValueError('"image" parameter not specified')
+
+        self.channels = kwargs.get('channels', None)
+        if self.channels is None:
+            self.channels = (0,) if self.image.mode == 'L' else (0, 1, 2)
+        else:
+            self.channels = tuple(self.channels)
+
+            if not self.channels or min(self.channels) < 0 or max(self.channels) > 3:
+                raise ValueError('invalid channel numbers specified')
+
+        self.box = kwargs.get('box', None)
+        if self.box is None:
+            self.box = (0, 0, self.image.width, self.image.height)
+        else:
+            self.box = tuple(self.box)
+
+            if len(self.box) != 4 or self.box[0] < 0 or self.box[1] < 0 \
+                or self.box[2] > self.image.width or self.box[3] > self.image.height \
+                or self.box[0] >= self.box[2] or self.box[1] >= self.box[3]:
+                raise ValueError('"box" parameter goes beyond the boundaries of the image')
+
+        self.strips = kwargs.get('strips', False)
+
+        self.cacheSize = kwargs.get('cacheSize', ImageFrameDecoder.DEFAULT_CACHE_SIZE)
+        self.prefetch = kwargs.get('prefetch', ImageFrameDecoder.DEFAULT_PREFETCH)
+
+        self.decoder = None
+        self.__frameIx = None
+        self.__frame = None
+
+    def get_ticks_per_frame(self):
+        """Возвращает количество значений на один кадр."""
+
+        return self.box[3] - self.box[1] if self.strips else 1
+
+    def reset(self):
+        super().reset()
+
+        if self.decoder is None:
+            self.decoder = ImageFrameDecoder(self.image, self.box, self.channels,
+                self.strips, self.cacheSize, self.prefetch)
+
+            # поток декодера не должен переживать генератор
+            weakref.finalize(self, self.decoder.close)
+
+        self.position.length = self.decoder.nframes * self.get_ticks_per_frame()
+
+        self.__frameIx = None
+        self.__frame = None
+
+    def __deepcopy__(self, memo):
+        # изображение и декодер (с его потоком) копией используются
+        # совместно (см. deepcopy_sharing())
+        return deepcopy_sharing(self, memo, self.image, self.decoder)
+
+    def close(self):
+        """Остановка потока, декодирующего кадры заранее (при следующем
+        обращении к кадрам, которых нет в памяти, он будет запущен снова)."""
+
+        if self.decoder is not None:
+            self.decoder.close()
+
+    def get_n_channels(self):
+        width = self.box[2] - self.box[0]
+
+        if not self.strips:
+            width *= self.box[3] - self.box[1]
+
+        return width * len(self.channels)
+
+    def __get_upcoming(self, tpf):
+        # номера кадров, которые понадобятся следующими
+        if self.prefetch < 1 or self.position.mode == GradPosition.RANDOM:
+            return ()
+
+        p = GradPosition(mode=self.position.mode, direction=self.position.direction)
+        p.length = self.position.length
+        p.value = self.position.value
+
+        return dict.fromkeys((p.indices((self.prefetch + 1) * tpf) // tpf).tolist())
+
+    def __get_frame(self, ix, tpf):
+        if ix != self.__frameIx:
+            self.__frame = self.decoder.get(ix, self.__get_upcoming(tpf))
+            self.__frameIx = ix
+
+        return self.__frame
+
+    def get_next_value(self):
+        tpf = self.get_ticks_per_frame()
+        ix, row = divmod(self.position.value, tpf)
+
+        pixels = self.__get_frame(ix, tpf)
+
+        self.position.next_value()
+
+        return pixels[row] * BYTE_TO_FLOAT
+
+    def write_next_value(self, out):
+        tpf = self.get_ticks_per_frame()
+        ix, row = divmod(self.position.value, tpf)
+
+        pixels = self.__get_frame(ix, tpf)
+
+        self.position.next_value()
+
+        return np.multiply(pixels[row], BYTE_TO_FLOAT, out=out)
+
+    def get_next_values(self, n):
+        tpf = self.get_ticks_per_frame()
+        ixs, rows = np.divmod(self.position.indices(n), tpf)
+
+        ret = np.empty((n, self.get_n_channels()), dtype=FRAME_DTYPE)
+
+        # значения берутся из кадров отрезками с одинаковым номером кадра
+        bounds = [0] + (np.flatnonzero(np.diff(ixs)) + 1).tolist() + [n]
+
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            if start < end:
+                pixels = self.__get_frame(int(ixs[start]), tpf)
+                np.multiply(pixels[rows[start:end]], BYTE_TO_FLOAT, out=ret[start:end])
+
+        return ret
+
+    def seek(self, tick):
+        self.position.seek(tick)
+
+    def value_at(self, tick):
+        ix, row = divmod(self.position.value_at(tick), self.get_ticks_per_frame())
+
+        return self.decoder.get(ix)[row] * BYTE_TO_FLOAT
+
+
+class GenRecorderGen(BufferedGradGen):
+    """Генератор, однократно засасывающий себе в буфер выхлоп
+    другого генератора, и воспроизводящий эти значения.
+
+    Предназначен для буферизации выхлопов сложного нагромождения
+    вложенных генераторов, если вдруг не хочется их гонять по циклу
+    много раз.
+
+    Перед записью sourcegen сбрасывается (см. метод reset()), т.е.
+    записываются значения с начала последовательности, а не с текущего
+    положения sourcegen.
+
+    Внимание! Если буфер взят из кэша (см. RenderCache) или у другого
+    генератора (см. поле shareBuf), значения из sourcegen не выбираются,
+    т.е. его счётчик положения не меняется."""
+
+    __slots__ = ('sourcegen',)
+
+    def init_attrs(self, **kwargs):
+        super().init_attrs(**kwargs)
+
+        self.sourcegen = self.kwargs_get(kwargs, 'sourcegen')
+
+    def get_subgens(self):
+        return [self.sourcegen]
+
+    def get_buffer_key(self):
+        srckey = self.sourcegen.get_values_key()
+        if srckey is None:
+            return None
+
+        return (srckey, self.sourcegen.get_n_values())
+
+    def render_buffer(self):
+        # ключ буфера (get_values_key()) описывает значения sourcegen
+        # после сброса, поэтому и записываются они с начала
+        self.sourcegen.reset()
+
+        return self.sourcegen.get_next_values(self.sourcegen.get_n_values())
+
+
+class ConstantGradGen(GradGen):
+    """Псевдо-генератор, выдающий постоянные значения.
+
+    Поля экземпляра класса:
+        values   - кортеж из float в диапазоне 0.0-1.0.
+
+    Счетчик положения не используется."""
+
+    __slots__ = ('values', 'frame')
+
+    def init_attrs(self, **kwargs):
+        """Параметры: см. описание полей экземпляра класса."""
+
+        super().init_attrs(**kwargs)
+
+        self.values = self.kwargs_get_tof(kwargs, 'values', (0, ))
+
+    def reset(self):
+        super().reset()
+
+        self.frame = np.array(self.values, dtype=FRAME_DTYPE)
+        self.frame.flags.writeable = False
+
+    def get_n_channels(self):
+        return len(self.values)
+
+    def get_values_key(self):
+        return (self.__class__.__qualname__, self.position.length, self.values)
+
+    def get_next_value(self):
+        return self.frame
+
+    def write_next_value(self, out):
+        np.copyto(out, self.frame)
+
+        return out
+
+    def get_next_values(self, n):
+        return np.tile(self.frame, (n, 1))
+
+    def seek(self, tick):
+        self.position.seek(tick)
+
+    def value_at(self, tick):
+        return self.frame
+
+
+class NoiseGen(GradGen):
+    """Генератор шума.
+
+    Поля экземпляра класса:
+        minValues, maxValues
+            - кортежи из float в диапазоне 0.0-1.0 с граничными значениями
+              для каналов.
+
+    Начальное значение генератора случайных чисел - поле position.seed
+    (параметр конструктора seed): если указано - после каждого вызова
+    reset() выдаётся одна и та же последовательность значений.
+    Значения расчитываются блоками по NOISE_BLOCK_SIZE; блок номер k
+    расчитывается от энтропии генератора и k, т.ч. seek() и value_at()
+    не расчитывают предыдущие значения.
+
+    Счетчик положения не используется."""
+
+    __slots__ = ('minValues', 'maxValues', 'frame', 'entropy', '__minv', '__ranges',
+        '__block', '__blockNo', '__blockIx')
+
+    NOISE_BLOCK_SIZE = 1024
+
+    def init_attrs(self, **kwargs):
+        super().init_attrs(**kwargs)
+
+        self.minValues = self.kwargs_get_tof(kwargs, 'minValues', (0.0, ),
+                            None, check_float_range_1)
+        self.maxValues = self.kwargs_get_tof(kwargs, 'maxValues', (1.0, ),
+                            len(self.minValues), check_float_range_1)
+
+    def reset(self):
+        super().reset()
+
+        self.__minv = np.array(self.minValues, dtype=FRAME_DTYPE)
+        self.__ranges = np.array(self.maxValues, dtype=FRAME_DTYPE) - self.__minv
+
+        self.entropy = np.random.SeedSequence(self.position.seed).entropy
+
+        self.seek(0)
+
+    def get_n_channels(self):
+        return len(self.minValues)
+
+    def get_values_key(self):
+        if self.position.seed is None:
+            return None
+
+        return (self.__class__.__qualname__, self.minValues, self.maxValues,
+                self.position.seed)
+
+    def has_random_values(self):
+        return self.position.seed is None
+
+    def render_block(self, k):
+        """Возвращает блок значений номер k (двумерный массив numpy,
+        NOISE_BLOCK_SIZE строк)."""
+
+        rng = np.random.default_rng(np.random.SeedSequence(self.entropy, spawn_key=(k,)))
+
+        block = rng.random((self.NOISE_BLOCK_SIZE, len(self.__minv)), dtype=FRAME_DTYPE)
+        block *= self.__ranges
+        block += self.__minv
+
+        return block
+
+    def __next_block(self):
+        self.__blockNo += 1
+        self.__block = self.render_block(self.__blockNo)
+        self.__blockIx = 0
+
+    def get_next_value(self):
+        if self.__blockIx >= self.NOISE_BLOCK_SIZE:
+            self.__next_block()
+
+        self.frame = self.__block[self.__blockIx]
+        self.__blockIx += 1
+
+        return self.frame
+
+    def write_next_value(self, out):
+        np.copyto(out, self.get_next_value())
+
+        return out
+
+    def get_next_values(self, n):
+        blocks = []
+
+        while n > 0:
+            if self.__blockIx >= self.NOISE_BLOCK_SIZE:
+                self.__next_block()
+
+            k = min(n, self.NOISE_BLOCK_SIZE - self.__blockIx)
+            blocks.append(self.__block[self.__blockIx:self.__blockIx + k])
+
+            self.__blockIx += k
+            n -= k
+
+        if not blocks:
+            return np.empty((0, len(self.__minv)), dtype=FRAME_DTYPE)
+
+        # np.vstack() копирует значения - блок будет заменён следующим
+        return np.vstack(blocks)
+
+    def seek(self, tick):
+        self.__blockNo, self.__blockIx = divmod(tick, self.NOISE_BLOCK_SIZE)
+        self.__block = self.render_block(self.__blockNo)
+
+    def value_at(self, tick):
+        k, ix = divmod(tick, self.NOISE_BLOCK_SIZE)
+
+        if k == self.__blockNo:
+            return self.__block[ix]
+
+        return self.render_block(k)[ix]
+
+
+class WaveGradGen(BufferedGradGen):
+    """Базовый класс для генераторов волн.
+
+    Поле position.length задаёт количество значений в буфере.
+    Дополнительные поля (в дополнение к наследственным):
+        levels  - кортеж из одного и более float в диапазоне от 0 до 1.0 -
+                  максимальные значения уровней каналов;
+                  по умолчанию - (1.0, );
+                  количество каналов генератора задаётся этим параметром;
+        lowLevels - минимальные значения уровней каналов (аналогично
+                  полю levels);
+        periods - кортеж из одного и более положительных float,
+                  задаёт количество периодов волны для одного
+                  или нескольких каналов;
+                  если указано меньше значений, чем количество каналов -
+                  значения периодов повторяются циклически "до заполнения";
+        phases  - кортеж из одного и более float в диапазоне от 0 до 1.0 -
+                  значения фазы волны для генерируемых значений каналов;
+                  по умолчанию - (0.0, )
+                  если указано меньше значений, чем количество каналов -
+                  значения периодов повторяются циклически "до заполнения"."""
+
+    __slots__ = ('levels', 'lowLevels', 'phases', 'periods')
+
+    def init_attrs(self, **kwargs):
+        """Параметры (в дополнение к наследуемым):
+            levels, phases, periods (см. описание полей выше);
+            Примечание: вместо кортежей этим параметрам можно присваивать
+            по одному значению float, в этом случае параметр будет
+            преобразован в кортеж из одного элемента."""
+
+        super().init_attrs(**kwargs)
+
+        self.levels = self.kwargs_get_tof(kwargs, 'levels', (1.0, ), None, check_float_range_1)
+        _ll = len(self.levels)
+
+        self.lowLevels = self.kwargs_get_tof(kwargs, 'lowLevels', (0.0, ), _ll, check_float_range_1)
+
+        self.phases = self.kwargs_get_tof(kwargs, 'phases', (0.0, ), _ll, check_float_range_1)
+
+        self.periods = self.kwargs_get_tof(kwargs, 'periods', (1.0, ), _ll, check_float_positive)
+
+    def get_buffer_key(self):
+        return (self.position.length, self.levels, self.lowLevels, self.phases, self.periods)
+
+
+class SineWaveGradGen(WaveGradGen):
+    """Генератор синусоиды."""
+
+    __slots__ = ()
+
+    def render_buffer(self):
+        # значения параметров каналов - строкой, чтобы "размножались"
+        # по сетке из номеров значений (столбцом)
+        levels = np.array(self.levels)
+        periods = self.position.length / np.array(self.periods)
+
+        amplitudes = (levels - np.array(self.lowLevels)) / 2.0
+        offsetsY = levels - amplitudes
+
+        ixs = np.arange(self.position.length)[:, np.newaxis]
+
+        sinOffsetX = pi / 2 # дабы синусоида завсегда начиналась с минимального значения
+
+        return offsetsY - amplitudes * np.sin(sinOffsetX +
+            (ixs + periods * np.array(self.phases)) * (2 * pi / periods))
+
+
+class SquareWaveGradGen(WaveGradGen):
+    """Генератор меандра.
+
+    Поля экземпляра класса (в дополнение к унаследованным):
+        dutyCycles  - коэффициенты заполнения для каналов;
+                      по умолчанию - 1.0."""
+
+    __slots__ = ('dutyCycles',)
+
+    def init_attrs(self, **kwargs):
+        """Параметры: см. описание полей экземпляра класса."""
+
+        super().init_attrs(**kwargs)
+
+        __DEF_DC = 1.0
+
+        self.dutyCycles = self.kwargs_get_tof(kwargs,
+            'dutyCycles',
+            (__DEF_DC, ),
+            len(self.levels),
+            check_float_range_1)
+
+    def get_buffer_key(self):
+        return super().get_buffer_key() + (self.dutyCycles,)
+
+    def render_buffer(self):
+        # длина полного периода
+        perLengths = self.position.length / np.array(self.periods)
+
+        # длина полуволны с "высоким" уровнем
+        hiLengths = perLengths / (1.0 + np.array(self.dutyCycles))
+
+        # начало полуволны с "высоким" уровнем
+        posHi0 = perLengths * np.array(self.phases)
+        # конец полуволны с "высоким" уровнем
+        posHi1 = posHi0 + perLengths - hiLengths
+
+        v = np.arange(self.position.length)[:, np.newaxis] % perLengths
+
+        return np.where((v >= posHi0) & (v < posHi1),
+                        np.array(self.levels),
+                        np.array(self.lowLevels))
+
+
+class SmoothNoiseGradGen(BufferedGradGen):
+    """Генератор "плавного" шума (value noise): случайные значения
+    в опорных точках, равномерно расставленных по буферу, плавно
+    интерполируются между собой; при octaves > 1 к ним добавляются
+    "октавы" - такой же шум с вдвое большим количеством опорных точек
+    и вдвое меньшей амплитудой.
+    Шум периодический, т.е. в режиме GradPosition.REPEAT (по умолчанию)
+    повторяется без скачков.
+
+    Поле position.length задаёт количество значений в буфере.
+    Дополнительные поля (в дополнение к наследственным):
+        minValues, maxValues
+                - кортежи из float в диапазоне 0.0-1.0 с граничными
+                  значениями для каналов (количество каналов задаётся
+                  minValues);
+        knots   - положительное целое, количество опорных точек на буфер
+                  (для первой октавы); по умолчанию - 8;
+        octaves - положительное целое, количество октав; по умолчанию - 1.
+
+    Начальное значение генератора случайных чисел - поле position.seed
+    (параметр конструктора seed); если оно не указано - значения
+    расчитываются заново при каждом вызове reset() и не кэшируются."""
+
+    __slots__ = ('minValues', 'maxValues', 'knots', 'octaves')
+
+    DEFAULT_MODE = GradPosition.REPEAT
+
+    def init_attrs(self, **kwargs):
+        """Параметры: см. описание полей экземпляра класса."""
+
+        super().init_attrs(**kwargs)
+
+        self.minValues = self.kwargs_get_tof(kwargs, 'minValues', (0.0, ),
+                            None, check_float_range_1)
+        self.maxValues = self.kwargs_get_tof(kwargs, 'maxValues', (1.0, ),
+                            len(self.minValues), check_float_range_1)
+
+        self.knots = kwargs.get('knots', 8)
+        if self.knots < 1:
+            raise ValueError('"knots" parameter must be >= 1')
+
+        self.octaves = kwargs.get('octaves', 1)
+        if self.octaves < 1:
+            raise ValueError('"octaves" parameter must be >= 1')
+
+    def get_buffer_key(self):
+        if self.position.seed is None:
+            return None
+
+        return (self.position.length, self.minValues, self.maxValues,
+                self.knots, self.octaves, self.position.seed)
+
+    def has_random_values(self):
+        return self.position.seed is None
+
+    def render_buffer(self):
+        rng = np.random.default_rng(self.position.seed)
+
+        minv = np.array(self.minValues)
+        nchannels = len(minv)
+
+        # положение каждого значения в периоде шума - 0.0 <= t < 1.0
+        t = np.arange(self.position.length) / self.position.length
+
+        values = np.zeros((self.position.length, nchannels))
+        amplitude = 1.0
+        total = 0.0
+
+        for octave in range(self.octaves):
+            knots = self.knots << octave
+            levels = rng.random((knots, nchannels))
+
+            x = t * knots
+            ix0 = x.astype(np.intp)
+            ix1 = (ix0 + 1) % knots
+
+            # smoothstep - плавный переход между опорными точками
+            f = x - ix0
+            f = (f * f * (3.0 - 2.0 * f))[:, np.newaxis]
+
+            values += amplitude * (levels[ix0] * (1.0 - f) + levels[ix1] * f)
+
+            total += amplitude
+            amplitude *= 0.5
+
+        return minv + (values / total) * (np.array(self.maxValues) - minv)
+
+
+class GroupGenGradGen(GradGen):
+    """Надстройка над GradGen, предназначенная для издевательств
+    над несколькими равноправными генераторами.
+
+    Поля (в дополнение к наследственным):
+        generators  - список экземпляров потомков GradGen."""
+
+    __slots__ = ('generators', 'nchannels')
+
+    def init_attrs(self, **kwargs):
+        """Инициализация полей.
+
+        Параметры:
+            subgen  - список экземпляров потомков GradGen."""
+
+        super().init_attrs(**kwargs)
+
+        self.nchannels = None
+        self.generators = unwrap_lol(kwargs.get('subgen', []), (GradGen,))
+        self.subgen_added()
+
+    def get_disp_name(self):
+        return '%s(%s)' % (self.name, ', '.join([gen.get_disp_name() for gen in self.generators]))
+
+    def get_subgens(self):
+        return self.generators
+
+    def get_values_key(self):
+        poskey = self.position.get_values_key()
+        if poskey is None:
+            return None
+
+        keys = tuple(g.get_values_key() for g in self.generators)
+        if None in keys:
+            return None
+
+        return (self.__class__.__qualname__, poskey, keys)
+
+    def subgen_added(self):
+        """При необходимости каких либо действий после добавления
+        вложенных генераторов этот метод должен быть перекрыт классом-
+        потомком (с вызовом метода предка)."""
+
+        self.update_layout()
+
+    def add_subgen(self, *gen):
+        """Добавление одного или нескольких вложенных генераторов.
+
+        gen - экземпляр(ы) класса GradGen."""
+
+        self.generators += gen
+
+        self.position.set_length(self.generators)
+
+        self.subgen_added()
+
+    def reset(self):
+        self.position.set_length(self.generators)
+
+        super().reset()
+
+        for g in self.generators:
+            g.reset()
+
+        self.update_layout()
+
+    def get_n_channels(self):
+        return self.nchannels
+
+
+class ParallelGenGradGen(GroupGenGradGen):
+    """Генератор, возвращающий сгруппированные значения
+    от всех вложенных генераторов."""
+
+    __slots__ = ('frame', '__spans', '__out', '__outViews')
+
+    def get_n_values(self):
+        m = 0
+        for g in self.generators:
+            v = g.get_n_values()
+            if v > m:
+                m = v
+
+        return m
+
+    def update_layout(self):
+        # каждому вложенному генератору - свой диапазон каналов
+        # в общем значении
+        self.__spans = []
+        first = 0
+
+        for g in self.generators:
+            n = g.get_n_channels()
+            if n is None:
+                self.nchannels = None
+                return
+
+            self.__spans.append(slice(first, first + n))
+            first += n
+
+        self.nchannels = first
+        self.frame = np.zeros(self.nchannels, dtype=FRAME_DTYPE)
+
+        self.__out = None
+        self.__outViews = None
+
+    def __write(self, out):
+        # части out для вложенных генераторов создаются один раз
+        # для каждого нового out - родительский генератор обычно
+        # передаёт один и тот же массив
+        if out is not self.__out:
+            self.__outViews = [out[span] for span in self.__spans]
+            self.__out = out
+
+        for g, view in zip(self.generators, self.__outViews):
+            g.write_next_value(view)
+
+        return out
+
+    def get_next_value(self):
+        if self.nchannels is None:
+            # раскладка каналов неизвестна - значение разворачивается
+            # потребителем
+            return [g.get_next_value() for g in self.generators]
+
+        return self.__write(self.frame)
+
+    def write_next_value(self, out):
+        if self.nchannels is None:
+            return super().write_next_value(out)
+
+        return self.__write(out)
+
+    def get_next_values(self, n):
+        if not self.generators:
+            return np.empty((n, 0), dtype=FRAME_DTYPE)
+
+        return np.hstack([g.get_next_values(n) for g in self.generators])
+
+    def seek(self, tick):
+        seek_subgens(self.generators, tick)
+
+    def value_at(self, tick):
+        values = subgens_value_at(self.generators, tick)
+
+        if self.nchannels is None:
+            return values
+
+        return np.concatenate([np.asarray(v, dtype=FRAME_DTYPE).ravel() for v in values] +
+                              [np.empty(0, dtype=FRAME_DTYPE)])
+
+
+class RepeaterGenGradGen(GradGen):
+    """Генератор, повторяющий вызов дочернего генератора указанное
+    количество раз.
+    Наследственное поле "position" используется только как хранилище
+    количества повторов, position.mode игнорируется.
+    Временный класс-костыль до момента переделки Parallel/SequenceGenGradGen."""
+
+    __slots__ = ('subgen', 'itersleft', '__accum')
+
+    #TODO возможно, имеет смысл переделать класс GenGradGen или Parallel/SequenceGenGradGen так, чтобы в отдельном классе RepeaterGenGradGen пропала необходимость
+
+    def init_attrs(self, **kwargs):
+        super().init_attrs(**kwargs)
+
+        self.itersleft = 0
+        self.subgen = self.kwargs_get(kwargs, 'subgen', None, self.check_isgrad)
+        self.__accum = None
+
+    def get_disp_name(self):
+        return '%s(%s)' % (self.name, self.subgen.get_disp_name())
+
+    def get_subgens(self):
+        return [self.subgen]
+
+    def get_values_key(self):
+        key = self.subgen.get_values_key()
+        if key is None:
+            return None
+
+        return (self.__class__.__qualname__, self.position.length, key)
+
+    def set_subgen(self, gen):
+        self.subgen = self.__chk_subgen(gen)
+        self.__setup_iters_left()
+
+    def get_n_values(self):
+        return self.subgen.get_n_values() * self.position.length
+
+    def __setup_iters_left(self):
+        self.itersleft = self.get_n_values()
+
+    def reset(self):
+        super().reset()
+        self.subgen.reset()
+        self.__setup_iters_left()
+
+    def get_n_channels(self):
+        return self.subgen.get_n_channels()
+
+    def get_next_value(self):
+        if self.itersleft > 0:
+            self.__accum = self.subgen.get_next_value()
+            self.itersleft -= 1
+
+            if self.itersleft <= 0 and isinstance(self.__accum, np.ndarray):
+                # массив может быть использован дочерним генератором
+                # повторно, а повторяться будет именно это значение
+                self.__accum = self.__accum.copy()
+
+        return self.__accum
+
+    def write_next_value(self, out):
+        if self.itersleft > 0:
+            self.subgen.write_next_value(out)
+            self.itersleft -= 1
+
+            if self.itersleft <= 0:
+                self.__accum = out.copy()
+        elif self.__accum is not None:
+            out[:] = self.__accum if isinstance(self.__accum, np.ndarray) else unwrap_lol(self.__accum)
+
+        return out
+
+    def get_next_values(self, n):
+        blocks = []
+
+        k = min(n, self.itersleft)
+        if k > 0:
+            block = self.subgen.get_next_values(k)
+            blocks.append(block)
+            self.__accum = block[-1]
+            self.itersleft -= k
+
+        if k < n:
+            # дочерний генератор исчерпан - повторяем последнее значение
+            blocks.append(np.tile(frames_to_block([self.__accum]), (n - k, 1)))
+
+        return np.vstack(blocks)
+
+    def seek(self, tick):
+        total = self.get_n_values()
+        k = min(tick, total)
+
+        if k > 0:
+            # последнее выбранное значение нужно для повторов
+            self.subgen.seek(k - 1)
+            self.__accum = self.subgen.get_next_value()
+            if isinstance(self.__accum, np.ndarray):
+                self.__accum = self.__accum.copy()
+        else:
+            self.subgen.seek(0)
+            self.__accum = None
+
+        self.itersleft = total - k
+
+    def value_at(self, tick):
+        total = self.get_n_values()
+        if total <= 0:
+            return None
+
+        return self.subgen.value_at(min(tick, total - 1))
+
+
+class EnvelopeGenGradGen(GradGen):
+    """Генератор, амплитудно модулирующий выхлоп одного генератора
+    выхлопом другого.
+
+    Внимание! Экспериментальный генератор, может быть перделан
+    полностью или удалён!"""
+
+    __slots__ = ('sourcegen', 'envelopegen', 'nchannels', 'frame', '__envIx',
+        '__envels', '__envRaw', '__arrays')
+
+    def init_attrs(self, **kwargs):
+        """Инициализация полей.
+
+        Параметры (в дополнение к наследственным):
+            sourcegen   - генератор значений, потомок класса GradGen;
+            envelopegen - генератор значений огибающей, потомок класса GradGen;
+                          если envelopegen.get_next_value() возвращает меньше
+                          значений, чем sourcegen.get_next_value() -
+                          значения "огибающей" используются циклически
+                          до заполнения."""
+
+        super().init_attrs(**kwargs)
+
+        self.sourcegen = self.kwargs_get(kwargs, 'sourcegen', None, self.check_isgrad)
+        self.envelopegen = self.kwargs_get(kwargs, 'envelopegen', None, self.check_isgrad)
+
+    def reset(self):
+        super().reset()
+
+        self.update_layout()
+
+    def get_n_channels(self):
+        return self.nchannels
+
+    def update_layout(self):
+        self.nchannels, self.__envIx = get_cycle_layout(self, self.sourcegen,
+            self.envelopegen)
+
+        # при малом количестве каналов значения расчитываются поканально
+        # (см. LAYOUT_MIN_CHANNELS)
+        self.__arrays = self.nchannels is not None and self.nchannels >= LAYOUT_MIN_CHANNELS
+
+        if self.nchannels is not None:
+            self.frame = np.zeros(self.nchannels, dtype=FRAME_DTYPE)
+            self.__envels = np.zeros(self.nchannels, dtype=FRAME_DTYPE)
+
+            # значения envelopegen с меньшим количеством каналов
+            # (до "размножения")
+            self.__envRaw = self.__envels if self.__envIx is None else \
+                np.zeros(self.envelopegen.get_n_channels(), dtype=FRAME_DTYPE)
+
+    def __write(self, out):
+        # sourcegen и envelopegen могут быть одним и тем же генератором,
+        # поэтому значения пишутся в разные массивы
+        self.sourcegen.write_next_value(out)
+
+        envels = self.envelopegen.write_next_value(self.__envRaw)
+        if self.__envIx is not None:
+            envels = np.take(envels, self.__envIx, out=self.__envels)
+
+        return np.multiply(out, envels, out=out)
+
+    def write_next_value(self, out):
+        if self.__arrays:
+            return self.__write(out)
+
+        out[:] = self.get_next_value()
+
+        return out
+
+    def get_next_value(self):
+        if self.__arrays:
+            return self.__write(self.frame)
+
+        if self.nchannels is not None:
+            channels = flat_values(self.sourcegen.get_next_value())
+            envels = flat_values(self.envelopegen.get_next_value())
+        else:
+            channels = unwrap_lol(self.sourcegen.get_next_value())
+            envels = unwrap_lol(self.envelopegen.get_next_value())
+
+        clen = len(channels)
+        elen = len(envels)
+
+        retv = [0.0] * clen
+
+        for ixc, cv in enumerate(channels):
+            retv[ixc] = cv * envels[ixc % elen]
+
+        return retv
+
+    def get_next_values(self, n):
+        channels = self.sourcegen.get_next_values(n)
+        envels = cycle_columns(self.envelopegen.get_next_values(n), channels.shape[1])
+
+        return channels * envels
+
+    def seek(self, tick):
+        seek_subgens(self.get_subgens(), tick)
+
+    def value_at(self, tick):
+        channels, envels = [np.asarray(unwrap_lol(v), dtype=FRAME_DTYPE)
+            for v in subgens_value_at(self.get_subgens(), tick)]
+
+        return channels * np.resize(envels, len(channels))
+
+    def get_disp_name(self):
+        return '%s(%s * %s)' % (
+                    self.name,
+                    self.sourcegen.get_disp_name(),
+                    self.envelopegen.get_disp_name())
+
+    def get_subgens(self):
+        return [self.sourcegen, self.envelopegen]
+
+    def get_values_key(self):
+        keys = (self.sourcegen.get_values_key(), self.envelopegen.get_values_key())
+        if None in keys:
+            return None
+
+        return (self.__class__.__qualname__,) + keys
+
+
+class CrossfadeGenGradGen(GradGen):
+    """Генератор, смешивающий выхлопы двух генераторов с соотношением,
+    определяемым третьим генератором.
+
+    Внимание! Экспериментальный генератор, может быть перделан
+    полностью или удалён!"""
+
+    __slots__ = ('source1gen', 'source2gen', 'balancegen', 'nchannels', 'frame',
+        '__src2Ix', '__balanceIx', '__src2v', '__balancev', '__scratch',
+        '__src2Raw', '__balanceRaw', '__arrays')
+
+    def init_attrs(self, **kwargs):
+        """Инициализация полей.
+
+        Параметры (в дополнение к наследственным):
+            source1gen,
+            source2gen  - генераторы исходных значений, потомок класса GradGen;
+            balancegen  - генератор значений соотношения (перекрёстного
+                          затухания), потомок класса GradGen;
+                          выходное значение равно (s1v * (1-bv)) + (s2v * bv).
+
+        Внимание! Количество каналов (значений), возвращаемое методом
+        CrossfadeGenGradGen.get_next_value(), определяется количеством
+        значений, возвращаемых source1gen.get_next_value(), а значения
+        source2gen и balancegen используются циклически до заполнения."""
+
+        super().init_attrs(**kwargs)
+
+        self.source1gen = self.kwargs_get(kwargs, 'source1gen', None, self.check_isgrad)
+        self.source2gen = self.kwargs_get(kwargs, 'source2gen', None, self.check_isgrad)
+        self.balancegen = self.kwargs_get(kwargs, 'balancegen', None, self.check_isgrad)
+
+    def reset(self):
+        super().reset()
+
+        self.update_layout()
+
+    def get_n_channels(self):
+        return self.nchannels
+
+    def update_layout(self):
+        self.nchannels, self.__src2Ix, self.__balanceIx = get_cycle_layout(self,
+            self.source1gen, self.source2gen, self.balancegen)
+
+        # при малом количестве каналов значения расчитываются поканально
+        # (см. LAYOUT_MIN_CHANNELS)
+        self.__arrays = self.nchannels is not None and self.nchannels >= LAYOUT_MIN_CHANNELS
+
+        if self.nchannels is not None:
+            self.frame = np.zeros(self.nchannels, dtype=FRAME_DTYPE)
+            self.__src2v = np.zeros(self.nchannels, dtype=FRAME_DTYPE)
+            self.__balancev = np.zeros(self.nchannels, dtype=FRAME_DTYPE)
+            self.__scratch = np.zeros(self.nchannels, dtype=FRAME_DTYPE)
+
+            # значения source2gen и balancegen с меньшим количеством
+            # каналов (до "размножения")
+            self.__src2Raw = self.__src2v if self.__src2Ix is None else \
+                np.zeros(self.source2gen.get_n_channels(), dtype=FRAME_DTYPE)
+            self.__balanceRaw = self.__balancev if self.__balanceIx is None else \
+                np.zeros(self.balancegen.get_n_channels(), dtype=FRAME_DTYPE)
+
+    def __write(self, out):
+        # вложенные генераторы могут быть одним и тем же генератором,
+        # поэтому значения пишутся в разные массивы
+        self.source1gen.write_next_value(out)
+
+        src2v = self.source2gen.write_next_value(self.__src2Raw)
+        if self.__src2Ix is not None:
+            src2v = np.take(src2v, self.__src2Ix, out=self.__src2v)
+
+        balancev = self.balancegen.write_next_value(self.__balanceRaw)
+        if self.__balanceIx is not None:
+            balancev = np.take(balancev, self.__balanceIx, out=self.__balancev)
+
+        # (s1v * (1-bv)) + (s2v * bv)
+        out *= np.subtract(1.0, balancev, out=self.__scratch)
+        src2v *= balancev
+
+        return np.add(out, src2v, out=out)
+
+    def write_next_value(self, out):
+        if self.__arrays:
+            return self.__write(out)
+
+        out[:] = self.get_next_value()
+
+        return out
+
+    def get_next_value(self):
+        if self.__arrays:
+            return self.__write(self.frame)
+
+        if self.nchannels is not None:
+            src1v = flat_values(self.source1gen.get_next_value())
+            src2v = flat_values(self.source2gen.get_next_value())
+            balancev = flat_values(self.balancegen.get_next_value())
+        else:
+            src1v = unwrap_lol(self.source1gen.get_next_value())
+            src2v = unwrap_lol(self.source2gen.get_next_value())
+            balancev = unwrap_lol(self.balancegen.get_next_value())
+
+        s1len = len(src1v)
+        s2len = len(src2v)
+        blen = len(balancev)
+
+        retv = [0.0] * s1len
+
+        for ixc, s1v in enumerate(src1v):
+            bv = balancev[ixc % blen]
+            retv[ixc] = (s1v * (1.0 - bv)) + (src2v[ixc % s2len] * bv)
+
+        return retv
+
+    def get_next_values(self, n):
+        src1v = self.source1gen.get_next_values(n)
+        nchannels = src1v.shape[1]
+
+        src2v = cycle_columns(self.source2gen.get_next_values(n), nchannels)
+        balancev = cycle_columns(self.balancegen.get_next_values(n), nchannels)
+
+        return (src1v * (1.0 - balancev)) + (src2v * balancev)
+
+    def seek(self, tick):
+        seek_subgens(self.get_subgens(), tick)
+
+    def value_at(self, tick):
+        src1v, src2v, balancev = [np.asarray(unwrap_lol(v), dtype=FRAME_DTYPE)
+            for v in subgens_value_at(self.get_subgens(), tick)]
+
+        nchannels = len(src1v)
+        balancev = np.resize(balancev, nchannels)
+
+        return (src1v * (1.0 - balancev)) + (np.resize(src2v, nchannels) * balancev)
+
+    def get_disp_name(self):
+        return '%s(%s, %s, %s)' % (
+                    self.name,
+                    self.source1gen.get_disp_name(),
+                    self.source2gen.get_disp_name(),
+                    self.balancegen.get_disp_name())
+
+    def get_subgens(self):
+        return [self.source1gen, self.source2gen, self.balancegen]
+
+    def get_values_key(self):
+        keys = (self.source1gen.get_values_key(), self.source2gen.get_values_key(),
+                self.balancegen.get_values_key())
+        if None in keys:
+            return None
+
+        return (self.__class__.__qualname__,) + keys
+
+
+class SequenceGenGradGen(GroupGenGradGen):
+    """Генератор, вызывающий вложенные генераторы поочерёдно.
+    Количество последовательных вызовов каждого генератора
+    соответствует значению соотв. position.length.
+    По окончании списка генераторов перебор начинается сначала."""
+
+    __slots__ = ('activeGen', 'activeItrs')
+
+    def init_attrs(self, **kwargs):
+        self.activeGen = None
+        self.activeItrs = 0
+
+        super().init_attrs(**kwargs)
+
+    def __set_active_gen(self):
+        if self.generators:
+            self.activeGen = self.generators[self.position.value]
+            self.activeItrs = self.activeGen.get_n_values()
+        else:
+            self.activeGen = None
+            self.activeItrs = 0
+
+    def get_disp_name(self):
+        return '%s(%s)' % (self.name, self.activeGen.get_disp_name())
+
+    def reset(self):
+        super().reset()
+        self.__set_active_gen()
+
+    def subgen_added(self):
+        super().subgen_added()
+
+        if not self.activeGen:
+            self.__set_active_gen()
+
+    def update_layout(self):
+        # все вложенные генераторы должны выдавать одинаковое
+        # количество каналов
+        self.nchannels = None
+
+        for g in self.generators:
+            n = g.get_n_channels()
+            if n is None:
+                self.nchannels = None
+                return
+
+            if self.nchannels is None:
+                self.nchannels = n
+            elif n != self.nchannels:
+                raise ValueError('%s.update_layout(): generator "%s" returns %d channel(s), previous ones - %d' % (self.__class__.__name__, g.name, n, self.nchannels))
+
+    def get_n_values(self):
+        r = 0
+
+        for g in self.generators:
+            r += g.get_n_values()
+
+        return r
+
+    def get_next_value(self):
+        if not self.activeGen:
+            raise ValueError('generator not properly initialized')
+
+        ret = self.activeGen.get_next_value()
+
+        self.activeItrs -= 1
+
+        if self.activeItrs <= 0:
+            self.position.next_value()
+            self.__set_active_gen()
+
+        return ret
+
+    def write_next_value(self, out):
+        if not self.activeGen:
+            raise ValueError('generator not properly initialized')
+
+        self.activeGen.write_next_value(out)
+
+        self.activeItrs -= 1
+
+        if self.activeItrs <= 0:
+            self.position.next_value()
+            self.__set_active_gen()
+
+        return out
+
+    def get_next_values(self, n):
+        if not self.activeGen:
+            raise ValueError('generator not properly initialized')
+
+        blocks = []
+
+        while n > 0:
+            # значения берутся из активного генератора блоками
+            # до исчерпания его activeItrs
+            k = max(1, min(n, self.activeItrs))
+
+            blocks.append(self.activeGen.get_next_values(k))
+            self.activeItrs -= k
+            n -= k
+
+            if self.activeItrs <= 0:
+                self.position.next_value()
+                self.__set_active_gen()
+
+        if not blocks:
+            return np.empty((0, self.nchannels or 0), dtype=FRAME_DTYPE)
+
+        return np.vstack(blocks)
+
+    def __locate(self, tick):
+        # расчёт состояния после tick значений: возвращает кортеж
+        # (количество пройденных генераторов - т.е. вызовов
+        # position.next_value(), номер активного генератора,
+        # количество значений, выбранных из активного генератора,
+        # словарь {id(генератор): количество выбранных значений})
+
+        nvalues = [max(1, g.get_n_values()) for g in self.generators]
+        ngens = len(self.generators)
+
+        # порядок перебора генераторов за один полный цикл
+        # счётчика положения
+        if ngens < 2:
+            order = np.zeros(1, dtype=np.intp)
+        elif self.position.mode == GradPosition.MIRROR:
+            order = GradPosition(ngens, GradPosition.MIRROR).indices(2 * (ngens - 1))
+        else:
+            order = np.arange(ngens, dtype=np.intp)
+
+        seglens = np.array(nvalues, dtype=np.int64)[order]
+        ends = np.cumsum(seglens)
+
+        if self.position.mode == GradPosition.STOP:
+            # последний генератор выбирается бесконечно
+            cycles, r = 0, tick
+            seg = int(np.searchsorted(ends[:-1], r, side='right'))
+        else:
+            cycles, r = divmod(tick, int(ends[-1]))
+            seg = int(np.searchsorted(ends, r, side='right'))
+
+        offset = r - (int(ends[seg - 1]) if seg > 0 else 0)
+
+        pulls = np.bincount(order, seglens, minlength=ngens) * cycles + \
+            np.bincount(order[:seg], seglens[:seg], minlength=ngens)
+
+        byGen = {}
+        for g, n in zip(self.generators, pulls):
+            byGen[id(g)] = byGen.get(id(g), 0) + int(n)
+
+        active = int(order[seg])
+        byGen[id(self.generators[active])] += offset
+
+        return (cycles * len(order) + seg, active, offset, byGen)
+
+    def seek(self, tick):
+        if not self.generators or self.position.mode == GradPosition.RANDOM:
+            super().seek(tick)
+            return
+
+        self.position.set_length(self.generators)
+
+        nswitches, active, offset, byGen = self.__locate(tick)
+
+        for g in self.generators:
+            if id(g) in byGen:
+                g.seek(byGen.pop(id(g)))
+
+        self.position.begin()
+        self.position.advance(nswitches)
+
+        self.activeGen = self.generators[active]
+        self.activeItrs = self.activeGen.get_n_values() - offset % max(1, self.activeGen.get_n_values())
+
+    def value_at(self, tick):
+        if not self.generators or self.position.mode == GradPosition.RANDOM:
+            return super().value_at(tick)
+
+        nswitches, active, offset, byGen = self.__locate(tick)
+        g = self.generators[active]
+
+        # значение номер tick - следующее после уже выбранных
+        return g.value_at(byGen[id(g)])
+
+
+def get_subgen_pulls(gens):
+    """Расчёт количества обращений к вложенным генераторам за одно
+    значение генератора, содержащего их (один и тот же экземпляр может
+    входить в список вложенных генераторов несколько раз).
+
+    Параметры:
+        gens    - список экземпляров GradGen.
+
+    Функция возвращает список кортежей (по одному на каждый элемент gens)
+    из двух целых: количество вхождений генератора в gens и номер
+    этого вхождения (начиная с 0), т.е. при расчёте значения номер tick
+    этот элемент gens получает значение номер (m * tick + k)."""
+
+    counts = {}
+    ret = []
+
+    for g in gens:
+        k = counts.get(id(g), 0)
+        counts[id(g)] = k + 1
+        ret.append(k)
+
+    return [(counts[id(g)], k) for g, k in zip(gens, ret)]
+
+
+def seek_subgens(gens, tick):
+    """Вызов метода seek() для каждого (однократно) из вложенных
+    генераторов gens с учётом количества обращений к ним (см.
+    get_subgen_pulls()) за tick значений генератора, содержащего их."""
+
+    done = set()
+
+    for g, (m, k) in zip(gens, get_subgen_pulls(gens)):
+        if id(g) not in done:
+            done.add(id(g))
+            g.seek(m * tick)
+
+
+def subgens_value_at(gens, tick):
+    """Возвращает список значений вложенных генераторов gens (см.
+    GradGen.value_at()), которые генератор, содержащий их, получил бы
+    при расчёте значения номер tick."""
+
+    return [g.value_at(m * tick + k) for g, (m, k) in zip(gens, get_subgen_pulls(gens))]
+
+
+def get_channel_layout(gen, first=0):
+    """Раскладка каналов дерева генераторов.
+
+    Параметры:
+        gen     - экземпляр GradGen, корень дерева;
+        first   - номер первого канала gen в общем значении.
+
+    Функция возвращает кортеж из четырёх элементов:
+        1. экземпляр GradGen (gen);
+        2. first;
+        3. количество каналов gen (или None, если неизвестно);
+        4. список таких же кортежей для вложенных генераторов; у вложенных
+           генераторов ParallelGenGradGen номера первых каналов - свои,
+           у остальных - совпадают с first."""
+
+    if isinstance(gen, ParallelGenGradGen):
+        subgens = []
+        sfirst = first
+
+        for g in gen.get_subgens():
+            subgens.append(get_channel_layout(g, sfirst))
+
+            n = g.get_n_channels()
+            sfirst += n if n is not None else 0
+    else:
+        subgens = [get_channel_layout(g, first) for g in gen.get_subgens()]
+
+    return (gen, first, gen.get_n_channels(), subgens)
+
+
+def iter_tree(gen):
+    """Перебор всех генераторов дерева (gen и всех вложенных в него,
+    см. GradGen.get_subgens()) в порядке обхода в глубину.
+    Генераторы, входящие в дерево несколько раз, возвращаются однократно."""
+
+    seen = set()
+    stack = [gen]
+
+    while stack:
+        g = stack.pop()
+        if id(g) in seen:
+            continue
+
+        seen.add(id(g))
+        yield g
+
+        stack.extend(reversed(g.get_subgens()))
+
+
+# "стоимость" вызова функции numpy для массива из нескольких десятков
+# элементов в операциях над числами float в функциях, создаваемых
+# compile_tree() (для выбора способа расчёта)
+COMPILE_NUMPY_CALL_COST = 12
+
+# максимальное количество элементов буфера, копируемого compile_tree()
+# в кортежи для поканального расчёта (строки буферов большего размера
+# преобразуются в списки при каждом обращении)
+COMPILE_MAX_TUPLE_VALUES = 65536
+
+
+class __TreeCompiler():
+    # общая часть компиляторов дерева (см. compile_tree()):
+    # константы функции, временные переменные и строки текста
+
+    def __init__(self):
+        self.consts = {'np': np, 'BYTE_TO_FLOAT': BYTE_TO_FLOAT}
+        self.constNames = {}
+        self.lines = []
+        self.ntemps = 0
+        # имя переменной с результатом
+        self.result = None
+        # оценка времени выполнения функции (см. COMPILE_NUMPY_CALL_COST)
+        self.cost = 0
+
+    def const(self, obj, prefix):
+        name = self.constNames.get(id(obj))
+        if name is None:
+            name = '%s%d' % (prefix, len(self.consts))
+            self.consts[name] = obj
+            self.constNames[id(obj)] = name
+
+        return name
+
+    def known(self, gen, base):
+        # True, если класс gen не перекрывает методы выдачи значений класса
+        # base (т.е. компилятор знает, что они делают)
+        cls = type(gen)
+
+        return isinstance(gen, base) and cls.get_next_value is base.get_next_value \
+            and cls.write_next_value is base.write_next_value \
+            and gen.get_n_channels() is not None
+
+    def scratch(self, n):
+        # собственный промежуточный массив для каждого обращения
+        return self.const(np.zeros(n, dtype=FRAME_DTYPE), 's')
+
+    def temp(self):
+        self.ntemps += 1
+
+        return 't%d' % self.ntemps
+
+    def add(self, indent, *code):
+        self.lines.extend(indent + c for c in code)
+
+    def call(self, indent, *code):
+        # вызовы функций numpy
+        self.add(indent, *code)
+        self.cost += COMPILE_NUMPY_CALL_COST * len(code)
+
+    def emit_advance(self, p, indent):
+        # встроенный GradPosition.next_value()
+        if p.length < 2:
+            return
+
+        P = self.const(p, 'p')
+        lv = p.length - 1
+
+        if p.mode == GradPosition.STOP:
+            self.add(indent,
+                'if %s.value < %d:' % (P, lv),
+                '    %s.value += %s.direction' % (P, P),
+                '    %s.ncycles += 1' % P)
+        elif p.mode == GradPosition.REPEAT:
+            v = self.temp()
+            self.add(indent,
+                '%s = %s.value + %s.direction' % (v, P, P),
+                'if %s < 0 or %s == %d:' % (v, v, p.length),
+                '    %s.ncycles += 1' % P,
+                '    %s %%= %d' % (v, p.length),
+                '%s.value = %s' % (P, v))
+        elif p.mode == GradPosition.MIRROR:
+            v = self.temp()
+            self.add(indent,
+                '%s = %s.value + %s.direction' % (v, P, P),
+                'if %s > %d:' % (v, lv),
+                '    %s = %d' % (v, lv - 1),
+                '    %s.direction = -%s.direction' % (P, P),
+                '    %s.ncycles += 1' % P,
+                'elif %s < 0:' % v,
+                '    %s = 1' % v,
+                '    %s.direction = -%s.direction' % (P, P),
+                '    %s.ncycles += 1' % P,
+                '%s.value = %s' % (P, v))
+        else:
+            self.add(indent, '%s.next_value()' % P)
+
+    def emit_sequence(self, g, indent, emit_branch, emit_other):
+        # встроенный SequenceGenGradGen.write_next_value();
+        # emit_branch(sub, indent) - расчёт значения вложенного генератора
+        # sub, emit_other(var, indent) - расчёт значения генератора,
+        # ссылка на который - в переменной var
+        G = self.const(g, 'g')
+        v = self.temp()
+
+        self.add(indent, '%s = %s.activeGen' % (v, G))
+
+        done = set()
+        for sub in g.generators:
+            if id(sub) in done:
+                continue
+
+            done.add(id(sub))
+            self.add(indent, '%s %s is %s:' % ('elif' if len(done) > 1 else 'if',
+                v, self.const(sub, 'g')))
+            emit_branch(sub, indent + '    ')
+
+        self.add(indent, 'else:')
+        emit_other(v, indent + '    ')
+        self.add(indent,
+            '%s.activeItrs -= 1' % G,
+            'if %s.activeItrs <= 0:' % G,
+            '    %s.position.next_value()' % G,
+            '    %s = %s[%s.position.value]' % (v, self.const(g.generators, 'l'), G),
+            '    %s.activeGen = %s' % (G, v),
+            '    %s.activeItrs = %s.get_n_values()' % (G, v))
+
+    def build(self):
+        # константы - значения параметров по умолчанию, т.е. внутри функции
+        # они - локальные переменные
+        args = ', '.join('%s=%s' % (name, name) for name in self.consts)
+        source = 'def fused_tree(%s):\n%s\n    return %s\n' % (args,
+            '\n'.join(self.lines), self.result)
+
+        namespace = dict(self.consts)
+        exec(source, namespace)
+
+        return (namespace['fused_tree'], source)
+
+
+class __VectorTreeCompiler(__TreeCompiler):
+    # значения - массивами numpy (для генераторов с большим количеством
+    # каналов)
+
+    def emit_cycled(self, g, ix, indent):
+        # значение g, "размноженное" до нужного количества каналов
+        # (одно значение numpy "размножит" сама)
+        v = self.emit(g, None, indent)
+        if ix is None or g.get_n_channels() == 1:
+            return v
+
+        S = self.scratch(len(ix))
+        self.call(indent, 'np.take(%s, %s, out=%s)' % (v, self.const(ix, 'ix'), S))
+
+        return S
+
+    def emit(self, g, target, indent):
+        # код, расчитывающий значение g; если target (массив numpy)
+        # указан - значение записывается в него, иначе может быть
+        # возвращено без копирования (строка буфера, константа и т.п.);
+        # возвращает имя переменной со значением
+        n = g.get_n_channels()
+        T = self.scratch(n) if target is None else self.const(target, 'o')
+
+        if self.known(g, BufferedGradGen) and len(g.buffer):
+            v = self.temp()
+            self.add(indent, '%s = %s[%s.value]' % (v,
+                self.const(g.buffer, 'b'), self.const(g.position, 'p')))
+            self.emit_advance(g.position, indent)
+
+            if g.bufDtype == np.uint8:
+                self.call(indent, 'np.multiply(%s, BYTE_TO_FLOAT, out=%s)' % (v, T))
+            elif target is None and g.bufDtype == FRAME_DTYPE:
+                return v
+            else:
+                self.call(indent, 'np.copyto(%s, %s)' % (T, v))
+        elif self.known(g, ConstantGradGen):
+            C = self.const(g.frame, 'c')
+            if target is None:
+                return C
+
+            self.call(indent, 'np.copyto(%s, %s)' % (T, C))
+        elif self.known(g, ParallelGenGradGen):
+            dest = self.consts[T]
+            first = 0
+
+            for sub in g.generators:
+                sn = sub.get_n_channels()
+                self.emit(sub, dest[first:first + sn], indent)
+                first += sn
+        elif self.known(g, EnvelopeGenGradGen) and g.nchannels is not None:
+            src = self.emit(g.sourcegen, None, indent)
+            env = self.emit_cycled(g.envelopegen, g._EnvelopeGenGradGen__envIx, indent)
+
+            self.call(indent, 'np.multiply(%s, %s, out=%s)' % (src, env, T))
+        elif self.known(g, CrossfadeGenGradGen) and g.nchannels is not None:
+            src1 = self.emit(g.source1gen, None, indent)
+            src2 = self.emit_cycled(g.source2gen, g._CrossfadeGenGradGen__src2Ix, indent)
+            balance = self.emit_cycled(g.balancegen, g._CrossfadeGenGradGen__balanceIx, indent)
+            S = self.scratch(n)
+
+            # (s1v * (1-bv)) + (s2v * bv) == s1v + (s2v - s1v) * bv
+            self.call(indent,
+                'np.subtract(%s, %s, out=%s)' % (src2, src1, S),
+                'np.multiply(%s, %s, out=%s)' % (S, balance, S),
+                'np.add(%s, %s, out=%s)' % (src1, S, T))
+        elif self.known(g, SequenceGenGradGen) and g.generators:
+            dest = self.consts[T]
+
+            self.emit_sequence(g, indent,
+                lambda sub, ind: self.emit(sub, dest, ind),
+                lambda v, ind: self.add(ind, '%s.write_next_value(%s)' % (v, T)))
+        else:
+            # прочие генераторы - обычным порядком
+            self.add(indent, '%s.write_next_value(%s)' % (self.const(g, 'g'), T))
+
+        return T
+
+    def compile(self, gen, out):
+        self.result = self.emit(gen, out, '    ')
+
+
+class __ScalarTreeCompiler(__TreeCompiler):
+    # значения - поканально, числами float в локальных переменных
+    # (для генераторов с малым количеством каналов)
+
+    def __init__(self):
+        super().__init__()
+
+        # буферы в виде кортежей кортежей float: {id(buffer): имя константы}
+        self.rows = {}
+
+    def assign(self, indent, names, code):
+        # присваивание значений кортежа code переменным names
+        self.add(indent, '%s = %s' % (self.targets(names), code))
+        self.cost += len(names)
+
+    def expr(self, indent, code):
+        # новая переменная, получающая значение выражения code
+        v = self.temp()
+        self.add(indent, '%s = %s' % (v, code))
+        self.cost += 1
+
+        return v
+
+    @staticmethod
+    def targets(names):
+        # левая часть присваивания кортежа
+        return names[0] + ',' if len(names) == 1 else ', '.join(names)
+
+    def values(self, indent, code, n):
+        # новые переменные, получающие n значений кортежа code
+        names = [self.temp() for i in range(n)]
+        self.assign(indent, names, code)
+
+        return names
+
+    def literal(self, v):
+        v = float(v)
+
+        return repr(v) if np.isfinite(v) else self.const(v, 'c')
+
+    def emit_fallback(self, g, indent):
+        S = self.scratch(g.get_n_channels())
+        self.add(indent, '%s.write_next_value(%s)' % (self.const(g, 'g'), S))
+
+        return self.values(indent, '%s.tolist()' % S, g.get_n_channels())
+
+    def emit(self, g, indent):
+        # код, расчитывающий значение g; возвращает список выражений
+        # (имён переменных или чисел) - по одному на канал
+        n = g.get_n_channels()
+
+        if self.known(g, BufferedGradGen) and len(g.buffer):
+            P = self.const(g.position, 'p')
+
+            if g.buffer.size > COMPILE_MAX_TUPLE_VALUES:
+                B = self.const(g.buffer, 'b')
+                if g.bufDtype == np.uint8:
+                    ret = self.values(indent, '(%s[%s.value] * BYTE_TO_FLOAT).tolist()' % (B, P), n)
+                else:
+                    ret = self.values(indent, '%s[%s.value].tolist()' % (B, P), n)
+            else:
+                R = self.rows.get(id(g.buffer))
+                if R is None:
+                    buf = g.buffer
+                    if g.bufDtype == np.uint8:
+                        buf = np.multiply(buf, BYTE_TO_FLOAT, dtype=FRAME_DTYPE)
+
+                    # через FRAME_DTYPE - для тех же значений, что и в массивах
+                    R = self.const(tuple(map(tuple, buf.astype(FRAME_DTYPE).tolist())), 'r')
+                    self.rows[id(g.buffer)] = R
+
+                ret = self.values(indent, '%s[%s.value]' % (R, P), n)
+
+            self.emit_advance(g.position, indent)
+
+            return ret
+
+        if self.known(g, ConstantGradGen):
+            return [self.literal(v) for v in g.frame]
+
+        if self.known(g, ParallelGenGradGen):
+            ret = []
+            for sub in g.generators:
+                ret += self.emit(sub, indent)
+
+            return ret
+
+        if self.known(g, EnvelopeGenGradGen) and g.nchannels is not None:
+            src = self.emit(g.sourcegen, indent)
+            env = self.emit(g.envelopegen, indent)
+
+            return [self.expr(indent, '%s * %s' % (src[i], env[i % len(env)]))
+                    for i in range(n)]
+
+        if self.known(g, CrossfadeGenGradGen) and g.nchannels is not None:
+            src1 = self.emit(g.source1gen, indent)
+            src2 = self.emit(g.source2gen, indent)
+            balance = self.emit(g.balancegen, indent)
+            return [self.expr(indent, '%s + (%s - %s) * %s' % (src1[i],
+                        src2[i % len(src2)], src1[i], balance[i % len(balance)]))
+                    for i in range(n)]
+
+        if self.known(g, SequenceGenGradGen) and g.generators:
+            ret = [self.temp() for i in range(n)]
+
+            def __branch(sub, indent):
+                self.assign(indent, ret, self.targets(self.emit(sub, indent)))
+
+            def __other(v, indent):
+                S = self.scratch(n)
+                self.add(indent, '%s.write_next_value(%s)' % (v, S))
+                self.assign(indent, ret, '%s.tolist()' % S)
+
+            self.emit_sequence(g, indent, __branch, __other)
+
+            return ret
+
+        # прочие генераторы - обычным порядком
+        return self.emit_fallback(g, indent)
+
+    def compile(self, gen, out):
+        vals = self.emit(gen, '    ')
+
+        if out is None:
+            out = np.zeros(len(vals), dtype=FRAME_DTYPE)
+
+        self.result = self.const(out, 'o')
+        self.add('    ', '%s[:] = (%s)' % (self.result, self.targets(vals)))
+        self.cost += len(vals)
+
+
+def compile_tree(gen, out=None):
+    """Компиляция дерева генераторов в одну функцию, выполняющую
+    то же, что и gen.write_next_value(out) (или gen.get_next_value(),
+    если out не указан), без вызовов методов
+    генераторов дерева: выборка значений из буферов, продвижение
+    счётчиков положения и расчёты EnvelopeGenGradGen, CrossfadeGenGradGen
+    встраиваются в текст функции, а структура дерева, буферы
+    и промежуточные массивы - константы функции.
+
+    Встраиваются генераторы классов BufferedGradGen (и потомков),
+    ConstantGradGen, ParallelGenGradGen, EnvelopeGenGradGen,
+    CrossfadeGenGradGen и SequenceGenGradGen, если их классы-потомки
+    не перекрывают методы get_next_value() и write_next_value();
+    для остальных генераторов (в т.ч. профилируемых - см. profile_tree())
+    вызывается метод write_next_value().
+
+    Значения расчитываются либо массивами numpy, либо поканально
+    числами float (буферы при этом копируются в кортежи, см.
+    COMPILE_MAX_TUPLE_VALUES) - в зависимости от того, что быстрее
+    (по оценке, см. COMPILE_NUMPY_CALL_COST): на малом количестве каналов
+    время вызова функции numpy больше времени самого расчёта.
+    Значения могут отличаться от выдаваемых get_next_value() в пределах
+    погрешности FRAME_DTYPE (порядок операций и точность промежуточных
+    значений могут быть другими).
+
+    Параметры:
+        gen     - экземпляр GradGen (после вызова reset()), количество
+                  каналов которого известно (см. GradGen.get_n_channels());
+        out     - None или одномерный массив numpy (элементы типа
+                  FRAME_DTYPE) для значений.
+
+    Функция возвращает кортеж из двух элементов:
+        1. функция без параметров, записывающая очередное значение
+           в out и возвращающая out; если out не указан - возвращающая
+           массив numpy со значением, который может быть строкой буфера
+           генератора или промежуточным массивом, т.е. действителен
+           только до следующего вызова и не должен изменяться;
+        2. строка - текст функции (для отладки).
+
+    Внимание! Функция расчитана на дерево в том виде, в котором оно было
+    на момент компиляции: после reset() генераторов дерева, изменения
+    их полей (position.length, position.mode, списков вложенных
+    генераторов и т.п.) функцию следует скомпилировать заново.
+    Состояние (счётчики положения и т.п.) функция хранит в самих
+    генераторах, т.е. её можно чередовать с обычными вызовами методов."""
+
+    if gen.get_n_channels() is None:
+        raise ValueError('compile_tree(): number of channels of generator "%s" is unknown' % gen.name)
+
+    compilers = (__VectorTreeCompiler(), __ScalarTreeCompiler())
+
+    for c in compilers:
+        c.compile(gen, out)
+
+    return min(compilers, key=lambda c: c.cost).build()
+
+
+class CompiledGradGen(GradGen):
+    """Генератор, выдающий значения дерева генераторов sourcegen,
+    расчитываемые функцией, полученной компиляцией дерева (см. функцию
+    compile_tree()), т.е. с минимумом вызовов методов на каждое значение.
+
+    Поля (в дополнение к наследственным):
+        sourcegen   - экземпляр GradGen, корень дерева;
+        source      - строка, текст скомпилированной функции (None,
+                      если количество каналов sourcegen неизвестно -
+                      в этом случае значения получаются от sourcegen
+                      без компиляции).
+
+    Функция компилируется заново при каждом вызове reset(), т.ч. после
+    изменения параметров генераторов дерева следует вызывать reset().
+    Методы get_next_values(), seek() и value_at() вызывают
+    соответствующие методы sourcegen.
+    Значение, возвращаемое get_next_value(), действительно только
+    до следующего вызова и не должно изменяться."""
+
+    __slots__ = ('sourcegen', 'source', '__fused')
+
+    def init_attrs(self, **kwargs):
+        """Параметры: см. описание полей экземпляра класса."""
+
+        super().init_attrs(**kwargs)
+
+        self.sourcegen = self.kwargs_get(kwargs, 'sourcegen', None, self.check_isgrad)
+
+        self.source = None
+        self.__fused = None
+
+    def reset(self):
+        super().reset()
+
+        self.sourcegen.reset()
+        self.compile()
+
+    def compile(self):
+        """Компиляция дерева sourcegen (см. compile_tree())."""
+
+        if self.sourcegen.get_n_channels() is None:
+            self.source = None
+            self.__fused = None
+        else:
+            self.__fused, self.source = compile_tree(self.sourcegen)
+
+    def get_disp_name(self):
+        return '%s(%s)' % (self.name, self.sourcegen.get_disp_name())
+
+    def get_subgens(self):
+        return [self.sourcegen]
+
+    def get_values_key(self):
+        return self.sourcegen.get_values_key()
+
+    def get_n_values(self):
+        return self.sourcegen.get_n_values()
+
+    def get_n_channels(self):
+        return self.sourcegen.get_n_channels()
+
+    def get_next_value(self):
+        if self.__fused is None:
+            return self.sourcegen.get_next_value()
+
+        return self.__fused()
+
+    def write_next_value(self, out):
+        if self.__fused is None:
+            return self.sourcegen.write_next_value(out)
+
+        np.copyto(out, self.__fused())
+
+        return out
+
+    def get_next_values(self, n):
+        return self.sourcegen.get_next_values(n)
+
+    def seek(self, tick):
+        self.sourcegen.seek(tick)
+
+    def value_at(self, tick):
+        return self.sourcegen.value_at(tick)
+
+
+class GenProfile():
+    """Статистика вызовов методов одного генератора, собираемая
+    в режиме профилирования (см. функцию profile_tree()).
+    Экземпляры GenProfile образуют дерево, повторяющее структуру дерева
+    генераторов.
+
+    Время - в секундах, "включительно", т.е. с учётом времени работы
+    вложенных генераторов (время работы самого генератора возвращает
+    метод self_time()).
+
+    Поля:
+        gen         - экземпляр GradGen;
+        children    - список экземпляров GenProfile вложенных генераторов;
+        calls       - количество вызовов get_next_value() (при вызовах
+                      get_next_values(n) увеличивается на n);
+        nextTime    - общее время вызовов get_next_value(s)();
+        nextMax     - максимальное время одного вызова get_next_value(s)();
+        resets      - количество вызовов reset();
+        resetTime   - общее время вызовов reset();
+        resetMax    - максимальное время одного вызова reset();
+        allocBytes  - общий прирост памяти, выделенной при вызовах
+                      get_next_value(s)() (по данным tracemalloc;
+                      0, если профилирование запущено без tracemem)."""
+
+    def __init__(self, gen):
+        self.gen = gen
+        self.children = []
+
+        self.clear()
+
+    def __repr__(self):
+        return repr_to_str(self)
+
+    def clear(self):
+        self.calls = 0
+        self.nextTime = 0.0
+        self.nextMax = 0.0
+
+        self.resets = 0
+        self.resetTime = 0.0
+        self.resetMax = 0.0
+
+        self.allocBytes = 0
+
+    def self_time(self):
+        """Возвращает время вызовов get_next_value(s)() без учёта времени
+        работы вложенных генераторов."""
+
+        return self.nextTime - sum(map(lambda c: c.nextTime, self.children))
+
+    def alloc_per_frame(self):
+        return self.allocBytes / self.calls if self.calls else 0.0
+
+    def as_dict(self):
+        """Возвращает статистику (рекурсивно, с вложенными генераторами)
+        в виде словаря."""
+
+        return {'name': self.gen.name,
+                'class': self.gen.__class__.__name__,
+                'calls': self.calls,
+                'nextTime': self.nextTime,
+                'selfTime': self.self_time(),
+                'nextMax': self.nextMax,
+                'resets': self.resets,
+                'resetTime': self.resetTime,
+                'resetMax': self.resetMax,
+                'allocBytes': self.allocBytes,
+                'children': [c.as_dict() for c in self.children]}
+
+    def format(self, indent=0):
+        """Возвращает статистику (рекурсивно, с вложенными генераторами)
+        в виде многострочного текста, где вложенность генераторов
+        обозначена отступами."""
+
+        r = ['%s%s: calls=%d, total=%.3fms, self=%.3fms, max=%.3fms, resets=%d (%.3fms), alloc/frame=%.1fB' % (
+            '  ' * indent, self.gen.name, self.calls,
+            self.nextTime * 1000, self.self_time() * 1000, self.nextMax * 1000,
+            self.resets, self.resetTime * 1000, self.alloc_per_frame())]
+
+        for c in self.children:
+            r.append(c.format(indent + 1))
+
+        return '\n'.join(r)
+
+    def __str__(self):
+        return self.format()
+
+
+# экземпляры GenProfile профилируемых генераторов (ключи - id генераторов)
+__profiles = {}
+
+# классы-"обёртки" профилируемых генераторов (ключи - исходные классы)
+__profiledClasses = {}
+
+
+def __get_profiled_class(cls):
+    """Создание (или получение ранее созданного) класса-потомка cls,
+    методы get_next_value(), get_next_values(), write_next_value() и reset() которого
+    собирают статистику в экземпляр GenProfile из __profiles."""
+
+    pcls = __profiledClasses.get(cls)
+    if pcls is not None:
+        return pcls
+
+    def __account_next(p, t0, m0, ncalls):
+        dt = perf_counter() - t0
+
+        p.calls += ncalls
+        p.nextTime += dt
+        if dt > p.nextMax:
+            p.nextMax = dt
+
+        if m0 is not None:
+            dm = tracemalloc.get_traced_memory()[0] - m0
+            if dm > 0:
+                p.allocBytes += dm
+
+    def __mem():
+        return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+
+    def get_next_value(self):
+        p = __profiles[id(self)]
+        m0 = __mem()
+        t0 = perf_counter()
+
+        ret = cls.get_next_value(self)
+
+        __account_next(p, t0, m0, 1)
+        return ret
+
+    def get_next_values(self, n):
+        p = __profiles[id(self)]
+        m0 = __mem()
+        t0 = perf_counter()
+
+        ret = cls.get_next_values(self, n)
+
+        __account_next(p, t0, m0, n)
+        return ret
+
+    def write_next_value(self, out):
+        p = __profiles[id(self)]
+        m0 = __mem()
+        t0 = perf_counter()
+
+        ret = cls.write_next_value(self, out)
+
+        __account_next(p, t0, m0, 1)
+        return ret
+
+    def reset(self):
+        p = __profiles.get(id(self))
+        if p is None:
+            # reset() вызван конструктором или до регистрации
+            return cls.reset(self)
+
+        t0 = perf_counter()
+
+        cls.reset(self)
+
+        dt = perf_counter() - t0
+        p.resets += 1
+        p.resetTime += dt
+        if dt > p.resetMax:
+            p.resetMax = dt
+
+    pcls = type(cls.__name__, (cls,), {'__slots__': (),
+        '__module__': cls.__module__,
+        '__qualname__': cls.__qualname__,
+        'get_next_value': get_next_value,
+        'get_next_values': get_next_values,
+        'write_next_value': write_next_value,
+        'reset': reset,
+        '_profiledBase': cls})
+
+    __profiledClasses[cls] = pcls
+
+    return pcls
+
+
+def profile_tree(gen, tracemem=False):
+    """Включение режима профилирования для дерева генераторов.
+
+    У каждого генератора дерева вызовы методов get_next_value(),
+    get_next_values() и reset() начинают сопровождаться сбором статистики
+    (для этого класс каждого генератора подменяется классом-потомком).
+    Когда режим профилирования выключен (или не включался) - генераторы
+    работают как обычно, без каких либо дополнительных затрат.
+
+    Параметры:
+        gen         - экземпляр GradGen, корень дерева;
+        tracemem    - булевское значение; если True - собирается также
+                      статистика выделения памяти (при необходимости
+                      запускается tracemalloc; заметно замедляет работу).
+
+    Функция возвращает экземпляр GenProfile, соответствующий gen,
+    со статистикой вложенных генераторов в поле children (и т.д.)."""
+
+    if tracemem and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    def __make_profile(g):
+        p = __profiles.get(id(g))
+        if p is not None:
+            # генератор входит в дерево несколько раз или уже профилируется
+            return p
+
+        p = GenProfile(g)
+        __profiles[id(g)] = p
+
+        if not hasattr(g.__class__, '_profiledBase'):
+            g.__class__ = __get_profiled_class(g.__class__)
+
+        p.children = [__make_profile(c) for c in g.get_subgens()]
+
+        return p
+
+    return __make_profile(gen)
+
+
+def unprofile_tree(gen):
+    """Выключение режима профилирования, включенного функцией
+    profile_tree(), для дерева генераторов."""
+
+    for g in iter_tree(gen):
+        __profiles.pop(id(g), None)
+
+        base = getattr(g.__class__, '_profiledBase', None)
+        if base is not None:
+            g.__class__ = base
+
+
+SHOW_FILE_SIGNATURE = b'DMXGSHOW'
+SHOW_FILE_VERSION = 1
+
+# заголовок файла: сигнатура, версия формата, тип значений, поведение
+# счётчика положения (GradPosition.mode), интервал в миллисекундах,
+# количество значений, количество каналов;
+# значения (двумерный массив numpy) начинаются со смещения SHOW_HEADER_SIZE
+__SHOW_HEADER_FMT = '<8sHBBdQI'
+SHOW_HEADER_SIZE = 64
+
+# допустимые типы значений в файле, индекс в кортеже - код типа в заголовке
+__SHOW_DTYPES = (np.dtype(np.uint8), np.dtype(np.float32))
+
+# количество значений, получаемых от генератора за одно обращение
+# при записи файла
+SHOW_BLOCK_SIZE = 1024
+
+
+def create_show_file(filename, nframes, nchannels, dtype=np.uint8, mode=GradPosition.STOP, interval=None):
+    """Создание файла для MappedShowGradGen (см. write_show_file())
+    с заголовком и незаполненными (нулевыми) значениями.
+
+    Параметры:
+        filename    - строка, имя файла;
+        nframes     - положительное целое, количество значений;
+        nchannels   - целое, количество каналов;
+        dtype, interval - см. write_show_file();
+        mode        - значение для поля GradPosition.mode генератора,
+                      воспроизводящего файл.
+
+    Функция возвращает двумерный массив numpy.memmap (доступный для записи)
+    для заполнения значениями (см. store_show_values())."""
+
+    if nframes < 1:
+        raise ValueError('create_show_file(): nframes must be > 0')
+
+    dtype = np.dtype(dtype)
+    if dtype not in __SHOW_DTYPES:
+        raise ValueError('create_show_file(): unsupported dtype')
+
+    if interval is None:
+        interval = GradPosition.DEFAULT_TICK_INTERVAL
+
+    with open(filename, 'wb') as f:
+        f.write(struct.pack(__SHOW_HEADER_FMT, SHOW_FILE_SIGNATURE,
+            SHOW_FILE_VERSION, __SHOW_DTYPES.index(dtype), mode, interval,
+            nframes, nchannels).ljust(SHOW_HEADER_SIZE, b'\0'))
+        f.truncate(SHOW_HEADER_SIZE + nframes * nchannels * dtype.itemsize)
+
+    return np.memmap(filename, dtype, 'r+', SHOW_HEADER_SIZE, (nframes, nchannels))
+
+
+def store_show_values(frames, ix, block, firstChannel=0):
+    """Запись блока значений в массив, полученный от create_show_file()
+    (или read_show_file() с writable=True).
+
+    Параметры:
+        frames      - двумерный массив numpy;
+        ix          - номер первого записываемого значения;
+        block       - двумерный массив numpy float (см. GradGen.get_next_values());
+        firstChannel - номер первого записываемого канала (столбца)."""
+
+    dest = frames[ix:ix + len(block), firstChannel:firstChannel + block.shape[1]]
+
+    if frames.dtype == np.uint8:
+        quantize_values(block, dest)
+    else:
+        dest[:] = block
+
+
+def write_show_file(gen, filename, nframes=None, dtype=np.uint8, mode=None, interval=None):
+    """Запись выхлопа генератора (или дерева генераторов) в файл
+    в виде двумерного массива значений с заголовком, для последующего
+    воспроизведения генератором MappedShowGradGen.
+
+    Параметры:
+        gen         - экземпляр GradGen, выдающий конечное количество
+                      значений;
+        filename    - строка, имя файла;
+        nframes     - None или положительное целое, количество значений;
+                      если None - используется значение gen.get_n_values();
+        dtype       - тип значений в файле: np.uint8 (по умолчанию,
+                      значения преобразуются в целые 0-255) или np.float32;
+        mode        - None или значение для поля GradPosition.mode
+                      генератора, воспроизводящего файл; если None -
+                      используется значение gen.position.mode;
+        interval    - None или интервал в миллисекундах между значениями;
+                      если None - используется значение
+                      GradPosition.DEFAULT_TICK_INTERVAL.
+
+    Значения от генератора получаются блоками по SHOW_BLOCK_SIZE и пишутся
+    в файл через numpy.memmap, т.е. весь выхлоп в памяти не держится."""
+
+    if nframes is None:
+        nframes = gen.get_n_values()
+
+    if nframes < 1:
+        raise ValueError('write_show_file(): nframes must be > 0')
+
+    if mode is None:
+        mode = gen.position.mode
+
+    block = gen.get_next_values(min(SHOW_BLOCK_SIZE, nframes))
+    nchannels = block.shape[1]
+
+    frames = create_show_file(filename, nframes, nchannels, dtype, mode, interval)
+
+    ix = 0
+    while True:
+        if block.shape[1] != nchannels:
+            raise ValueError('write_show_file(): generator returned %d channel(s) instead of %d' % (block.shape[1], nchannels))
+
+        store_show_values(frames, ix, block)
+
+        ix += len(block)
+        if ix >= nframes:
+            break
+
+        block = gen.get_next_values(min(SHOW_BLOCK_SIZE, nframes - ix))
+
+    frames.flush()
+
+
+def read_show_file(filename, writable=False):
+    """Открытие файла, созданного функцией write_show_file().
+
+    Параметры:
+        filename    - строка, имя файла;
+        writable    - если True, массив значений доступен для записи
+                      (изменения пишутся прямо в файл).
+
+    Функция возвращает кортеж из трёх элементов:
+        1. двумерный массив numpy.memmap (только для чтения, если
+           не указан writable) со значениями,
+        2. значение для поля GradPosition.mode,
+        3. интервал в миллисекундах между значениями.
+    В случае неправильного формата файла генерируется исключение."""
+
+    __E_BAD_FILE = 'read_show_file(): "%s" is not a valid show file' % filename
+
+    with open(filename, 'rb') as f:
+        hdr = f.read(SHOW_HEADER_SIZE)
+
+    if len(hdr) < SHOW_HEADER_SIZE:
+        raise ValueError(__E_BAD_FILE)
+
+    sign, version, dtcode, mode, interval, nframes, nchannels = struct.unpack_from(__SHOW_HEADER_FMT, hdr)
+
+    if sign != SHOW_FILE_SIGNATURE or version != SHOW_FILE_VERSION \
+        or dtcode >= len(__SHOW_DTYPES) or nframes < 1:
+        raise ValueError(__E_BAD_FILE)
+
+    frames = np.memmap(filename, __SHOW_DTYPES[dtcode], 'r+' if writable else 'r',
+        SHOW_HEADER_SIZE, (nframes, nchannels))
+
+    return (frames, mode, interval)
+
+
+class MappedShowGradGen(BufferedGradGen):
+    """Генератор, воспроизводящий значения из файла, созданного функцией
+    write_show_file().
+    Файл отображается в память (numpy.memmap), значения из него
+    не копируются и не расчитываются заново, поэтому воспроизведение
+    даже многочасовых файлов начинается сразу.
+
+    Поля (в дополнение к наследственным):
+        filename    - строка, имя файла;
+        frames      - двумерный массив numpy.memmap со значениями из файла;
+        interval    - интервал в миллисекундах между значениями, указанный
+                      в файле.
+
+    Поле bufDtype соответствует типу значений в файле, поле position.mode -
+    значению, указанному в файле (если не указано явно параметром mode)."""
+
+    __slots__ = ('filename', 'frames', 'interval')
+
+    def init_attrs(self, **kwargs):
+        """Параметры (в дополнение к наследственным):
+            filename    - см. описание поля."""
+
+        self.filename = self.kwargs_get(kwargs, 'filename')
+        self.frames, fmode, self.interval = read_show_file(self.filename)
+
+        kwargs.setdefault('mode', fmode)
+        kwargs['bufDtype'] = self.frames.dtype
+
+        super().init_attrs(**kwargs)
+
+    def render_buffer(self):
+        # значения уже "расчитаны" и лежат в файле - кэш не нужен
+        return self.frames
+
+
+class UniverseBuffer():
+    """Буфер значений каналов одной DMX512 universe, в который
+    значения генератора записываются уже преобразованными в байты.
+    Память под буферы выделяется один раз при создании экземпляра класса.
+
+    Поля:
+        universe    - номер DMX-512 universe;
+        data        - массив numpy из DMX_CHANNELS элементов np.uint8;
+        nchannels   - количество каналов в последнем записанном значении;
+        frame       - массив numpy, первые nchannels элементов data
+                      (без копирования);
+        values      - массив numpy float, последнее записанное значение
+                      до преобразования в байты;
+        lastSentTime - None или время (по часам time.monotonic())
+                      последней отправки значений;
+        framesSent  - количество отправленных значений;
+        framesSuppressed - количество значений, не отправленных из-за
+                      отсутствия изменений (см. метод need_send())."""
+
+    def __init__(self, universe):
+        self.universe = universe
+
+        self.data = np.zeros(DMX_CHANNELS, dtype=np.uint8)
+        self.__scratch = np.zeros(DMX_CHANNELS, dtype=FRAME_DTYPE)
+
+        # последнее отправленное значение и буфер для сравнения с ним
+        self.__sent = np.zeros(DMX_CHANNELS, dtype=np.uint8)
+        self.__diff = np.zeros(DMX_CHANNELS, dtype=np.bool_)
+
+        self.__set_nchannels(0)
+        self.values = self.__scratchv
+
+        self.framesSent = 0
+        self.framesSuppressed = 0
+        self.forget_sent()
+
+    def __repr__(self):
+        return repr_to_str(self)
+
+    def __set_nchannels(self, n):
+        self.nchannels = n
+        self.frame = self.data[:n]
+        self.__scratchv = self.__scratch[:n]
+        self.__sentv = self.__sent[:n]
+        self.__diffv = self.__diff[:n]
+
+    def forget_sent(self):
+        """Сброс сведений о последнем отправленном значении, после чего
+        метод need_send() вернёт True."""
+
+        self.lastSentTime = None
+        self.__sentChannels = -1
+
+    def need_send(self, now, keepalive=None):
+        """Проверка необходимости отправки значения из буфера.
+
+        Параметры:
+            now         - текущее время (по часам time.monotonic());
+            keepalive   - None или интервал в миллисекундах, через который
+                          значение отправляется, даже если не изменилось.
+
+        Метод возвращает True, если значение изменилось со времени последней
+        отправки (см. метод sent()), или если со времени последней отправки
+        прошло не менее keepalive мс, иначе возвращает False
+        и увеличивает на 1 значение поля framesSuppressed."""
+
+        if self.__sentChannels != self.nchannels or self.lastSentTime is None:
+            return True
+
+        if keepalive is not None and (now - self.lastSentTime) * 1000.0 >= keepalive:
+            return True
+
+        if np.not_equal(self.frame, self.__sentv, out=self.__diffv).any():
+            return True
+
+        self.framesSuppressed += 1
+
+        return False
+
+    def sent(self, now):
+        """Регистрация отправки текущего значения.
+
+        Параметры:
+            now - текущее время (по часам time.monotonic())."""
+
+        np.copyto(self.__sentv, self.frame)
+        self.__sentChannels = self.nchannels
+
+        self.lastSentTime = now
+        self.framesSent += 1
+
+    def set_values(self, values):
+        """Запись значения генератора в буфер.
+
+        Параметры:
+            values  - значение, полученное от генератора (float, список
+                      или кортеж float, или массив numpy);
+                      одномерный массив numpy используется как есть,
+                      значения прочих типов предварительно разворачиваются
+                      функцией unwrap_lol().
+
+        Метод возвращает значение поля frame."""
+
+        if not isinstance(values, np.ndarray) or values.ndim != 1:
+            values = np.array(unwrap_lol(values), dtype=FRAME_DTYPE)
+
+        n = len(values)
+        if n != self.nchannels:
+            if n > DMX_CHANNELS:
+                raise ValueError('%s.set_values(): too many channels (%d, must be <= %d)' % (self.__class__.__name__, n, DMX_CHANNELS))
+
+            self.__set_nchannels(n)
+
+        self.values = values
+
+        return quantize_values(values, self.frame, self.__scratchv)
+
+
+class TimingHistogram():
+    """Гистограмма временных значений (в миллисекундах) для статистики
+    работы планировщика TickScheduler.
+
+    Поля:
+        bounds  - кортеж из float, верхние границы интервалов гистограммы
+                  (значения, большие последней границы, попадают
+                  в последний, "бесконечный", интервал);
+        counts  - список целых, количество значений в интервалах
+                  (на один элемент больше, чем в bounds);
+        count   - общее количество значений;
+        total   - сумма значений;
+        maximum - максимальное значение."""
+
+    DEFAULT_BOUNDS = (0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0)
+
+    def __init__(self, bounds=DEFAULT_BOUNDS):
+        self.bounds = tuple(bounds)
+        self.clear()
+
+    def __repr__(self):
+        return repr_to_str(self)
+
+    def clear(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def add(self, v):
+        self.counts[bisect_left(self.bounds, v)] += 1
+        self.count += 1
+        self.total += v
+
+        if v > self.maximum:
+            self.maximum = v
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def __str__(self):
+        r = []
+        lo = 0.0
+
+        for ix, cnt in enumerate(self.counts):
+            hi = '%g' % self.bounds[ix] if ix < len(self.bounds) else 'inf'
+            r.append('%g-%s: %d' % (lo, hi, cnt))
+
+            if ix < len(self.bounds):
+                lo = self.bounds[ix]
+
+        return 'n=%d, mean=%.3f, max=%.3f; %s' % (self.count, self.mean(),
+            self.maximum, ', '.join(r))
+
+
+class TickScheduler():
+    """Планировщик "тиков" по абсолютным срокам.
+
+    Срок очередного тика расчитывается от момента запуска (по часам
+    time.monotonic()) как start + ticks * interval, а не от момента
+    предыдущего тика, поэтому задержки отдельных тиков не накапливаются,
+    и N тиков занимают N * interval независимо от времени, затраченного
+    на их обработку (если, конечно, его хватает в среднем).
+
+    Поля:
+        interval    - интервал между тиками в миллисекундах;
+        start       - время (по часам time.monotonic(), в секундах)
+                      срока первого тика;
+        ticks       - количество выполненных тиков;
+        lateness    - экземпляр TimingHistogram - опоздание тиков
+                      относительно их сроков (мс);
+        jitter      - экземпляр TimingHistogram - отклонение реального
+                      интервала между соседними тиками от interval (мс)."""
+
+    def __init__(self, interval=GradPosition.DEFAULT_TICK_INTERVAL):
+        self.interval = interval
+        self.lateness = TimingHistogram()
+        self.jitter = TimingHistogram()
+
+        self.begin()
+
+    def __repr__(self):
+        return repr_to_str(self)
+
+    def begin(self, delay=0.0):
+        """Запуск планировщика (со сбросом статистики).
+
+        Параметры:
+            delay   - задержка в миллисекундах до срока первого тика."""
+
+        self.start = monotonic() + delay / 1000.0
+        self.ticks = 0
+        self.__lastTick = None
+
+        self.lateness.clear()
+        self.jitter.clear()
+
+    def deadline(self, tick=None):
+        """Возвращает срок (по часам time.monotonic(), в секундах) тика
+        с номером tick (если None - очередного тика)."""
+
+        if tick is None:
+            tick = self.ticks
+
+        return self.start + tick * self.interval / 1000.0
+
+    def tick(self):
+        """Регистрация очередного тика (метод должен вызываться в начале
+        обработки тика). Метод возвращает текущее время."""
+
+        now = monotonic()
+
+        late = (now - self.deadline()) * 1000.0
+        self.lateness.add(late if late > 0.0 else 0.0)
+
+        if self.__lastTick is not None:
+            self.jitter.add(abs((now - self.__lastTick) * 1000.0 - self.interval))
+
+        self.__lastTick = now
+        self.ticks += 1
+
+        return now
+
+    def delay(self):
+        """Возвращает время в миллисекундах, оставшееся до срока
+        очередного тика (0, если срок уже прошёл)."""
+
+        d = (self.deadline() - monotonic()) * 1000.0
+
+        return d if d > 0.0 else 0.0
+
+
+class FrameSource():
+    """Источник значений для GradSender: генератор и буфер(ы) universe,
+    в которые записываются его значения.
+
+    Поля:
+        generator   - экземпляр GradGen;
+        outputs     - список кортежей из двух элементов:
+                      1. экземпляр UniverseBuffer,
+                      2. None - в буфер записывается всё значение генератора,
+                         или целое - номер первого канала значения,
+                         с которого в буфер записываются DMX_CHANNELS
+                         (или сколько останется) каналов;
+        blockSize   - положительное целое, см. описание GradSender."""
+
+    def __init__(self, generator, outputs, blockSize=1):
+        self.generator = generator
+        self.outputs = outputs
+        self.blockSize = blockSize
+
+        self.__block = None
+        self.__blockIx = 0
+
+    def __repr__(self):
+        return repr_to_str(self)
+
+    def next_frame(self, limit=None):
+        """Получение от генератора очередного значения.
+
+        Параметры:
+            limit   - None или положительное целое - максимальное
+                      количество значений, которое ещё понадобится
+                      (ограничивает размер блока)."""
+
+        if self.blockSize <= 1:
+            return self.generator.get_next_value()
+
+        if self.__block is None or self.__blockIx >= len(self.__block):
+            n = self.blockSize
+            if limit is not None and limit < n:
+                n = max(1, limit)
+
+            self.__block = self.generator.get_next_values(n)
+            self.__blockIx = 0
+
+        ret = self.__block[self.__blockIx]
+        self.__blockIx += 1
+
+        return ret
+
+    def update(self, limit=None):
+        """Получение очередного значения от генератора и запись его
+        в буфер(ы) universe.
+
+        Параметры:
+            limit   - см. описание метода next_frame().
+
+        Метод возвращает значение в виде линейного массива float."""
+
+        values = self.next_frame(limit)
+
+        if len(self.outputs) == 1 and self.outputs[0][1] is None:
+            ub = self.outputs[0][0]
+            ub.set_values(values)
+            return ub.values
+
+        if not isinstance(values, np.ndarray) or values.ndim != 1:
+            values = np.array(unwrap_lol(values), dtype=FRAME_DTYPE)
+
+        for ub, first in self.outputs:
+            # количество каналов генератора могло быть неизвестно
+            # при создании GradSender
+            if first >= len(values):
+                raise ValueError('%s.update(): generator "%s" returns too few channels (%d) for universe %d' % (self.__class__.__name__, self.generator.name, len(values), ub.universe))
+
+            ub.set_values(values[first:first + DMX_CHANNELS])
+
+        return values
+
+
+class DMXTransport():
+    """Базовый класс "транспорта" - способа доставки значений каналов
+    DMX512-совместимым устройствам.
+    Методы send() и, при необходимости, прочие должны быть перекрыты
+    классом-потомком."""
+
+    def __repr__(self):
+        return repr_to_str(self)
+
+    def send(self, universe, data, callback=None):
+        """Отправка значений каналов.
+
+        Параметры:
+            universe    - номер DMX-512 universe;
+            data        - массив numpy с элементами np.uint8; содержимое
+                          массива может быть изменено вызывающим сразу
+                          после возврата из метода, поэтому, если значения
+                          не отправляются немедленно, их следует скопировать;
+            callback    - None или функция, получающая один параметр -
+                          булевское значение (True - отправка успешна);
+                          вызывается по завершении отправки (в т.ч.
+                          до возврата из метода send())."""
+
+        raise NotImplementedError()
+
+    def attach(self, loop):
+        """Метод вызывается AsyncGradSender.run() перед началом работы,
+        если транспорту нужно что-либо зарегистрировать в цикле событий
+        asyncio.
+
+        Параметры:
+            loop    - экземпляр asyncio.AbstractEventLoop."""
+
+        pass
+
+    def detach(self, loop):
+        """Метод вызывается AsyncGradSender.run() по окончании работы,
+        должен "отменять" действия метода attach()."""
+
+        pass
+
+    def close(self):
+        """Освобождение ресурсов транспорта (сокетов, файлов и т.п.)."""
+
+        pass
+
+
+class OLATransport(DMXTransport):
+    """Транспорт, отправляющий значения демону olad.
+
+    Поля:
+        wrapper     - None или экземпляр ola.ClientWrapper (создаётся
+                      при первом обращении методом get_wrapper());
+        client      - None или экземпляр ola.OlaClient;
+        lastState   - None или экземпляр RequestStatus - результат
+                      последней отправки."""
+
+    def __init__(self, wrapper=None):
+        self.wrapper = wrapper
+        self.client = None
+        self.lastState = None
+
+    def get_wrapper(self):
+        """Возвращает экземпляр ola.ClientWrapper (цикл событий OLA),
+        при необходимости создавая его."""
+
+        if self.wrapper is None:
+            from ola.ClientWrapper import ClientWrapper
+
+            self.wrapper = ClientWrapper()
+
+        return self.wrapper
+
+    def get_client(self):
+        if self.client is None:
+            self.client = self.get_wrapper().Client()
+
+        return self.client
+
+    def attach(self, loop):
+        # ClientWrapper тут не нужен, ответы olad обрабатываются циклом asyncio
+        if self.client is None:
+            from ola.OlaClient import OlaClient
+
+            self.client = OlaClient()
+
+        loop.add_reader(self.client.GetSocket(), self.client.SocketReady)
+
+    def detach(self, loop):
+        loop.remove_reader(self.client.GetSocket())
+
+    def send(self, universe, data, callback=None):
+        def __sent(state):
+            self.lastState = state
+
+            if callback is not None:
+                callback(state.Succeeded())
+
+        self.get_client().SendDmx(universe, data, __sent)
+
+
+class NullTransport(DMXTransport):
+    """Транспорт, никуда ничего не отправляющий, а только подсчитывающий
+    количество отправок. Предназначен для измерения производительности
+    генераторов и т.п.
+
+    Поля:
+        frames  - количество отправок;
+        nbytes  - общее количество "отправленных" байт."""
 
-        pass
+    def __init__(self):
+        self.frames = 0
+        self.nbytes = 0
 
-    def add_subgen(self, *gen):
-        """Добавление одного или нескольких вложенных генераторов.
+    def send(self, universe, data, callback=None):
+        self.frames += 1
+        self.nbytes += len(data)
 
-        gen - экземпляр(ы) класса GradGen."""
+        if callback is not None:
+            callback(True)
 
-        self.generators += gen
 
-        self.position.set_length(self.generators)
+class FileTransport(DMXTransport):
+    """Транспорт, записывающий значения в файл (или канал).
 
-        self.subgen_added()
+    Каждая отправка записывается как заголовок из двух 16-битных
+    беззнаковых целых (little endian) - номер universe и количество
+    каналов, за которым следуют значения каналов (байты).
 
-    def reset(self):
-        self.position.set_length(self.generators)
+    Поля:
+        file    - файловый объект, открытый для записи в двоичном режиме;
+        flush   - булевское значение; если True - file.flush() вызывается
+                  после каждой отправки."""
 
-        super().reset()
+    __HEADER_FMT = '<HH'
 
-        for g in self.generators:
-            g.reset()
+    def __init__(self, file, flush=False):
+        """Параметры:
+            file    - файловый объект или строка - имя файла;
+            flush   - см. описание поля."""
 
+        if isinstance(file, str):
+            file = open(file, 'wb')
+            self.__ownfile = True
+        else:
+            self.__ownfile = False
 
-class ParallelGenGradGen(GroupGenGradGen):
-    """Генератор, возвращающий сгруппированные значения
-    от всех вложенных генераторов."""
+        self.file = file
+        self.flush = flush
 
-    def get_n_values(self):
-        m = 0
-        for g in self.generators:
-            v = g.get_n_values()
-            if v > m:
-                m = v
+        self.__header = bytearray(struct.calcsize(self.__HEADER_FMT))
 
-        return m
+    def send(self, universe, data, callback=None):
+        struct.pack_into(self.__HEADER_FMT, self.__header, 0, universe, len(data))
 
-    def get_next_value(self):
-        return [g.get_next_value() for g in self.generators]
+        self.file.write(self.__header)
+        self.file.write(data)
 
+        if self.flush:
+            self.file.flush()
 
-class RepeaterGenGradGen(GradGen):
-    """Генератор, повторяющий вызов дочернего генератора указанное
-    количество раз.
-    Наследственное поле "position" используется только как хранилище
-    количества повторов, position.mode игнорируется.
-    Временный класс-костыль до момента переделки Parallel/SequenceGenGradGen."""
+        if callback is not None:
+            callback(True)
 
-    #TODO возможно, имеет смысл переделать класс GenGradGen или Parallel/SequenceGenGradGen так, чтобы в отдельном классе RepeaterGenGradGen пропала необходимость
+    def close(self):
+        if self.__ownfile:
+            self.file.close()
 
-    def init_attrs(self, **kwargs):
-        super().init_attrs(**kwargs)
 
-        self.itersleft = 0
-        self.subgen = self.kwargs_get(kwargs, 'subgen', None, self.check_isgrad)
-        self.__accum = None
+class UDPTransport(DMXTransport):
+    """Базовый класс для транспортов, отправляющих значения устройствам
+    напрямую по UDP, без olad.
 
-    def get_disp_name(self):
-        return '%s(%s)' % (self.name, self.subgen.get_disp_name())
+    Для каждой universe один раз создаётся буфер пакета с заполненным
+    заголовком, в который при отправке копируются только значения каналов
+    и изменяемые поля заголовка.
 
-    def set_subgen(self, gen):
-        self.subgen = self.__chk_subgen(gen)
-        self.__setup_iters_left()
+    Поля:
+        host    - строка, адрес получателя;
+        port    - целое, порт получателя;
+        sock    - сокет."""
 
-    def get_n_values(self):
-        return self.subgen.get_n_values() * self.position.length
+    DEFAULT_PORT = None
 
-    def __setup_iters_left(self):
-        self.itersleft = self.get_n_values()
+    def __init__(self, host, port=None):
+        self.host = host
+        self.port = self.DEFAULT_PORT if port is None else port
 
-    def reset(self):
-        super().reset()
-        self.subgen.reset()
-        self.__setup_iters_left()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 
-    def get_next_value(self):
-        if self.itersleft > 0:
-            self.__accum = self.subgen.get_next_value()
-            self.itersleft -= 1
+        self.__packets = {}
 
-        return self.__accum
+    def new_packet(self, universe):
+        """Метод создаёт и возвращает bytearray - буфер пакета для universe
+        с заполненными постоянными полями заголовка.
+        Должен быть перекрыт классом-потомком."""
 
+        raise NotImplementedError()
 
-class EnvelopeGenGradGen(GradGen):
-    """Генератор, амплитудно модулирующий выхлоп одного генератора
-    выхлопом другого.
+    def update_packet(self, packet, universe, nchannels):
+        """Метод изменяет поля заголовка в буфере пакета packet перед
+        отправкой nchannels каналов и возвращает размер пакета.
+        Должен быть перекрыт классом-потомком."""
 
-    Внимание! Экспериментальный генератор, может быть перделан
-    полностью или удалён!"""
+        raise NotImplementedError()
 
-    def init_attrs(self, **kwargs):
-        """Инициализация полей.
+    def get_address(self, universe):
+        """Возвращает адрес получателя значений universe - кортеж
+        (host, port)."""
 
-        Параметры (в дополнение к наследственным):
-            sourcegen   - генератор значений, потомок класса GradGen;
-            envelopegen - генератор значений огибающей, потомок класса GradGen;
-                          если envelopegen.get_next_value() возвращает меньше
-                          значений, чем sourcegen.get_next_value() -
-                          значения "огибающей" используются циклически
-                          до заполнения."""
+        return (self.host, self.port)
 
-        super().init_attrs(**kwargs)
+    def send(self, universe, data, callback=None):
+        p = self.__packets.get(universe)
+        if p is None:
+            packet = self.new_packet(universe)
+            # (буфер пакета, он же как массив numpy, memoryview, адрес)
+            p = (packet, np.frombuffer(packet, dtype=np.uint8),
+                 memoryview(packet), self.get_address(universe))
+            self.__packets[universe] = p
 
-        self.sourcegen = self.kwargs_get(kwargs, 'sourcegen', None, self.check_isgrad)
-        self.envelopegen = self.kwargs_get(kwargs, 'envelopegen', None, self.check_isgrad)
+        packet, pdata, pview, address = p
 
-    def get_next_value(self):
-        channels = unwrap_lol(self.sourcegen.get_next_value())
-        envels = unwrap_lol(self.envelopegen.get_next_value())
+        nchannels = len(data)
+        hsize = len(packet) - DMX_CHANNELS
 
-        clen = len(channels)
-        elen = len(envels)
+        psize = self.update_packet(packet, universe, nchannels)
+        pdata[hsize:hsize + nchannels] = data
 
-        retv = [0.0] * clen
+        try:
+            self.sock.sendto(pview[:psize], address)
+            ok = True
+        except OSError:
+            ok = False
 
-        for ixc, cv in enumerate(channels):
-            retv[ixc] = cv * envels[ixc % elen]
+        if callback is not None:
+            callback(ok)
 
-        return retv
+    def close(self):
+        self.sock.close()
 
-    def get_disp_name(self):
-        return '%s(%s * %s)' % (
-                    self.name,
-                    self.sourcegen.get_disp_name(),
-                    self.envelopegen.get_disp_name())
 
+class ArtNetTransport(UDPTransport):
+    """Транспорт, отправляющий значения по протоколу Art-Net (пакеты ArtDmx).
 
-class CrossfadeGenGradGen(GradGen):
-    """Генератор, смешивающий выхлопы двух генераторов с соотношением,
-    определяемым третьим генератором.
+    Номер universe используется как 15-битный Port-Address Art-Net.
+    По умолчанию пакеты отправляются широковещательно."""
 
-    Внимание! Экспериментальный генератор, может быть перделан
-    полностью или удалён!"""
+    DEFAULT_PORT = 6454
 
-    def init_attrs(self, **kwargs):
-        """Инициализация полей.
+    __HEADER_SIZE = 18
 
-        Параметры (в дополнение к наследственным):
-            source1gen,
-            source2gen  - генераторы исходных значений, потомок класса GradGen;
-            balancegen  - генератор значений соотношения (перекрёстного
-                          затухания), потомок класса GradGen;
-                          выходное значение равно (s1v * (1-bv)) + (s2v * bv).
+    def __init__(self, host='255.255.255.255', port=None):
+        super().__init__(host, port)
 
-        Внимание! Количество каналов (значений), возвращаемое методом
-        CrossfadeGenGradGen.get_next_value(), определяется количеством
-        значений, возвращаемых source1gen.get_next_value(), а значения
-        source2gen и balancegen используются циклически до заполнения."""
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
 
-        super().init_attrs(**kwargs)
+    def new_packet(self, universe):
+        packet = bytearray(self.__HEADER_SIZE + DMX_CHANNELS)
 
-        self.source1gen = self.kwargs_get(kwargs, 'source1gen', None, self.check_isgrad)
-        self.source2gen = self.kwargs_get(kwargs, 'source2gen', None, self.check_isgrad)
-        self.balancegen = self.kwargs_get(kwargs, 'balancegen', None, self.check_isgrad)
+        # ID, OpCode (OpDmx, little endian), ProtVer 14
+        struct.pack_into('<8sHBB', packet, 0, b'Art-Net', 0x5000, 0, 14)
+        # Physical, SubUni, Net
+        struct.pack_into('<BBB', packet, 13, 0, universe & 0xff, (universe >> 8) & 0x7f)
 
-    def get_next_value(self):
-        src1v = unwrap_lol(self.source1gen.get_next_value())
-        src2v = unwrap_lol(self.source2gen.get_next_value())
+        return packet
 
-        balancev = unwrap_lol(self.balancegen.get_next_value())
+    def update_packet(self, packet, universe, nchannels):
+        # Sequence: 1..255, 0 - последовательность не используется
+        packet[12] = packet[12] % 255 + 1
 
-        s1len = len(src1v)
-        s2len = len(src2v)
-        blen = len(balancev)
+        # Length должен быть чётным
+        length = nchannels + (nchannels & 1)
+        packet[16] = length >> 8
+        packet[17] = length & 0xff
 
-        retv = [0.0] * s1len
+        if length > nchannels:
+            packet[self.__HEADER_SIZE + nchannels] = 0
 
-        for ixc, s1v in enumerate(src1v):
-            bv = balancev[ixc % blen]
-            retv[ixc] = (s1v * (1.0 - bv)) + (src2v[ixc % s2len] * bv)
+        return self.__HEADER_SIZE + length
 
-        return retv
 
-    def get_disp_name(self):
-        return '%s(%s, %s, %s)' % (
-                    self.name,
-                    self.source1gen.get_disp_name(),
-                    self.source2gen.get_disp_name(),
-                    self.balancegen.get_disp_name())
+class SACNTransport(UDPTransport):
+    """Транспорт, отправляющий значения по протоколу sACN (ANSI E1.31).
 
+    Если адрес получателя не указан - пакеты отправляются на групповой
+    (multicast) адрес universe (239.255.X.Y).
 
-class SequenceGenGradGen(GroupGenGradGen):
-    """Генератор, вызывающий вложенные генераторы поочерёдно.
-    Количество последовательных вызовов каждого генератора
-    соответствует значению соотв. position.length.
-    По окончании списка генераторов перебор начинается сначала."""
+    Поля (в дополнение к наследственным):
+        sourceName  - строка, имя источника (до 63 символов);
+        priority    - целое 0-200, приоритет источника;
+        cid         - 16 байт, идентификатор источника (UUID)."""
 
-    def init_attrs(self, **kwargs):
-        self.activeGen = None
-        self.activeItrs = 0
+    DEFAULT_PORT = 5568
 
-        super().init_attrs(**kwargs)
+    __HEADER_SIZE = 126
 
-    def __set_active_gen(self):
-        if self.generators:
-            self.activeGen = self.generators[self.position.value]
-            self.activeItrs = self.activeGen.get_n_values()
-        else:
-            self.activeGen = None
-            self.activeItrs = 0
+    def __init__(self, host=None, port=None, sourceName='dmxgrad', priority=100, cid=None):
+        super().__init__(host, port)
 
-    def get_disp_name(self):
-        return '%s(%s)' % (self.name, self.activeGen.get_disp_name())
+        self.sourceName = sourceName
+        self.priority = priority
+        self.cid = uuid.uuid4().bytes if cid is None else cid
 
-    def reset(self):
-        super().reset()
-        self.__set_active_gen()
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
 
-    def subgen_added(self):
-        if not self.activeGen:
-            self.__set_active_gen()
+    def get_address(self, universe):
+        if self.host is None:
+            return ('239.255.%d.%d' % (universe >> 8, universe & 0xff), self.port)
 
-    def get_n_values(self):
-        r = 0
+        return super().get_address(universe)
 
-        for g in self.generators:
-            r += g.get_n_values()
+    def new_packet(self, universe):
+        packet = bytearray(self.__HEADER_SIZE + DMX_CHANNELS)
 
-        return r
+        # root layer: preamble, postamble, ACN packet identifier
+        struct.pack_into('>HH12s', packet, 0, 0x0010, 0, b'ASC-E1.17')
+        # root layer vector, CID
+        struct.pack_into('>I16s', packet, 18, 0x00000004, self.cid)
+        # framing layer vector, source name, priority, sync address
+        struct.pack_into('>I64sBH', packet, 40, 0x00000002,
+            self.sourceName.encode('utf-8')[:63], self.priority, 0)
+        # options, universe
+        struct.pack_into('>BH', packet, 112, 0, universe)
+        # DMP layer: vector, address & data type, first address, increment
+        struct.pack_into('>BBHH', packet, 117, 0x02, 0xa1, 0, 1)
+        # start code - 0
 
-    def get_next_value(self):
-        if not self.activeGen:
-            raise ValueError('generator not properly initialized')
+        return packet
 
-        ret = self.activeGen.get_next_value()
+    def update_packet(self, packet, universe, nchannels):
+        psize = self.__HEADER_SIZE + nchannels
 
-        self.activeItrs -= 1
+        # длины PDU с флагами (0x7) всех трёх уровней
+        struct.pack_into('>H', packet, 16, 0x7000 | (psize - 16))
+        struct.pack_into('>H', packet, 38, 0x7000 | (psize - 38))
+        struct.pack_into('>H', packet, 115, 0x7000 | (psize - 115))
 
-        if self.activeItrs <= 0:
-            self.position.next_value()
-            self.__set_active_gen()
+        # sequence number
+        packet[111] = (packet[111] + 1) & 0xff
 
-        return ret
+        # property value count (с учётом start code)
+        struct.pack_into('>H', packet, 123, nchannels + 1)
+
+        return psize
 
 
-class GradSender():
+class BaseGradSender():
     DEFAULT_UNIVERSE = 1
+    DEFAULT_KEEPALIVE = 1000
 
-    """Обёртка над обёрткой для кормления DMX512-совместимых устройств
+    """Базовый класс для кормления DMX512-совместимых устройств
     байтами, выданными генераторами градиентов.
+    Содержит всё, кроме цикла отправки значений, который реализуют
+    классы-потомки.
+
+    Один экземпляр может отправлять значения в несколько universe
+    сразу - значения всех генераторов получаются и отправляются за один
+    "тик" цикла, т.е. синхронно.
 
     Поля:
-        generator   - экземпляр класса GradGen;
-        universe    - номер DMX-512 universe;
+        transport   - экземпляр потомка DMXTransport, через который
+                      отправляются значения; по умолчанию - OLATransport;
+        generator   - экземпляр класса GradGen (первый из генераторов,
+                      если их несколько);
+        universe    - номер DMX-512 universe (первой, если их несколько);
+        output      - экземпляр UniverseBuffer - буфер отправляемых значений
+                      (первый, если их несколько);
+        outputs     - список экземпляров UniverseBuffer - буферы значений
+                      для всех universe;
+        sources     - список экземпляров FrameSource - генераторы и буферы,
+                      в которые записываются их значения;
         iterations  - None или положительное целое: количество значений,
                       которые будут сгенерированы при вызове метода run();
                       если iterations is None - метод run() будет
@@ -1250,80 +5020,334 @@ class GradSender():
                       установкой поля stop в True или вместе со скриптом);
         interval    - целое, интервал в миллисекундах между отправками
                       значений устройствам;
+        blockSize   - положительное целое: количество значений, получаемых
+                      от генератора за одно обращение (методом
+                      GradGen.get_next_values()); по умолчанию - 1,
+                      т.е. значения получаются по одному методом
+                      GradGen.get_next_value();
+        scheduler   - экземпляр TickScheduler - планировщик отправки
+                      значений; отправки происходят по срокам, отсчитываемым
+                      от момента вызова run(), поэтому задержки не
+                      накапливаются; статистика опозданий и неравномерности
+                      отправок - в полях scheduler.lateness и scheduler.jitter;
+        sendOnChange - булевское значение; если True - значения
+                      отправляются только при их изменении (и раз
+                      в keepalive мс); по умолчанию - False;
+        keepalive   - None или интервал в миллисекундах, через который
+                      неизменившиеся значения отправляются повторно
+                      при sendOnChange == True; по умолчанию -
+                      DEFAULT_KEEPALIVE;
+        lastState   - None или булевское значение - результат последней
+                      отправки;
         stop        - булевское значение, флаг прекращения работы цикла
                       в методе run()."""
 
     def __init__(self, **kwargs):
-        self.wrapper = ClientWrapper()
+        """Параметры: см. описание полей, а также:
+            generators  - словарь, где ключи - номера universe, а значения -
+                          экземпляры GradGen; если указан этот параметр -
+                          параметры generator и universe(s) игнорируются;
+            universes   - список или кортеж номеров universe, по которым
+                          "нарезается" значение одного "широкого"
+                          генератора generator - первые DMX_CHANNELS каналов
+                          отправляются в первую universe, следующие -
+                          во вторую, и т.д.;
+                          если не указан - всё значение generator
+                          отправляется в universe."""
+
+        self.transport = kwargs.get('transport', None)
+        if self.transport is None:
+            self.transport = OLATransport()
 
-        self.generator = kwargs.get('generator')
-        self.universe = kwargs.get('universe', self.DEFAULT_UNIVERSE)
         self.iterations = kwargs.get('iterations', None)
         self.interval = kwargs.get('interval', GradPosition.DEFAULT_TICK_INTERVAL)
+        self.blockSize = kwargs.get('blockSize', 1)
+        self.sendOnChange = kwargs.get('sendOnChange', False)
+        self.keepalive = kwargs.get('keepalive', self.DEFAULT_KEEPALIVE)
+
+        self.scheduler = TickScheduler(self.interval)
+
+        self.outputs = []
+        self.sources = []
+
+        generators = kwargs.get('generators', None)
+        if generators:
+            for universe, gen in generators.items():
+                self.__add_source(gen, [universe], False)
+        else:
+            gen = kwargs.get('generator')
+
+            universes = kwargs.get('universes', None)
+            if universes:
+                self.__add_source(gen, universes, True)
+            else:
+                self.__add_source(gen, [kwargs.get('universe', self.DEFAULT_UNIVERSE)], False)
+
+        self.generator = self.sources[0].generator
+        self.output = self.outputs[0]
+        self.universe = self.output.universe
 
         self.lastState = None
 
         self.stop = False
 
+    def __add_source(self, gen, universes, split):
+        if not isinstance(gen, GradGen):
+            raise ValueError('%s: generator must be subclass of GradGen' % self.__class__.__name__)
+
+        # количество каналов генератора известно заранее - лишние каналы
+        # обнаруживаются сразу, а не во время работы
+        nchannels = gen.get_n_channels()
+        if nchannels is not None and nchannels > DMX_CHANNELS * (len(universes) if split else 1):
+            raise ValueError('%s: generator "%s" returns too many channels (%d) for %d universe(s)' % (self.__class__.__name__, gen.name, nchannels, len(universes) if split else 1))
+
+        # ...как и недостающие - на каждую universe должен приходиться
+        # хотя бы один канал
+        if split and nchannels is not None and nchannels <= DMX_CHANNELS * (len(universes) - 1):
+            raise ValueError('%s: generator "%s" returns too few channels (%d) for %d universe(s)' % (self.__class__.__name__, gen.name, nchannels, len(universes)))
+
+        souts = []
+
+        for ix, universe in enumerate(universes):
+            if universe in map(lambda ub: ub.universe, self.outputs):
+                raise ValueError('%s: universe %d specified more than once' % (self.__class__.__name__, universe))
+
+            ub = UniverseBuffer(universe)
+            self.outputs.append(ub)
+            souts.append((ub, ix * DMX_CHANNELS if split else None))
+
+        self.sources.append(FrameSource(gen, souts, self.blockSize))
+
     def __repr__(self):
         return repr_to_str(self)
 
-    def __DMX_sent(self, state):
-        self.lastState = state
+    def begin(self):
+        """Подготовка к запуску цикла отправки значений.
+        Метод должен вызываться методом run() класса-потомка."""
 
-        if not state.Succeeded():
-            self.wrapper.Stop()
+        self.stop = False
+
+        self.scheduler.interval = self.interval
+        self.scheduler.begin(self.interval)
+
+    def next_tick(self):
+        """Получение очередных значений от всех генераторов.
+        Метод должен вызываться циклом отправки значений в срок,
+        указанный планировщиком (см. TickScheduler.delay()).
+
+        Метод возвращает False, если пора прекращать работу цикла,
+        иначе возвращает True."""
 
-    def __DMX_send_frame(self):
         if self.stop:
-            self.wrapper.Stop()
-            return
+            return False
 
         if self.iterations is not None:
             self.iterations -= 1
             if self.iterations <= 0:
-                self.wrapper.Stop()
-                return
+                return False
+
+        self.scheduler.tick()
 
-        self.wrapper.AddEvent(self.interval, self.__DMX_send_frame)
+        # сначала получаем значения от всех генераторов, затем отправляем
+        # их все разом, дабы universe не "разъезжались" во времени
+        for src in self.sources:
+            self.display(src.update(self.iterations), src.generator)
 
-        # вот какого хера в питоне нет просто нормальных массивов?
-        values = unwrap_lol(self.generator.get_next_value())
-        data = array('B', map(lambda i: int(255 * (0 if i < 0 else i if i <= MAX_VALUE else MAX_VALUE)),
-                              values))
+        return True
 
-        self.display(values, self.generator)
+    def send_frames(self, callback=None):
+        """Отправка значений из всех буферов.
 
-        self.wrapper.Client().SendDmx(self.universe, data, self.__DMX_sent)
+        Параметры:
+            callback    - см. описание метода DMXTransport.send();
+                          если None - используется метод frame_sent()."""
+
+        if callback is None:
+            callback = self.frame_sent
+
+        for ub in self.outputs_to_send():
+            self.transport.send(ub.universe, ub.frame, callback)
+
+    def outputs_to_send(self):
+        """Перебор буферов, значения из которых нужно отправить (все,
+        или, при sendOnChange == True, только изменившиеся).
+        Для возвращаемых буферов отправка регистрируется (UniverseBuffer.sent())."""
+
+        now = monotonic()
+
+        for ub in self.outputs:
+            if not self.sendOnChange or ub.need_send(now, self.keepalive):
+                ub.sent(now)
+                yield ub
+
+    def get_frames_sent(self):
+        """Возвращает общее количество отправленных значений во всех
+        universe."""
+
+        return sum(map(lambda ub: ub.framesSent, self.outputs))
+
+    def get_frames_suppressed(self):
+        """Возвращает общее количество значений во всех universe,
+        не отправленных из-за отсутствия изменений."""
+
+        return sum(map(lambda ub: ub.framesSuppressed, self.outputs))
+
+    def frame_sent(self, ok):
+        """Обработка результата отправки значений.
+
+        Параметры:
+            ok  - булевское значение, True - отправка успешна."""
+
+        self.lastState = ok
+
+        if not ok:
+            self.stop = True
 
     def display(self, values, gen):
         """При необходимости отображения текущих значений и прочей
         информации этот метод должен быть перекрыт классом-потомком.
+        Если генераторов несколько - метод вызывается для каждого из них.
         Параметры:
-            values  - линейный список float в диапазоне 0.0-1.0;
+            values  - линейный список (или массив numpy) float
+                      в диапазоне 0.0-1.0;
             gen     - экземпляр GradGen."""
 
         #print('sending: %s, iteration(s) left: %d' % (data, self.iterations))
         pass
 
-    def blackout(self, nchannels=512):
-        """Отправка во все каналы нулей для гашения всех чортовых лампочек.
+    def blackout(self, nchannels=DMX_CHANNELS):
+        """Отправка во все каналы всех universe нулей для гашения всех
+        чортовых лампочек.
         Mожет использоваться в обработчиках ошибок, дабы в случае чего
         лампочки ток не жрали зря."""
 
         if nchannels < 1:
             nchannels = 1
-        elif nchannels > 512:
-            nchannels = 512
+        elif nchannels > DMX_CHANNELS:
+            nchannels = DMX_CHANNELS
+
+        zeros = np.zeros(nchannels, dtype=np.uint8)
 
-        self.wrapper.Client().SendDmx(self.universe,
-            array('B', [0] * nchannels),
-            self.__DMX_sent)
+        for ub in self.outputs:
+            # значения в устройствах уже не те, что были отправлены
+            ub.forget_sent()
+            self.transport.send(ub.universe, zeros, self.frame_sent)
 
     def run(self):
-        self.stop = False
-        self.wrapper.AddEvent(self.interval, self.__DMX_send_frame)
-        self.wrapper.Run()
+        """Цикл отправки значений. Метод должен быть перекрыт
+        классом-потомком."""
+
+        raise NotImplementedError()
+
+
+class GradSender(BaseGradSender):
+    """Обёртка над обёрткой для кормления DMX512-совместимых устройств
+    байтами, выданными генераторами градиентов.
+
+    Если транспорт - OLATransport, цикл отправки значений работает
+    в цикле событий ola.ClientWrapper, иначе метод run() сам ждёт
+    сроков отправки (time.sleep()).
+
+    Поля (в дополнение к наследственным):
+        wrapper     - экземпляр ola.ClientWrapper, если транспорт -
+                      OLATransport, иначе None."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+
+        if isinstance(self.transport, OLATransport):
+            self.wrapper = self.transport.get_wrapper()
+        else:
+            self.wrapper = None
+
+    def __DMX_send_frame(self):
+        if not self.next_tick():
+            self.wrapper.Stop()
+            return
+
+        self.send_frames()
+
+        # следующая отправка - по сроку очередного тика, а не через
+        # interval от текущего момента
+        self.wrapper.AddEvent(self.scheduler.delay(), self.__DMX_send_frame)
+
+    def frame_sent(self, ok):
+        super().frame_sent(ok)
+
+        if not ok and self.wrapper is not None:
+            self.wrapper.Stop()
+
+    def run(self):
+        self.begin()
+
+        if self.wrapper is not None:
+            self.wrapper.AddEvent(self.scheduler.delay(), self.__DMX_send_frame)
+            self.wrapper.Run()
+        else:
+            while True:
+                sleep(self.scheduler.delay() / 1000.0)
+
+                if not self.next_tick():
+                    break
+
+                self.send_frames()
+
+
+class AsyncGradSender(BaseGradSender):
+    """Аналог GradSender для asyncio: метод run() - корутина,
+    отправляющая значения в сроки, указанные планировщиком, в цикле
+    событий asyncio, и не мешающая работать прочим корутинам.
+
+    Поля класса:
+        SEND_TIMEOUT    - максимальное время ожидания (в секундах)
+                          завершения отправки значений; если транспорт
+                          не сообщил о завершении отправки за это время -
+                          отправка считается неудачной."""
+
+    SEND_TIMEOUT = 1.0
+
+    async def __send_frames(self, loop):
+        import asyncio
+
+        futures = []
+
+        def __sent(ok, fut):
+            if not fut.done():
+                fut.set_result(ok)
+
+        for ub in self.outputs_to_send():
+            fut = loop.create_future()
+            futures.append(fut)
+
+            self.transport.send(ub.universe, ub.frame,
+                lambda ok, fut=fut: __sent(ok, fut))
+
+        try:
+            results = await asyncio.wait_for(asyncio.gather(*futures), self.SEND_TIMEOUT)
+        except asyncio.TimeoutError:
+            results = (False,)
+
+        for ok in results:
+            self.frame_sent(ok)
+
+    async def run(self):
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+
+        self.transport.attach(loop)
+        try:
+            self.begin()
+
+            while True:
+                await asyncio.sleep(self.scheduler.delay() / 1000.0)
+
+                if not self.next_tick():
+                    break
+
+                await self.__send_frames(loop)
+        finally:
+            self.transport.detach(loop)
 
 
 if __name__ == '__main__':
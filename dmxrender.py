@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+""" dmxrender.py
+
+    Утилита для "заморозки" дерева генераторов модуля dmxgrad в файл
+    для последующего воспроизведения генератором MappedShowGradGen.
+
+    Использование:
+        dmxrender.py [параметры] модуль:функция файл
+
+    модуль:функция - имя модуля (или путь к файлу .py) и имя функции
+    в нём, возвращающей экземпляр GradGen (например, example.py:demo_LineGradGen);
+    файл - имя создаваемого файла.
+
+    С параметром -j дерево генераторов расчитывается параллельно
+    в нескольких процессах (см. render_show_file()).
+
+    Copyright 2022 MC-6312
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>."""
+
+
+from dmxgrad import *
+
+import sys
+import os
+import os.path
+import importlib
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
+from argparse import ArgumentParser
+
+
+# минимальное количество значений в части, расчитываемой отдельно
+# (см. plan_render())
+MIN_PART_FRAMES = SHOW_BLOCK_SIZE
+
+# количество частей на один процесс - чтобы процессы, расчитавшие
+# "лёгкие" части, не простаивали
+PARTS_PER_JOB = 4
+
+# генераторы, созданные в процессе-исполнителе (см. render_part()):
+# {"модуль:функция": экземпляр GradGen}
+__workerGens = {}
+
+
+def load_generator(spec):
+    """Получение генератора по строке вида "модуль:функция".
+
+    Параметры:
+        spec    - строка; "модуль" - имя модуля или путь к файлу .py,
+                  "функция" - имя функции в модуле, вызываемой без
+                  параметров и возвращающей экземпляр GradGen.
+
+    Функция возвращает экземпляр GradGen."""
+
+    modname, sep, funcname = spec.rpartition(':')
+    if not sep or not modname or not funcname:
+        raise ValueError('generator must be specified as "module:function"')
+
+    if modname.endswith('.py'):
+        mspec = importlib.util.spec_from_file_location(
+            os.path.splitext(os.path.basename(modname))[0], modname)
+        module = importlib.util.module_from_spec(mspec)
+        mspec.loader.exec_module(module)
+    else:
+        module = importlib.import_module(modname)
+
+    gen = getattr(module, funcname)()
+    if not isinstance(gen, GradGen):
+        raise ValueError('%s() must return instance of GradGen' % funcname)
+
+    return gen
+
+
+def get_subtree(gen, path):
+    """Возвращает вложенный генератор gen по пути path - списку номеров
+    в списках вложенных генераторов (см. GradGen.get_subgens())."""
+
+    for ix in path:
+        gen = gen.get_subgens()[ix]
+
+    return gen
+
+
+def has_fast_seek(gen):
+    """Возвращает True, если все генераторы дерева gen реализуют метод
+    seek() без расчёта предыдущих значений (т.е. дерево имеет смысл
+    расчитывать по частям по времени)."""
+
+    for g in iter_tree(gen):
+        if type(g).seek is GradGen.seek:
+            return False
+
+        if isinstance(g, SequenceGenGradGen) and g.position.mode == GradPosition.RANDOM:
+            return False
+
+    return True
+
+
+def __count_refs(gen):
+    # количество ссылок на каждый генератор дерева из других генераторов
+    refs = {}
+
+    for g in iter_tree(gen):
+        for sub in g.get_subgens():
+            refs[id(sub)] = refs.get(id(sub), 0) + 1
+
+    return refs
+
+
+def __is_independent(gen, refs):
+    # True, если на генераторы поддерева gen нет ссылок извне поддерева
+    # (кроме одной ссылки на сам gen)
+    inner = __count_refs(gen)
+    inner[id(gen)] = inner.get(id(gen), 0) + 1
+
+    return all(refs.get(id(g), 0) == inner.get(id(g), 0) for g in iter_tree(gen))
+
+
+def plan_render(gen, nframes, jobs):
+    """Разбиение расчёта дерева генераторов на независимые части.
+
+    Параметры:
+        gen     - экземпляр GradGen (после вызова reset());
+        nframes - количество значений;
+        jobs    - количество процессов.
+
+    Вложенные генераторы ParallelGenGradGen (начиная с корня дерева)
+    расчитываются по отдельности, если они не используются другими
+    генераторами дерева; поддеревья, для которых seek() работает быстро
+    (см. has_fast_seek()), дополнительно делятся по времени на отрезки
+    не короче MIN_PART_FRAMES.
+
+    Функция возвращает список кортежей (путь к поддереву (см. get_subtree()),
+    номер первого канала, номер первого значения, количество значений)."""
+
+    refs = __count_refs(gen)
+    units = []
+
+    def __split(g, path, first):
+        if isinstance(g, ParallelGenGradGen) and g.get_n_channels() is not None:
+            subgens = g.get_subgens()
+            if all(__is_independent(sub, refs) for sub in subgens):
+                for ix, sub in enumerate(subgens):
+                    __split(sub, path + (ix,), first)
+                    first += sub.get_n_channels()
+
+                return
+
+        units.append((g, path, first))
+
+    __split(gen, (), 0)
+
+    nparts = max(1, (jobs * PARTS_PER_JOB) // len(units))
+    ret = []
+
+    for g, path, first in units:
+        if g.get_n_channels() == 0:
+            continue
+
+        n = 1
+        if has_fast_seek(g):
+            n = max(1, min(nparts, nframes // MIN_PART_FRAMES))
+
+        bounds = [nframes * i // n for i in range(n + 1)]
+
+        for t0, t1 in zip(bounds[:-1], bounds[1:]):
+            ret.append((path, first, t0, t1 - t0))
+
+    return ret
+
+
+def render_part(spec, filename, path, first, start, count):
+    """Расчёт одной части (см. plan_render()) в процессе-исполнителе
+    с записью значений прямо в файл, созданный create_show_file().
+    Дерево генераторов создаётся по spec (см. load_generator()) один раз
+    на процесс.
+
+    Функция возвращает количество записанных значений."""
+
+    gen = __workerGens.get(spec)
+    if gen is None:
+        gen = load_generator(spec)
+        __workerGens[spec] = gen
+
+    gen = get_subtree(gen, path)
+    gen.reset()
+    gen.seek(start)
+
+    frames, _, _ = read_show_file(filename, writable=True)
+
+    ix = start
+    end = start + count
+
+    while ix < end:
+        block = gen.get_next_values(min(SHOW_BLOCK_SIZE, end - ix))
+        store_show_values(frames, ix, block, first)
+        ix += len(block)
+
+    frames.flush()
+
+    return count
+
+
+def render_show_file(spec, filename, nframes=None, dtype=np.uint8, interval=None, jobs=None):
+    """Запись выхлопа дерева генераторов в файл (см. write_show_file())
+    с расчётом независимых частей дерева (см. plan_render())
+    в нескольких процессах.
+
+    Параметры:
+        spec        - строка "модуль:функция" (см. load_generator());
+                      процессы-исполнители создают дерево генераторов
+                      сами, т.е. функция должна каждый раз возвращать
+                      одинаковое дерево;
+        filename, nframes, dtype, interval - см. write_show_file();
+        jobs        - None или количество процессов; если None -
+                      по количеству процессоров.
+
+    Части записываются процессами прямо в отображённый в память файл,
+    т.е. общий массив значений в памяти не собирается.
+    Если количество каналов дерева заранее неизвестно (см.
+    GradGen.get_n_channels()), или jobs == 1 - файл пишется функцией
+    write_show_file() в текущем процессе."""
+
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
+    gen = load_generator(spec)
+    gen.reset()
+
+    if nframes is None:
+        nframes = gen.get_n_values()
+
+    nchannels = gen.get_n_channels()
+
+    if jobs < 2 or nchannels is None:
+        write_show_file(gen, filename, nframes=nframes, dtype=dtype, interval=interval)
+        return
+
+    parts = plan_render(gen, nframes, jobs)
+
+    create_show_file(filename, nframes, nchannels, dtype, gen.position.mode, interval).flush()
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(parts) or 1)) as executor:
+        futures = [executor.submit(render_part, spec, filename, *part) for part in parts]
+
+        for f in futures:
+            f.result()
+
+
+def main(args=None):
+    aparser = ArgumentParser(description='Render dmxgrad generator tree to a show file')
+    aparser.add_argument('generator', help='module:function returning GradGen instance')
+    aparser.add_argument('filename', help='output show file')
+    aparser.add_argument('-n', '--frames', type=int, default=None,
+        help='number of frames (default - generator.get_n_values())')
+    aparser.add_argument('-f', '--float', action='store_true',
+        help='store float32 values instead of bytes')
+    aparser.add_argument('-i', '--interval', type=float, default=None,
+        help='interval between frames in milliseconds')
+    aparser.add_argument('-j', '--jobs', type=int, nargs='?', const=0, default=1,
+        help='render independent subtrees in JOBS processes (default - 1, without value - CPU count)')
+
+    pargs = aparser.parse_args(args)
+
+    render_show_file(pargs.generator, pargs.filename,
+        nframes=pargs.frames,
+        dtype=np.float32 if pargs.float else np.uint8,
+        interval=pargs.interval,
+        jobs=pargs.jobs or None)
+
+    frames, mode, interval = read_show_file(pargs.filename)
+    print('%s: %d frame(s), %d channel(s), %s, %.2f ms' % (pargs.filename,
+        frames.shape[0], frames.shape[1], frames.dtype, interval))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -22,6 +22,7 @@
 
 
 from dmxgrad import *
+from PIL import Image
 import signal
 
 
@@ -204,7 +205,7 @@ def main():
     sender.run()
     signal.signal(signal.SIGINT, oldCC)
 
-    print('\nlastState=%s' % (sender.lastState.Succeeded() if sender.lastState is not None else '?'))
+    print('\nlastState=%s' % (sender.lastState if sender.lastState is not None else '?'))
 
     sender.blackout()
     print('\n***END***')
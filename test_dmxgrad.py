@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+""" test_dmxgrad.py
+
+    Тесты модуля dmxgrad (запуск: python3 -m pytest).
+
+    Copyright 2022 MC-6312
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>."""
+
+
+from math import sin, pi
+
+import numpy as np
+import pytest
+
+from dmxgrad import *
+
+
+# допустимая погрешность значений FRAME_DTYPE
+TOLERANCE = 1e-5
+
+
+#
+# эталонные (до векторизации) расчёты буферов
+#
+
+def ref_line(length, channelsFrom, channelsTo):
+    _len = length - 1
+
+    deltas = []
+    cvals = []
+
+    for ci, cFrom in enumerate(channelsFrom):
+        deltas.append((channelsTo[ci] - cFrom) / _len)
+        cvals.append(cFrom)
+
+    buf = []
+
+    for i in range(length):
+        buf.append(tuple(cvals))
+
+        for ci, cval in enumerate(cvals):
+            cvals[ci] = cval + deltas[ci]
+
+    return buf
+
+
+def ref_sine(length, levels, lowLevels, phases, periods):
+    periodCf = []
+    phaseCf = []
+    amplCf = []
+    sinCf = []
+
+    for ci, level in enumerate(levels):
+        perlen = length / periods[ci]
+        periodCf.append(perlen)
+        phaseCf.append(perlen * phases[ci])
+
+        amplitude = (level - lowLevels[ci]) / 2.0
+        amplCf.append((amplitude, level - amplitude))
+
+        sinCf.append(2 * pi / perlen)
+
+    sinOffsetX = pi / 2
+
+    buf = []
+
+    for i in range(length):
+        v = []
+
+        for ci, (amplitude, offsetY) in enumerate(amplCf):
+            v.append(offsetY - amplitude * sin(sinOffsetX + (i + phaseCf[ci]) * sinCf[ci]))
+
+        buf.append(v)
+
+    return buf
+
+
+def ref_square(length, levels, lowLevels, phases, periods, dutyCycles):
+    perLengths = []
+    posHi0 = []
+    posHi1 = []
+
+    for ci, level in enumerate(levels):
+        perlen = length / periods[ci]
+        perLengths.append(perlen)
+
+        hilen = perlen / (1.0 + dutyCycles[ci])
+
+        startHi = perlen * phases[ci]
+        posHi0.append(startHi)
+        posHi1.append(startHi + perlen - hilen)
+
+    buf = []
+
+    for i in range(length):
+        chns = []
+
+        for ci in range(len(levels)):
+            v = i % perLengths[ci]
+
+            chns.append(levels[ci] if v >= posHi0[ci] and v < posHi1[ci] else lowLevels[ci])
+
+        buf.append(chns)
+
+    return buf
+
+
+WAVE_PARAMS = dict(levels=(1.0, 0.8, 0.5),
+                   lowLevels=(0.0, 0.2, 0.1),
+                   phases=(0.0, 0.33, 0.66),
+                   periods=(1.0, 2.0, 3.5))
+
+
+@pytest.mark.parametrize('length', [2, 3, 17, 100, 1001])
+def test_line_buffer(length):
+    gen = LineGradGen(length=length, channelsFrom=(0.0, 1.0, 0.25),
+                      channelsTo=(1.0, 0.0, 0.75), shareBuf=False)
+
+    ref = ref_line(length, gen.channelsFrom, gen.channelsTo)
+
+    assert np.allclose(gen.buffer, ref, atol=TOLERANCE)
+
+
+@pytest.mark.parametrize('length', [2, 3, 17, 100, 1001])
+def test_sine_buffer(length):
+    gen = SineWaveGradGen(length=length, shareBuf=False, **WAVE_PARAMS)
+
+    ref = ref_sine(length, gen.levels, gen.lowLevels, gen.phases, gen.periods)
+
+    assert np.allclose(gen.buffer, ref, atol=TOLERANCE)
+
+
+@pytest.mark.parametrize('length', [2, 3, 17, 100, 1001])
+def test_square_buffer(length):
+    gen = SquareWaveGradGen(length=length, dutyCycles=(1.0, 0.5, 0.25),
+                            shareBuf=False, **WAVE_PARAMS)
+
+    ref = ref_square(length, gen.levels, gen.lowLevels, gen.phases,
+                     gen.periods, gen.dutyCycles)
+
+    assert np.allclose(gen.buffer, ref, atol=TOLERANCE)
+
+
+#
+# произвольный доступ (seek(), value_at()) и компиляция деревьев
+#
+
+def make_tree():
+    seq = SequenceGenGradGen(mode=GradPosition.MIRROR)
+    seq.add_subgen(LineGradGen(length=7, channelsFrom=(0.0, 0.5, 1.0),
+                               channelsTo=(1.0, 0.0, 0.5)),
+                   SquareWaveGradGen(length=11, levels=(1.0, 0.9, 0.8),
+                                     periods=2.0))
+
+    par = ParallelGenGradGen()
+    par.add_subgen(SineWaveGradGen(length=13, phases=0.25, mode=GradPosition.REPEAT),
+                   ConstantGradGen(values=(0.25, 0.5)))
+
+    env = EnvelopeGenGradGen(sourcegen=par,
+                             envelopegen=LineGradGen(length=5, mode=GradPosition.MIRROR))
+
+    xfade = CrossfadeGenGradGen(source1gen=seq, source2gen=env,
+                                balancegen=LineGradGen(length=9, mode=GradPosition.REPEAT))
+
+    return xfade
+
+
+def get_values(gen, n):
+    # значение может быть действительно только до следующего вызова
+    return np.array([np.array(unwrap_lol(gen.get_next_value()), dtype=FRAME_DTYPE)
+                     for i in range(n)])
+
+
+@pytest.mark.parametrize('mode', [GradPosition.STOP, GradPosition.REPEAT,
+                                  GradPosition.MIRROR, GradPosition.RANDOM])
+def test_position_seek(mode):
+    pos = GradPosition(mode=mode, seed=1)
+    pos.length = 7
+    pos.begin()
+
+    values = [pos.value]
+    for i in range(40):
+        values.append(pos.next_value())
+
+    for tick, value in enumerate(values):
+        assert pos.value_at(tick) == value
+
+        pos.seek(tick)
+        assert pos.value == value
+
+
+
+def test_random_two_values_seed():
+    def values(seed):
+        pos = GradPosition(mode=GradPosition.RANDOM, seed=seed)
+        pos.length = 2
+        pos.begin()
+
+        return tuple(pos.next_value() for i in range(20))
+
+    assert len({values(seed) for seed in range(20)}) > 1
+
+def test_tree_seek():
+    gen = make_tree()
+    gen.reset()
+
+    ref = get_values(gen, 100)
+
+    for tick in (0, 1, 6, 7, 30, 57, 99):
+        assert np.allclose(unwrap_lol(gen.value_at(tick)), ref[tick], atol=TOLERANCE)
+
+        gen.seek(tick)
+        assert np.allclose(get_values(gen, 100 - tick), ref[tick:], atol=TOLERANCE)
+
+
+
+
+def test_layout_paths(monkeypatch):
+    import dmxgrad
+
+    # поканальный расчёт и расчёт массивами numpy (см. LAYOUT_MIN_CHANNELS)
+    monkeypatch.setattr(dmxgrad, 'LAYOUT_MIN_CHANNELS', 1000)
+    ref = get_values(make_tree(), 100)
+
+    monkeypatch.setattr(dmxgrad, 'LAYOUT_MIN_CHANNELS', 1)
+    assert np.allclose(get_values(make_tree(), 100), ref, atol=TOLERANCE)
+
+def make_animation(path, nframes=5):
+    from PIL import Image
+
+    frames = [Image.fromarray(np.full((2, 2, 3), i * 40, dtype=np.uint8), 'RGB')
+              for i in range(nframes)]
+    frames[0].save(str(path), save_all=True, append_images=frames[1:])
+
+    return Image.open(str(path))
+
+
+def test_image_tree_value_at(tmp_path):
+    seq = SequenceGenGradGen(mode=GradPosition.RANDOM, seed=3)
+    seq.add_subgen(AnimatedImageGradGen(image=make_animation(tmp_path / 'a.gif'),
+                                        mode=GradPosition.REPEAT),
+                   LineGradGen(length=4, channelsFrom=(0.0,) * 12,
+                               channelsTo=(1.0,) * 12))
+    seq.reset()
+
+    ref = get_values(seq, 30)
+
+    for tick in (0, 3, 11, 29):
+        assert np.allclose(unwrap_lol(seq.value_at(tick)), ref[tick], atol=TOLERANCE)
+
+
+def test_random_value_at_unseeded():
+    seq = SequenceGenGradGen(mode=GradPosition.RANDOM)
+    seq.add_subgen(LineGradGen(length=4), LineGradGen(length=3))
+    seq.reset()
+
+    with pytest.raises(ValueError):
+        seq.value_at(5)
+
+def test_compiled_tree():
+    # EnvelopeGenGradGen и CrossfadeGenGradGen не сбрасывают вложенные
+    # генераторы, поэтому для каждого прогона - новое дерево
+    ref = get_values(make_tree(), 200)
+
+    fused, source = compile_tree(make_tree())
+    values = np.array([fused().copy() for i in range(200)])
+
+    assert np.allclose(values, ref, atol=TOLERANCE)
+
+    cgen = CompiledGradGen(sourcegen=make_tree())
+    assert np.allclose(get_values(cgen, 200), ref, atol=TOLERANCE)
+
+
+#
+# общие буферы и запись значений других генераторов
+#
+
+def make_recorder():
+    return GenRecorderGen(sourcegen=LineGradGen(length=30))
+
+
+def test_shared_buffer_reset():
+    a = make_recorder()
+    a.reset()
+    b = make_recorder()
+
+    ref = np.linspace(0.0, 1.0, 30)[:, np.newaxis]
+
+    assert np.allclose(get_values(a, 30), ref, atol=TOLERANCE)
+    assert np.allclose(get_values(b, 30), ref, atol=TOLERANCE)
+
+
+def test_recorder_source_position(tmp_path):
+    cache = RenderCache(str(tmp_path))
+
+    src = LineGradGen(length=30)
+    get_values(src, 20)
+
+    try:
+        BufferedGradGen.renderCache = cache
+        a = GenRecorderGen(sourcegen=src, shareBuf=False)
+        b = GenRecorderGen(sourcegen=LineGradGen(length=30), shareBuf=False)
+    finally:
+        BufferedGradGen.renderCache = None
+
+    ref = np.linspace(0.0, 1.0, 30)[:, np.newaxis]
+
+    assert np.allclose(get_values(a, 30), ref, atol=TOLERANCE)
+    assert np.allclose(get_values(b, 30), ref, atol=TOLERANCE)
+
+
+def test_image_digest_strip():
+    from PIL import Image
+
+    pixels = np.zeros((4, 8, 3), dtype=np.uint8)
+    a = ImageGradGen(image=Image.fromarray(pixels, 'RGB'), horizontal=True)
+
+    # отличия вне полосы на ключ буфера не влияют, в полосе - влияют
+    pixels[3, 0] = 255
+    b = ImageGradGen(image=Image.fromarray(pixels, 'RGB'), horizontal=True)
+    assert a.get_buffer_key() == b.get_buffer_key()
+
+    pixels[0, 0] = 255
+    c = ImageGradGen(image=Image.fromarray(pixels, 'RGB'), horizontal=True)
+    assert a.get_buffer_key() != c.get_buffer_key()
+    assert np.allclose(c.get_next_value()[:3], 1.0)
+
+
+#
+# отправка значений
+#
+
+def test_sender_universes_channels():
+    def sender(nchannels, universes):
+        return GradSender(generator=ConstantGradGen(values=(0.5,) * nchannels),
+                          universes=universes, transport=NullTransport())
+
+    sender(600, [1, 2])
+
+    with pytest.raises(ValueError):
+        sender(600, [1, 2, 3])
+
+    with pytest.raises(ValueError):
+        sender(1100, [1, 2])
+
+
+def test_frame_source_too_few_channels():
+    src = FrameSource(ConstantGradGen(values=(0.5,) * 600),
+                      [(UniverseBuffer(1), 0), (UniverseBuffer(2), DMX_CHANNELS),
+                       (UniverseBuffer(3), 2 * DMX_CHANNELS)])
+
+    with pytest.raises(ValueError):
+        src.update()